@@ -1,13 +1,17 @@
-from sly import Parser
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # for tablecache
+from tablecache import CachedParser
 from scanner import Scanner
 
 
-class Mparser(Parser):
+class Mparser(CachedParser):
 
     tokens = Scanner.tokens
 
     start = 'program'
     debugfile = 'parser.out'
+    tabfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser.tab')
 
     precedence = (
         ('nonassoc', 'IFX'),
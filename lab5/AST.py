@@ -24,6 +24,7 @@ class String(Node):
 class Variable(Node):
     def __init__(self, name, lineno=None):
         self.name = name
+        self.slot = None
         self.lineno = lineno
 
 class BinExpr(Node):
@@ -45,6 +46,7 @@ class Assign(Node):
         self.op = op
         self.left = left
         self.right = right
+        self.inplace = False    # compound assignment may overwrite the variable's matrix
         self.lineno = lineno
 
 class UnaryExpr(Node):
@@ -71,6 +73,7 @@ class For(Node):
         self.id = id
         self.range = range
         self.body = body
+        self.slot = None
         self.lineno = lineno
 
 class Break(Node):
@@ -105,6 +108,7 @@ class Ref(Node):
     def __init__(self, name, indices, lineno=None):
         self.name = name
         self.indices = indices
+        self.slot = None
         self.lineno = lineno
 
 class Function(Node):
@@ -124,6 +128,65 @@ class Transpose(Node):
         self.expr = expr
         self.lineno = lineno
 
+class Constant(Node):
+    # value precomputed by an optimization pass, e.g. a matrix built from literals
+    def __init__(self, value, lineno=None):
+        self.value = value
+        self.lineno = lineno
+
+class Slice(Node):
+    # values lo + offset .. hi + offset of a vectorized loop variable: selects
+    # them when used as an index, evaluates to the vector of them elsewhere
+    def __init__(self, lo, hi, offset, index, lineno=None):
+        self.lo = lo
+        self.hi = hi
+        self.offset = offset
+        self.index = index
+        self.lineno = lineno
+
+class VectorFor(Node):
+    # For loop rewritten into whole-array statements over lo..hi; <loop> runs
+    # instead when the matrices at hand do not fit the range (see vector_loop_fits)
+    def __init__(self, loop, var, lo, hi, body, arrays, specs, scalars, bounds, lineno=None):
+        self.loop = loop
+        self.var = var
+        self.lo = lo
+        self.hi = hi
+        self.body = body
+        self.arrays = arrays        # variables indexed in the body
+        self.specs = specs          # per array: offset of the loop variable for each index, None if invariant
+        self.scalars = scalars      # variables read as values, must not hold matrices
+        self.bounds = bounds        # integer arithmetic of the scalar loop, see integer_magnitude
+        self.lineno = lineno
+
+class Fused(Node):
+    # chain of element-wise operators evaluated at once by evaluate_fused: <steps>
+    # is the chain in postfix order, None standing for the next of <operands>
+    def __init__(self, steps, operands, lineno=None):
+        self.steps = steps
+        self.operands = operands
+        self.lineno = lineno
+
+class MatrixChain(Node):
+    # product <operands>[0] * <operands>[1] * ... ordered at runtime by evaluate_chain
+    def __init__(self, operands, lineno=None):
+        self.operands = operands
+        self.lineno = lineno
+
+class SymmetricProduct(Node):
+    # <expr>' * <expr> if <left>, else <expr> * <expr>', evaluating <expr> once
+    def __init__(self, expr, left, lineno=None):
+        self.expr = expr
+        self.left = left
+        self.lineno = lineno
+
+class MatrixPower(Node):
+    # <expr> * <expr> * ... with <power> factors, see matrix_power
+    def __init__(self, expr, power, lineno=None):
+        self.expr = expr
+        self.power = power
+        self.lineno = lineno
+
 class Error(Node):
     def __init__(self, lineno=None):
         self.lineno = lineno
@@ -0,0 +1,171 @@
+
+import AST
+from Operations import multiply
+from Optimizer import (OptimizationPass, literal_value, make_literal, is_scalar, scalar_variables, static_shape,
+                       matrix_shapes, same_expression)
+import numpy as np
+
+
+def identity_size(node):        # n if <node> is the n x n identity matrix, None otherwise
+    if isinstance(node, AST.Function) and node.name == 'eye' and len(node.args) == 1:
+        return literal_value(node.args[0])
+    if isinstance(node, AST.Constant) and isinstance(node.value, np.ndarray) and node.value.ndim == 2 \
+            and node.value.dtype.kind == 'f' and node.value.shape[0] == node.value.shape[1] \
+            and np.array_equal(node.value, np.eye(node.value.shape[0])):
+        return node.value.shape[0]
+    return None
+
+
+def is_zeros(node):             # True if <node> is a float matrix of zeros
+    if isinstance(node, AST.Function) and node.name == 'zeros':
+        return True
+    if isinstance(node, AST.Transpose):
+        return is_zeros(node.expr)
+    return isinstance(node, AST.Constant) and isinstance(node.value, np.ndarray) \
+        and node.value.dtype.kind == 'f' and not node.value.any()
+
+
+def product_operands(node):     # operands of the left-deep '*' chain rooted at <node>
+    operands = []
+    while isinstance(node, AST.BinExpr) and node.op == '*':
+        operands.append(node.right)
+        node = node.left
+    operands.append(node)
+    return operands[::-1]
+
+
+def left_deep(operands, lineno):
+    product = operands[0]
+    for operand in operands[1:]:
+        product = AST.BinExpr('*', product, operand, lineno=lineno)
+    return product
+
+
+# Rewrites products with the identities of matrix algebra. These leave every
+# value as it was:
+#  - (A')' becomes A,
+#  - A' * A and A * A' become a SymmetricProduct, which evaluates A once and
+#    computes the result with the symmetric BLAS kernel.
+# With <fast_math> (main.py --fast-math) also these, which assume the matrices
+# hold no inf, nan or negative zero and allow products to be reassociated, so
+# they can change what a program prints: 0 * inf is nan and 0 * -1 is -0.
+#  - eye(n) * A and A * eye(n) become 1.0 * A (the factor keeps the float
+#    result type of the original product),
+#  - a product with zeros(...) becomes a zero matrix of the product's shape,
+#  - A * A * A (three or more equal square factors) becomes a MatrixPower,
+#    evaluated by repeated squaring,
+#  - numbers are pulled out of a product and folded, 2 * A * 3 * B becomes
+#    6 * (A * B), so only the result is scaled.
+# Identities and zeros are only applied when the shapes of the whole product
+# are known (see static_shape), so a product of mismatched matrices still
+# fails at runtime.
+class AlgebraicSimplifier(OptimizationPass):
+
+    name = "algebraic simplification"
+
+    def __init__(self, fast_math=False):
+        self.fast_math = fast_math
+        self.identities = 0
+        self.zeros = 0
+        self.transposes = 0
+        self.powers = 0
+        self.symmetric = 0
+        self.factored = 0
+        self.scalars = set()
+        self.shapes = {}
+
+    def report(self):
+        return ("{0}: {1} identity factors and {2} zero products removed, {3} double transposes cancelled, "
+                "{4} matrix powers, {5} symmetric products, {6} scalar factorings").format(
+            self.name, self.identities, self.zeros, self.transposes, self.powers, self.symmetric, self.factored)
+
+    def optimize(self, program):
+        self.scalars = scalar_variables(program)
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_Transpose(self, node):
+        node.expr = self.visit(node.expr)
+        if isinstance(node.expr, AST.Transpose):
+            self.transposes += 1
+            return node.expr.expr
+        return node
+
+    def visit_BinExpr(self, node):
+        if node.op != '*':
+            return self.generic_visit(node)
+        operands = [self.visit(operand) for operand in product_operands(node)]
+        original = left_deep(operands, node.lineno)
+        if not self.fast_math:
+            if len(operands) == 2 and not any(is_scalar(operand, self.scalars) for operand in operands):
+                return left_deep(self.symmetric_product(operands), node.lineno)
+            return original
+        factors = [operand for operand in operands if is_scalar(operand, self.scalars)]
+        matrices = [operand for operand in operands if not is_scalar(operand, self.scalars)]
+        if not matrices:
+            return original
+
+        shape = static_shape(original, self.shapes)
+        if shape is not None:
+            if any(is_zeros(matrix) for matrix in matrices):
+                self.zeros += 1
+                if shape == ():
+                    return AST.FloatNum(0.0, lineno=node.lineno)
+                return AST.Constant(np.zeros(shape), lineno=node.lineno)
+            kept = [matrix for matrix in matrices if identity_size(matrix) is None] or matrices[:1]
+            self.identities += len(matrices) - len(kept)
+            to_float = len(kept) < len(matrices)
+            matrices = kept
+        else:
+            to_float = False
+
+        matrices = self.powers_of(matrices)
+        if len(matrices) == 2:
+            matrices = self.symmetric_product(matrices)
+        product = left_deep(matrices, node.lineno)
+
+        factor = self.factor(factors, operands, to_float, node.lineno)
+        if factor is not None:
+            product = AST.BinExpr('*', factor, product, lineno=node.lineno)
+        return product
+
+    def powers_of(self, matrices):      # runs of three or more equal square matrices become powers
+        result = []
+        i = 0
+        while i < len(matrices):
+            j = i + 1
+            while j < len(matrices) and same_expression(matrices[j], matrices[i]):
+                j += 1
+            shape = static_shape(matrices[i], self.shapes)
+            if j - i >= 3 and shape is not None and len(shape) == 2 and shape[0] == shape[1]:
+                self.powers += 1
+                result.append(AST.MatrixPower(matrices[i], j - i, lineno=matrices[i].lineno))
+            else:
+                result.extend(matrices[i:j])
+            i = j
+        return result
+
+    def symmetric_product(self, matrices):
+        first, second = matrices
+        if isinstance(first, AST.Transpose) and same_expression(first.expr, second):
+            self.symmetric += 1
+            return [AST.SymmetricProduct(second, True, lineno=first.lineno)]
+        if isinstance(second, AST.Transpose) and same_expression(second.expr, first):
+            self.symmetric += 1
+            return [AST.SymmetricProduct(first, False, lineno=first.lineno)]
+        return matrices
+
+    def factor(self, factors, operands, to_float, lineno):
+        # the numbers of a product multiplied together, literals folded into one
+        literals = [literal_value(factor) for factor in factors if literal_value(factor) is not None]
+        others = [factor for factor in factors if literal_value(factor) is None]
+        if len(literals) > 1 or any(operand is not factor for operand, factor in zip(operands, factors)):
+            self.factored += 1
+        value = 1
+        for literal in literals:
+            value = multiply(value, literal)
+        if to_float:
+            value = value * 1.0
+        if type(value) is int and value == 1:
+            return left_deep(others, lineno) if others else None
+        return left_deep([make_literal(value, lineno)] + others, lineno)
@@ -0,0 +1,519 @@
+
+import AST
+from Exceptions import *
+from Memory import Frame
+from Operations import (BIN_OPS, REL_OPS, ASSIGN_OPS, vector_loop_fits, evaluate_fused, evaluate_chain,
+                        symmetric_product, matrix_power, assign_in_place)
+from visit import *
+from array import array
+import hashlib
+import marshal
+import numpy as np
+
+BYTECODE_VERSION = 9
+
+# Every instruction takes two slots in the code array: opcode and argument.
+(LOAD_CONST, LOAD_NAME, STORE_NAME, AUG_STORE_NAME, LOAD_REF, STORE_REF, AUG_STORE_REF,
+ BINARY_OP, COMPARE_OP, NEGATE, TRANSPOSE, BUILD_VECTOR, BUILD_INDEX, CALL_FUNCTION,
+ JUMP, POP_JUMP_IF_FALSE, FOR_SETUP, FOR_ITER, POP_TOP, PRINT, RETURN_VALUE,
+ LOAD_MATRIX, BUILD_SLICE, VECTOR_GUARD, FUSED_OP, MATRIX_CHAIN, SYMMETRIC_PRODUCT,
+ MATRIX_POWER) = range(28)
+
+OPNAMES = ('LOAD_CONST', 'LOAD_NAME', 'STORE_NAME', 'AUG_STORE_NAME', 'LOAD_REF', 'STORE_REF',
+           'AUG_STORE_REF', 'BINARY_OP', 'COMPARE_OP', 'NEGATE', 'TRANSPOSE', 'BUILD_VECTOR',
+           'BUILD_INDEX', 'CALL_FUNCTION', 'JUMP', 'POP_JUMP_IF_FALSE', 'FOR_SETUP', 'FOR_ITER',
+           'POP_TOP', 'PRINT', 'RETURN_VALUE', 'LOAD_MATRIX', 'BUILD_SLICE', 'VECTOR_GUARD',
+           'FUSED_OP', 'MATRIX_CHAIN', 'SYMMETRIC_PRODUCT', 'MATRIX_POWER')
+
+BIN_OP_NAMES = tuple(BIN_OPS)
+REL_OP_NAMES = tuple(REL_OPS)
+ASSIGN_OP_NAMES = tuple(ASSIGN_OPS)
+FUNCTIONS = ('eye', 'zeros', 'ones')
+
+
+def source_hash(text):
+    return hashlib.sha256(("%d:" % BYTECODE_VERSION + text).encode()).hexdigest()
+
+
+class Program(object):
+
+    def __init__(self, code, consts, names, diagnostics="", key=None):
+        self.code = code                # array of (opcode, argument) pairs
+        self.consts = consts            # literal values
+        self.names = names              # variable names, indexed by LOAD_NAME/STORE_NAME
+        self.diagnostics = diagnostics  # front end messages, replayed when loaded from disk
+        self.key = key                  # hash of the source the program was compiled from
+
+    def save(self, filename):
+        consts = [self.pack(c) for c in self.consts]
+        data = (BYTECODE_VERSION, self.key, self.code.tobytes(), consts, self.names, self.diagnostics)
+        with open(filename, "wb") as file:
+            marshal.dump(data, file)
+
+    @staticmethod
+    def load(filename, key=None):
+        # returns None if there is no valid program for source <key> in <filename>
+        try:
+            with open(filename, "rb") as file:
+                version, stored_key, code, consts, names, diagnostics = marshal.load(file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+        if version != BYTECODE_VERSION or (key is not None and stored_key != key):
+            return None
+        return Program(array('i', code), [Program.unpack(c) for c in consts], names, diagnostics, stored_key)
+
+    @staticmethod
+    def pack(value):        # matrices are not marshallable, store them as raw bytes
+        if isinstance(value, np.ndarray):
+            return (value.dtype.str, value.shape, value.tobytes())
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    @staticmethod
+    def unpack(value):
+        if isinstance(value, tuple):
+            dtype, shape, data = value
+            return np.frombuffer(data, dtype=dtype).reshape(shape).copy()
+        if isinstance(value, list):
+            return tuple(value)
+        return value
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            lines.append("{0:5d} {1:18s} {2}".format(pc, OPNAMES[op], arg))
+        return "\n".join(lines)
+
+
+# Compiles the AST into a Program by visiting it recursively, so like the
+# parser's tree building, the passes and the other engines it needs Python
+# stack frames in proportion to how deeply the program nests; main.py raises
+# the recursion limit for all of them, a program nested deeper still fails
+# with RecursionError.
+class BytecodeCompiler(object):
+
+    def __init__(self):
+        self.code = array('i')
+        self.consts = []
+        self.names = []
+        self.const_index = {}
+        self.name_index = {}
+        self.loops = []     # (is_for, continue_target, break_fixups) for enclosing loops
+        self.exits = []     # fixups of break and continue outside any loop, they end the program
+
+    def compile(self, node, diagnostics="", key=None):
+        node.accept(self)
+        for fixup in self.exits:
+            self.patch(fixup, self.label())
+        return Program(self.code, self.consts, self.names, diagnostics, key)
+
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 1   # position of the argument, for jump fixups
+
+    def label(self):
+        return len(self.code)
+
+    def patch(self, fixup, target):
+        self.code[fixup] = target
+
+    def const(self, value):
+        if isinstance(value, np.ndarray):
+            self.consts.append(value)
+            return len(self.consts) - 1
+        key = (type(value), repr(value))     # 0.0 and -0.0 are equal but print differently
+        if key not in self.const_index:
+            self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_index[key]
+
+    def name(self, name):
+        if name not in self.name_index:
+            self.name_index[name] = len(self.names)
+            self.names.append(name)
+        return self.name_index[name]
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+    @when(AST.IntNum)
+    def visit(self, node):
+        self.emit(LOAD_CONST, self.const(node.value))
+
+    @when(AST.FloatNum)
+    def visit(self, node):
+        self.emit(LOAD_CONST, self.const(node.value))
+
+    @when(AST.String)
+    def visit(self, node):
+        self.emit(LOAD_CONST, self.const(node.value))
+
+    @when(AST.Variable)
+    def visit(self, node):
+        self.emit(LOAD_NAME, self.name(node.name))
+
+    @when(AST.BinExpr)
+    def visit(self, node):
+        node.left.accept(self)
+        node.right.accept(self)
+        self.emit(BINARY_OP, BIN_OP_NAMES.index(node.op))
+
+    @when(AST.RelExpr)
+    def visit(self, node):
+        node.left.accept(self)
+        node.right.accept(self)
+        self.emit(COMPARE_OP, REL_OP_NAMES.index(node.op))
+
+    @when(AST.UnaryExpr)
+    def visit(self, node):
+        node.expr.accept(self)
+        if node.op == '-':
+            self.emit(NEGATE)
+
+    @when(AST.Assign)
+    def visit(self, node):
+        node.right.accept(self)
+        name = self.name(node.left.name)
+
+        if isinstance(node.left, AST.Variable):
+            if node.op == '=':
+                self.emit(STORE_NAME, name)
+            else:
+                self.emit(AUG_STORE_NAME, name << 4 | node.inplace << 3 | ASSIGN_OP_NAMES.index(node.op))
+
+        elif isinstance(node.left, AST.Ref):
+            self.index(node.left.indices)
+            if node.op == '=':
+                self.emit(STORE_REF, name)
+            else:
+                self.emit(AUG_STORE_REF, name << 3 | ASSIGN_OP_NAMES.index(node.op))
+
+    def index(self, indices):
+        for idx in indices:
+            idx.accept(self)
+        self.emit(BUILD_INDEX, len(indices))
+
+    @when(AST.If)
+    def visit(self, node):
+        node.cond.accept(self)
+        to_else = self.emit(POP_JUMP_IF_FALSE)
+        node.if_body.accept(self)
+        if node.else_body:
+            to_end = self.emit(JUMP)
+            self.patch(to_else, self.label())
+            node.else_body.accept(self)
+            self.patch(to_end, self.label())
+        else:
+            self.patch(to_else, self.label())
+
+    @when(AST.While)
+    def visit(self, node):
+        start = self.label()
+        node.cond.accept(self)
+        to_end = self.emit(POP_JUMP_IF_FALSE)
+        self.loops.append((False, start, [to_end]))
+        node.body.accept(self)
+        self.emit(JUMP, start)
+        end = self.label()
+        for fixup in self.loops.pop()[2]:
+            self.patch(fixup, end)
+
+    @when(AST.For)
+    def visit(self, node):
+        node.range.accept(self)
+        self.emit(FOR_SETUP)
+        start = self.label()
+        to_end = self.emit(FOR_ITER)
+        self.emit(STORE_NAME, self.name(node.id))
+        self.loops.append((True, start, [to_end]))
+        node.body.accept(self)
+        self.emit(JUMP, start)
+        end = self.label()
+        for fixup in self.loops.pop()[2]:
+            self.patch(fixup, end)
+
+    @when(AST.VectorFor)
+    def visit(self, node):
+        lo, hi = self.name(node.lo.name), self.name(node.hi.name)
+        node.loop.range.accept(self)
+        self.emit(STORE_NAME, hi)
+        self.emit(STORE_NAME, lo)
+        self.emit(LOAD_NAME, lo)
+        self.emit(LOAD_NAME, hi)
+        for var in node.arrays + node.scalars:
+            var.accept(self)
+        guard = (len(node.arrays), len(node.scalars), tuple(node.specs), tuple(node.bounds))
+        self.emit(VECTOR_GUARD, self.const(guard))
+        to_loop = self.emit(POP_JUMP_IF_FALSE)
+        for stmt in node.body:
+            stmt.accept(self)
+        self.emit(LOAD_NAME, hi)
+        self.emit(STORE_NAME, self.name(node.var.name))
+        to_end = self.emit(JUMP)
+        self.patch(to_loop, self.label())
+        node.loop.accept(self)
+        self.patch(to_end, self.label())
+
+    @when(AST.Fused)
+    def visit(self, node):
+        for operand in node.operands:
+            operand.accept(self)
+        self.emit(FUSED_OP, self.const((len(node.operands), node.steps)))
+
+    @when(AST.MatrixChain)
+    def visit(self, node):
+        for operand in node.operands:
+            operand.accept(self)
+        self.emit(MATRIX_CHAIN, len(node.operands))
+
+    @when(AST.SymmetricProduct)
+    def visit(self, node):
+        node.expr.accept(self)
+        self.emit(SYMMETRIC_PRODUCT, node.left)
+
+    @when(AST.MatrixPower)
+    def visit(self, node):
+        node.expr.accept(self)
+        self.emit(MATRIX_POWER, node.power)
+
+    @when(AST.Slice)
+    def visit(self, node):
+        node.lo.accept(self)
+        node.hi.accept(self)
+        self.emit(BUILD_SLICE, node.offset << 1 | node.index)
+
+    @when(AST.Range)
+    def visit(self, node):
+        node.start.accept(self)
+        node.end.accept(self)
+
+    @when(AST.Break)
+    def visit(self, node):
+        if not self.loops:
+            self.exits.append(self.emit(JUMP))
+            return
+        is_for, start, fixups = self.loops[-1]
+        if is_for:
+            self.emit(POP_TOP)   # drop the range iterator, FOR_ITER did not get to do it
+        fixups.append(self.emit(JUMP))
+
+    @when(AST.Continue)
+    def visit(self, node):
+        if not self.loops:
+            self.exits.append(self.emit(JUMP))
+            return
+        self.emit(JUMP, self.loops[-1][1])
+
+    @when(AST.Return)
+    def visit(self, node):
+        if node.expr:
+            node.expr.accept(self)
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+        self.emit(RETURN_VALUE)
+
+    @when(AST.Print)
+    def visit(self, node):
+        for arg in node.args:
+            arg.accept(self)
+        self.emit(PRINT, len(node.args))
+
+    @when(AST.Compound)
+    def visit(self, node):
+        for stmt in node.statements:
+            stmt.accept(self)
+
+    @when(AST.Vector)
+    def visit(self, node):
+        for elem in node.elements:
+            elem.accept(self)
+        self.emit(BUILD_VECTOR, len(node.elements))
+
+    @when(AST.Ref)
+    def visit(self, node):
+        name = self.name(node.name)
+        if len(node.indices) in (1, 2):
+            self.index(node.indices)
+            self.emit(LOAD_REF, name)
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+
+    @when(AST.Function)
+    def visit(self, node):
+        if node.name in FUNCTIONS and (len(node.args) in (1, 2)):
+            for arg in node.args:
+                arg.accept(self)
+            self.emit(CALL_FUNCTION, FUNCTIONS.index(node.name) << 2 | len(node.args))
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+
+    @when(AST.Transpose)
+    def visit(self, node):
+        node.expr.accept(self)
+        self.emit(TRANSPOSE)
+
+    @when(AST.Constant)
+    def visit(self, node):
+        if isinstance(node.value, np.ndarray):
+            self.emit(LOAD_MATRIX, self.const(node.value))
+        else:
+            self.emit(LOAD_CONST, self.const(node.value))
+
+    @when(AST.Error)
+    def visit(self, node):
+        pass
+
+
+seal(BytecodeCompiler, AST.Node)
+
+
+class VirtualMachine(object):
+
+    def __init__(self, program):
+        self.program = program
+        self.frame = Frame()            # variables are numbered like program.names
+        for name in program.names:
+            self.frame.slot(name)
+        self.variables = self.frame.slots
+
+    def run(self):
+        code = self.program.code
+        consts = self.program.consts
+        variables = self.variables
+        private, store, writable, ndarray = self.frame.private, self.frame.store, self.frame.writable, np.ndarray
+        bin_ops = [BIN_OPS[op] for op in BIN_OP_NAMES]
+        rel_ops = [REL_OPS[op] for op in REL_OP_NAMES]
+        assign_ops = [ASSIGN_OPS[op] for op in ASSIGN_OP_NAMES]
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(code)
+
+        while pc < end:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                push(variables[arg])
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_NAME:
+                value = pop()
+                if isinstance(value, ndarray) or isinstance(variables[arg], ndarray):
+                    store(arg, value)
+                else:
+                    variables[arg] = value
+            elif op == BINARY_OP:
+                right = pop()
+                stack[-1] = bin_ops[arg](stack[-1], right)
+            elif op == COMPARE_OP:
+                right = pop()
+                stack[-1] = rel_ops[arg](stack[-1], right)
+            elif op == POP_JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == FOR_ITER:
+                value = next(stack[-1], None)
+                if value is None:
+                    pop()
+                    pc = arg
+                else:
+                    push(value)
+            elif op == AUG_STORE_NAME:
+                name = arg >> 4
+                if arg & 8:
+                    old = variables[name] if private[name] else writable(name)
+                    value = assign_in_place(ASSIGN_OP_NAMES[arg & 7], old, pop())
+                    if value is not old:
+                        store(name, value)
+                else:
+                    value = assign_ops[arg & 7](variables[name], pop())
+                    if isinstance(value, ndarray) or isinstance(variables[name], ndarray):
+                        store(name, value)
+                    else:
+                        variables[name] = value
+            elif op == BUILD_INDEX:
+                if arg == 1:
+                    stack[-1] = (stack[-1],)
+                else:
+                    index = tuple(stack[-arg:])
+                    del stack[-arg:]
+                    push(index)
+            elif op == LOAD_REF:
+                index = pop()
+                push(variables[arg][index])
+            elif op == STORE_REF:
+                index = pop()
+                var = variables[arg] if private[arg] else writable(arg)
+                var[index] = pop()
+            elif op == AUG_STORE_REF:
+                index = pop()
+                var = variables[arg >> 3] if private[arg >> 3] else writable(arg >> 3)
+                old = var[index]
+                result = assign_in_place(ASSIGN_OP_NAMES[arg & 7], old, pop())
+                if result is not old:
+                    var[index] = result
+            elif op == NEGATE:
+                stack[-1] = -stack[-1]
+            elif op == TRANSPOSE:
+                stack[-1] = stack[-1].T
+            elif op == PRINT:
+                values = stack[-arg:] if arg else []
+                del stack[len(stack) - arg:]
+                print(*values)
+            elif op == BUILD_VECTOR:
+                elements = stack[-arg:] if arg else []
+                del stack[len(stack) - arg:]
+                push(np.array(elements))
+            elif op == CALL_FUNCTION:
+                argc = arg & 3
+                args = stack[-argc:]
+                del stack[-argc:]
+                fn = FUNCTIONS[arg >> 2]
+                if fn == 'eye':
+                    push(np.eye(args[0]))
+                elif argc == 1:
+                    push((np.zeros if fn == 'zeros' else np.ones)(args[0]))
+                else:
+                    push((np.zeros if fn == 'zeros' else np.ones)((args[0], args[1])))
+            elif op == FOR_SETUP:
+                end_value = pop()
+                stack[-1] = iter(range(stack[-1], end_value + 1))
+            elif op == LOAD_MATRIX:
+                push(consts[arg].copy())
+            elif op == BUILD_SLICE:
+                offset = arg >> 1
+                hi = pop() + offset
+                lo = stack[-1] + offset
+                stack[-1] = slice(lo, hi + 1) if arg & 1 else np.arange(lo, hi + 1)
+            elif op == FUSED_OP:
+                count, steps = consts[arg]
+                operands = stack[-count:]
+                del stack[-count:]
+                push(evaluate_fused(steps, operands))
+            elif op == MATRIX_CHAIN:
+                operands = stack[-arg:]
+                del stack[-arg:]
+                push(evaluate_chain(operands))
+            elif op == SYMMETRIC_PRODUCT:
+                stack[-1] = symmetric_product(stack[-1], arg)
+            elif op == MATRIX_POWER:
+                stack[-1] = matrix_power(stack[-1], arg)
+            elif op == VECTOR_GUARD:
+                narrays, nscalars, specs, bounds = consts[arg]
+                values = stack[-(2 + narrays + nscalars):]
+                del stack[-(2 + narrays + nscalars):]
+                push(vector_loop_fits(values[0], values[1], values[2:2 + narrays], specs, values[2 + narrays:],
+                                      bounds))
+            elif op == POP_TOP:
+                pop()
+            elif op == RETURN_VALUE:
+                raise ReturnValueException(pop())
@@ -0,0 +1,308 @@
+
+import AST
+from Memory import *
+from Exceptions import *
+from Operations import (BIN_OPS, REL_OPS, ASSIGN_OPS, BREAK, CONTINUE, vector_loop_fits, evaluate_fused,
+                        evaluate_chain, symmetric_product, matrix_power, assign_in_place)
+from visit import *
+import numpy as np
+
+
+# Turns the AST into a tree of pre-bound Python closures. Every node is
+# visited exactly once here; running the program afterwards only calls the
+# closures, so there is no Dispatcher lookup and no operator table lookup
+# left in the hot path. Statement closures return the status of Interpreter
+# (BREAK, CONTINUE or None).
+class ClosureCompiler(object):
+
+    def __init__(self, frame=None):   # <frame> holds the slots assigned by Resolver
+        self.frame = frame if frame else Frame()
+        self.slots = self.frame.slots
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+    @when(AST.IntNum)
+    def visit(self, node):
+        value = node.value
+        return lambda: value
+
+    @when(AST.FloatNum)
+    def visit(self, node):
+        value = node.value
+        return lambda: value
+
+    @when(AST.String)
+    def visit(self, node):
+        value = node.value
+        return lambda: value
+
+    @when(AST.Variable)
+    def visit(self, node):
+        slots = self.slots
+        slot = node.slot
+        return lambda: slots[slot]
+
+    @when(AST.BinExpr)
+    def visit(self, node):
+        op = BIN_OPS[node.op]
+        left = node.left.accept(self)
+        right = node.right.accept(self)
+        return lambda: op(left(), right())
+
+    @when(AST.RelExpr)
+    def visit(self, node):
+        op = REL_OPS[node.op]
+        left = node.left.accept(self)
+        right = node.right.accept(self)
+        return lambda: op(left(), right())
+
+    @when(AST.UnaryExpr)
+    def visit(self, node):
+        expr = node.expr.accept(self)
+        if node.op == '-':
+            return lambda: -expr()
+        return expr
+
+    @when(AST.Assign)
+    def visit(self, node):
+        value = node.right.accept(self)
+        slots = self.slots
+        slot = node.left.slot
+        # matrices are bound through the frame, which tracks sharing for copy-on-write
+        private, store, writable, ndarray = self.frame.private, self.frame.store, self.frame.writable, np.ndarray
+
+        if isinstance(node.left, AST.Variable):
+            if node.op == '=':
+                def assign():
+                    new = value()
+                    if isinstance(new, ndarray) or isinstance(slots[slot], ndarray):
+                        store(slot, new)
+                    else:
+                        slots[slot] = new
+            elif node.inplace:
+                op = node.op
+                def assign():
+                    new = value()
+                    old = slots[slot] if private[slot] else writable(slot)
+                    result = assign_in_place(op, old, new)
+                    if result is not old:
+                        store(slot, result)
+            else:
+                op = ASSIGN_OPS[node.op]
+                def assign():
+                    new = op(slots[slot], value())
+                    if isinstance(new, ndarray) or isinstance(slots[slot], ndarray):
+                        store(slot, new)
+                    else:
+                        slots[slot] = new
+            return assign
+
+        elif isinstance(node.left, AST.Ref):
+            indices = [idx.accept(self) for idx in node.left.indices]
+            if node.op == '=':
+                def assign():
+                    new = value()
+                    var = slots[slot] if private[slot] else writable(slot)
+                    var[tuple(idx() for idx in indices)] = new
+            else:
+                op = node.op
+                def assign():
+                    new = value()
+                    var = slots[slot] if private[slot] else writable(slot)
+                    key = tuple(idx() for idx in indices)
+                    old = var[key]
+                    result = assign_in_place(op, old, new)
+                    if result is not old:
+                        var[key] = result
+            return assign
+
+    @when(AST.If)
+    def visit(self, node):
+        cond = node.cond.accept(self)
+        if_body = node.if_body.accept(self)
+        if node.else_body:
+            else_body = node.else_body.accept(self)
+            def branch():
+                if cond():
+                    return if_body()
+                return else_body()
+        else:
+            def branch():
+                if cond():
+                    return if_body()
+        return branch
+
+    @when(AST.While)
+    def visit(self, node):
+        cond = node.cond.accept(self)
+        body = node.body.accept(self)
+
+        def loop():
+            while cond():
+                if body() is BREAK:
+                    break
+        return loop
+
+    @when(AST.For)
+    def visit(self, node):
+        range_obj = node.range.accept(self)
+        body = node.body.accept(self)
+        store = self.frame.store
+        slot = node.slot
+
+        def loop():
+            start, end = range_obj()
+            for i in range(start, end + 1):
+                store(slot, i)      # the variable may have held a matrix
+                if body() is BREAK:
+                    break
+        return loop
+
+    @when(AST.VectorFor)
+    def visit(self, node):
+        range_obj = node.loop.range.accept(self)
+        loop = node.loop.accept(self)
+        body = [stmt.accept(self) for stmt in node.body]
+        slots, store = self.slots, self.frame.store
+        var, lo, hi = node.var.slot, node.lo.slot, node.hi.slot
+        arrays = [array.slot for array in node.arrays]
+        scalars = [scalar.slot for scalar in node.scalars]
+        specs, bounds = node.specs, node.bounds
+
+        def vector_loop():
+            start, end = range_obj()
+            slots[lo] = start
+            slots[hi] = end
+            if not vector_loop_fits(start, end, [slots[slot] for slot in arrays], specs,
+                                    [slots[slot] for slot in scalars], bounds):
+                return loop()
+            for stmt in body:
+                stmt()
+            store(var, end)
+        return vector_loop
+
+    @when(AST.Fused)
+    def visit(self, node):
+        steps = node.steps
+        operands = [operand.accept(self) for operand in node.operands]
+        return lambda: evaluate_fused(steps, [operand() for operand in operands])
+
+    @when(AST.MatrixChain)
+    def visit(self, node):
+        operands = [operand.accept(self) for operand in node.operands]
+        return lambda: evaluate_chain([operand() for operand in operands])
+
+    @when(AST.SymmetricProduct)
+    def visit(self, node):
+        expr, left = node.expr.accept(self), node.left
+        return lambda: symmetric_product(expr(), left)
+
+    @when(AST.MatrixPower)
+    def visit(self, node):
+        expr, power = node.expr.accept(self), node.power
+        return lambda: matrix_power(expr(), power)
+
+    @when(AST.Slice)
+    def visit(self, node):
+        slots = self.slots
+        lo, hi = node.lo.slot, node.hi.slot
+        offset = node.offset
+        if node.index:
+            return lambda: slice(slots[lo] + offset, slots[hi] + offset + 1)
+        return lambda: np.arange(slots[lo] + offset, slots[hi] + offset + 1)
+
+    @when(AST.Range)
+    def visit(self, node):
+        start = node.start.accept(self)
+        end = node.end.accept(self)
+        return lambda: (start(), end())
+
+    @when(AST.Break)
+    def visit(self, node):
+        return lambda: BREAK
+
+    @when(AST.Continue)
+    def visit(self, node):
+        return lambda: CONTINUE
+
+    @when(AST.Return)
+    def visit(self, node):
+        expr = node.expr.accept(self) if node.expr else lambda: None
+
+        def jump():
+            raise ReturnValueException(expr())
+        return jump
+
+    @when(AST.Print)
+    def visit(self, node):
+        args = [arg.accept(self) for arg in node.args]
+        return lambda: print(*[arg() for arg in args])
+
+    @when(AST.Compound)
+    def visit(self, node):
+        statements = [stmt.accept(self) for stmt in node.statements]
+
+        def block():
+            for stmt in statements:
+                status = stmt()
+                if status is not None:
+                    return status
+        return block
+
+    @when(AST.Vector)
+    def visit(self, node):
+        elements = [elem.accept(self) for elem in node.elements]
+        return lambda: np.array([elem() for elem in elements])
+
+    @when(AST.Ref)
+    def visit(self, node):
+        slots = self.slots
+        slot = node.slot
+        indices = [idx.accept(self) for idx in node.indices]
+
+        if len(indices) == 1:
+            index, = indices
+            return lambda: slots[slot][index()]
+        elif len(indices) == 2:
+            row, col = indices
+            def ref():
+                var = slots[slot]
+                return var[row(), col()]
+            return ref
+        return lambda: None
+
+    @when(AST.Function)
+    def visit(self, node):
+        args = [arg.accept(self) for arg in node.args]
+
+        if node.name == 'eye':
+            return lambda: np.eye(args[0]())
+        elif node.name in ('zeros', 'ones'):
+            fn = np.zeros if node.name == 'zeros' else np.ones
+            if len(args) == 1:
+                return lambda: fn(args[0]())
+            elif len(args) == 2:
+                rows, cols = args
+                return lambda: fn((rows(), cols()))
+        return lambda: None
+
+    @when(AST.Constant)
+    def visit(self, node):
+        value = node.value
+        if isinstance(value, np.ndarray):
+            return value.copy
+        return lambda: value
+
+    @when(AST.Transpose)
+    def visit(self, node):
+        expr = node.expr.accept(self)
+        return lambda: expr().T
+
+    @when(AST.Error)
+    def visit(self, node):
+        return lambda: None
+
+
+seal(ClosureCompiler, AST.Node)
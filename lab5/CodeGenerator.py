@@ -0,0 +1,361 @@
+
+import AST
+from Exceptions import *
+from Operations import NUMBER_TYPES
+from visit import *
+import math
+import ast as pyast
+import numpy as np
+
+
+HEADER = """\
+# generated by CodeGenerator from a lab5 program, run it from the lab5 directory
+import numpy as np
+from Exceptions import ReturnValueException
+from Operations import (multiply, assign_in_place, evaluate_fused, evaluate_chain, symmetric_product,
+                        matrix_power, vector_loop_fits)
+from CodeGenerator import owned
+
+"""
+
+ELEMENT_UFUNCS = {'.+': 'np.add', '.-': 'np.subtract', '.*': 'np.multiply', './': 'np.divide'}
+INLINE_OPS = ('+', '-', '/')
+SCALAR_ASSIGN_OPS = ('+=', '-=', '*=', '/=')
+
+
+def owned(value):       # <value> as a variable may hold it: a matrix gets a copy of its own
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
+
+def literal(value):     # Python source evaluating to <value>
+    if isinstance(value, np.ndarray):
+        if value.size == 0:
+            return "np.empty({0!r}, dtype={1!r})".format(value.shape, value.dtype.name)
+        first = value.flat[0]
+        if (value == first).all():
+            return "np.full({0!r}, {1}, dtype={2!r})".format(value.shape, literal(first.item()), value.dtype.name)
+        return "np.array({0}, dtype={1!r})".format(literal(value.tolist()), value.dtype.name)
+    if isinstance(value, list):
+        return "[{0}]".format(", ".join(literal(elem) for elem in value))
+    if isinstance(value, np.generic):
+        return "np.{0}({1})".format(type(value).__name__, literal(value.item()))
+    if isinstance(value, float) and not math.isfinite(value):
+        return "float({0!r})".format(repr(value))
+    return repr(value)
+
+
+def local_name(name):   # Python local holding program variable <name>; '$' starts the passes' temporaries
+    if name.startswith('$'):
+        return 't_' + name[1:]
+    return 'v_' + name
+
+
+def fresh(node):        # True if expression <node> never evaluates to a matrix some variable holds
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.BinExpr, AST.RelExpr, AST.Vector,
+                         AST.Function, AST.Constant, AST.MatrixChain, AST.SymmetricProduct, AST.Error)):
+        return True
+    if isinstance(node, AST.UnaryExpr):
+        return node.op == '-'
+    if isinstance(node, AST.Fused):
+        return len(node.steps) > 1
+    if isinstance(node, AST.MatrixPower):
+        return node.power > 1
+    return False
+
+
+# Translates the program into the source of a Python module whose function
+# program() runs it; executed with run(), the program runs as ordinary Python
+# code with no visitor, closure or operator table between its statements.
+# Variables are locals of program(), loops are Python loops with native break
+# and continue, and operators on numbers (types recorded by TypeChecker) are
+# Python operators; everything else calls the helpers the other engines use.
+# Instead of copy-on-write through a Frame every variable owns its matrix:
+# assigning a matrix another variable may hold (B = A, B = A', B = A[0])
+# copies it, so element assignment and in-place operators write directly.
+class CodeGenerator(object):
+
+    def __init__(self, types=None):   # <types>, if given, holds the node types recorded by TypeChecker
+        self.types = types if types is not None else {}
+        self.names = set()      # locals of program()
+        self.lines = []
+        self.sources = []       # line of the program each of self.lines comes from, 0 if none
+        self.lineno = 0         # line of the statement generated now
+        self.indent = 0
+        self.loops = 0          # loops around the statements generated now
+
+    def generate(self, program):
+        # source of the module running <program>; its LINES maps the number
+        # of each line of the module to the line of the program it comes from
+        self.names = set()
+        self.lines = []
+        self.sources = []
+        self.lineno = 0
+        self.indent = 0
+        self.block(program)
+        init = ["    {0} = None".format(" = ".join(sorted(self.names)))] if self.names else []
+        lines = [0] * (HEADER.count("\n") + 2 + len(init)) + self.sources
+        return HEADER + "\n".join(["def program():"] + init + self.lines) + \
+            "\n\n\nLINES = {0!r}\n".format(tuple(lines)) + \
+            "\n\nif __name__ == '__main__':\n    program()\n"
+
+    def emit(self, line):
+        self.lines.append('    ' * self.indent + line)
+        self.sources.append(self.lineno)
+
+    def statement(self, node):
+        lineno = self.lineno
+        self.lineno = node.lineno or lineno     # statements the passes add have none
+        node.accept(self)
+        self.lineno = lineno
+
+    def block(self, node):      # statements of <node> one level deeper, 'pass' if there are none
+        self.indent += 1
+        count = len(self.lines)
+        self.statement(node)
+        if len(self.lines) == count:
+            self.emit("pass")
+        self.indent -= 1
+
+    def local(self, name):
+        name = local_name(name)
+        self.names.add(name)
+        return name
+
+    def number(self, node):
+        return self.types.get(node) in NUMBER_TYPES
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+    # statements: emit lines
+
+    @when(AST.Compound)
+    def visit(self, node):
+        for stmt in node.statements:
+            self.statement(stmt)
+
+    @when(AST.Assign)
+    def visit(self, node):
+        value = node.right.accept(self)
+        if isinstance(node.left, AST.Ref):
+            var = self.local(node.left.name)
+            key = ", ".join(index.accept(self) for index in node.left.indices)
+            if node.op == '=':
+                self.emit("{0}[{1}] = {2}".format(var, key, value))
+            elif node.op in SCALAR_ASSIGN_OPS and len(node.left.indices) == 2 and self.number(node.right):
+                # Python reads the element of var[key] op= value before it evaluates value
+                self.emit("new = {0}; {1}[{2}] {3} new".format(value, var, key, node.op))
+            else:
+                self.emit("new = {0}; key = ({1},); old = {2}[key]".format(value, key, var))
+                self.emit("result = assign_in_place({0!r}, old, new)".format(node.op))
+                self.emit("if result is not old: {0}[key] = result".format(var))
+            return
+
+        var = self.local(node.left.name)
+        if node.op == '=':
+            if not fresh(node.right) and not self.number(node.right):
+                value = "owned({0})".format(value)
+            self.emit("{0} = {1}".format(var, value))
+        elif node.inplace:
+            self.emit("{0} = assign_in_place({1!r}, {0}, {2})".format(var, node.op, value))
+        elif node.op in SCALAR_ASSIGN_OPS and self.number(node.left) and self.number(node.right):
+            self.emit("{0} {1} {2}".format(var, node.op, value))
+        else:
+            self.emit("{0} = {1}".format(var, self.binary(node.op[:-1], var, value, node.left, node.right)))
+
+    @when(AST.If)
+    def visit(self, node):
+        self.emit("if {0}:".format(node.cond.accept(self)))
+        self.block(node.if_body)
+        if node.else_body:
+            self.emit("else:")
+            self.block(node.else_body)
+
+    @when(AST.While)
+    def visit(self, node):
+        self.emit("while {0}:".format(node.cond.accept(self)))
+        self.loops += 1
+        self.block(node.body)
+        self.loops -= 1
+
+    @when(AST.For)
+    def visit(self, node):
+        start, end = node.range.accept(self)
+        self.emit("for {0} in range({1}, {2} + 1):".format(self.local(node.id), start, end))
+        self.loops += 1
+        self.block(node.body)
+        self.loops -= 1
+
+    @when(AST.VectorFor)
+    def visit(self, node):
+        start, end = node.loop.range.accept(self)
+        var, lo, hi = self.local(node.var.name), self.local(node.lo.name), self.local(node.hi.name)
+        arrays = ", ".join(self.local(array.name) for array in node.arrays)
+        scalars = ", ".join(self.local(scalar.name) for scalar in node.scalars)
+        self.emit("{0}, {1} = {2}, {3}".format(lo, hi, start, end))
+        self.emit("if vector_loop_fits({0}, {1}, [{2}], {3!r}, [{4}], {5!r}):".format(
+            lo, hi, arrays, node.specs, scalars, node.bounds))
+        self.indent += 1
+        for stmt in node.body:
+            self.statement(stmt)
+        self.emit("{0} = {1}".format(var, hi))
+        self.indent -= 1
+        self.emit("else:")
+        self.indent += 1
+        self.statement(node.loop)
+        self.indent -= 1
+
+    @when(AST.Break)
+    def visit(self, node):
+        self.emit("break" if self.loops else "return")     # outside a loop it ends the program, as in Interpreter
+
+    @when(AST.Continue)
+    def visit(self, node):
+        self.emit("continue" if self.loops else "return")
+
+    @when(AST.Return)
+    def visit(self, node):
+        self.emit("raise ReturnValueException({0})".format(node.expr.accept(self) if node.expr else "None"))
+
+    @when(AST.Print)
+    def visit(self, node):
+        self.emit("print({0})".format(", ".join(arg.accept(self) for arg in node.args)))
+
+    # expressions: return their source
+
+    @when(AST.IntNum)
+    def visit(self, node):
+        return literal(node.value)
+
+    @when(AST.FloatNum)
+    def visit(self, node):
+        return literal(node.value)
+
+    @when(AST.String)
+    def visit(self, node):
+        return literal(node.value)
+
+    @when(AST.Constant)
+    def visit(self, node):
+        return literal(node.value)
+
+    @when(AST.Variable)
+    def visit(self, node):
+        return self.local(node.name)
+
+    @when(AST.BinExpr)
+    def visit(self, node):
+        return self.binary(node.op, node.left.accept(self), node.right.accept(self), node.left, node.right)
+
+    def binary(self, op, left, right, left_node, right_node):
+        if op in INLINE_OPS:
+            return "({0} {1} {2})".format(left, op, right)
+        if op == '*':
+            if self.number(left_node) or self.number(right_node):
+                return "({0} * {1})".format(left, right)
+            if isinstance(self.types.get(left_node), tuple) and isinstance(self.types.get(right_node), tuple):
+                return "({0} @ {1})".format(left, right)
+            return "multiply({0}, {1})".format(left, right)
+        return "{0}({1}, {2})".format(ELEMENT_UFUNCS[op], left, right)
+
+    @when(AST.RelExpr)
+    def visit(self, node):
+        return "({0} {1} {2})".format(node.left.accept(self), node.op, node.right.accept(self))
+
+    @when(AST.UnaryExpr)
+    def visit(self, node):
+        expr = node.expr.accept(self)
+        return "(-{0})".format(expr) if node.op == '-' else expr
+
+    @when(AST.Transpose)
+    def visit(self, node):
+        return "({0}).T".format(node.expr.accept(self))
+
+    @when(AST.Vector)
+    def visit(self, node):
+        return "np.array([{0}])".format(", ".join(elem.accept(self) for elem in node.elements))
+
+    @when(AST.Ref)
+    def visit(self, node):
+        if len(node.indices) not in (1, 2):
+            return "None"
+        return "{0}[{1}]".format(self.local(node.name), ", ".join(index.accept(self) for index in node.indices))
+
+    @when(AST.Function)
+    def visit(self, node):
+        args = [arg.accept(self) for arg in node.args]
+        if node.name == 'eye':
+            return "np.eye({0})".format(args[0])
+        elif node.name in ('zeros', 'ones') and len(args) in (1, 2):
+            return "np.{0}({1})".format(node.name, args[0] if len(args) == 1 else "({0}, {1})".format(*args))
+        return "None"
+
+    @when(AST.Range)
+    def visit(self, node):
+        return node.start.accept(self), node.end.accept(self)
+
+    @when(AST.Slice)
+    def visit(self, node):
+        lo, hi = self.local(node.lo.name), self.local(node.hi.name)
+        function = "slice" if node.index else "np.arange"
+        return "{0}({1} + {3}, {2} + {3} + 1)".format(function, lo, hi, node.offset)
+
+    @when(AST.Fused)
+    def visit(self, node):
+        operands = ", ".join(operand.accept(self) for operand in node.operands)
+        return "evaluate_fused({0!r}, [{1}])".format(node.steps, operands)
+
+    @when(AST.MatrixChain)
+    def visit(self, node):
+        return "evaluate_chain([{0}])".format(", ".join(operand.accept(self) for operand in node.operands))
+
+    @when(AST.SymmetricProduct)
+    def visit(self, node):
+        return "symmetric_product({0}, {1!r})".format(node.expr.accept(self), node.left)
+
+    @when(AST.MatrixPower)
+    def visit(self, node):
+        return "matrix_power({0}, {1!r})".format(node.expr.accept(self), node.power)
+
+    @when(AST.Error)
+    def visit(self, node):
+        return "None"
+
+
+seal(CodeGenerator, AST.Node)
+
+
+def program_lines(tree):
+    # gives the nodes of module <tree> the lines of the program its LINES maps
+    # them to, and no columns: errors then point at the program's own lines
+    lines = next(pyast.literal_eval(stmt.value) for stmt in tree.body
+                 if isinstance(stmt, pyast.Assign) and stmt.targets[0].id == 'LINES')
+    for node in pyast.walk(tree):
+        if 'lineno' in node._attributes:
+            if node.lineno < len(lines) and lines[node.lineno]:
+                node.lineno = lines[node.lineno]
+            node.end_lineno = node.lineno
+            node.col_offset = node.end_col_offset = -1
+    return tree
+
+
+def compile_program(source, filename="<lab5>"):
+    # code object of the generated module, None if Python cannot compile it
+    # (a program nesting loops deeper than CPython allows blocks to nest)
+    try:
+        return compile(program_lines(pyast.parse(source, filename)), filename, 'exec')
+    except RecursionError:
+        return None
+    except SyntaxError as error:
+        if 'nested' not in str(error):
+            raise
+        return None
+
+
+def run(code):          # runs a module compiled by compile_program
+    namespace = {'__name__': 'lab5_program'}
+    exec(code, namespace)
+    namespace['program']()
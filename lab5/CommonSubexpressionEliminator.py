@@ -0,0 +1,207 @@
+
+import AST
+from Optimizer import NodeTransformer, OptimizationPass, assigned_names, written_names, matrix_shapes, cannot_fail
+import numpy as np
+
+
+TEMP_PREFIX = '$cse'
+
+
+def expression_size(node):
+    if isinstance(node, list):
+        return sum(expression_size(elem) for elem in node)
+    if isinstance(node, AST.Node):
+        return 1 + sum(expression_size(child) for child in vars(node).values()
+                       if isinstance(child, (AST.Node, list)))
+    return 0
+
+
+def operands(node):     # expressions statement or expression <node> evaluates, in the order it does
+    if isinstance(node, AST.Assign):
+        return [node.right] + (node.left.indices if isinstance(node.left, AST.Ref) else [])
+    if isinstance(node, AST.Print):
+        return node.args
+    if isinstance(node, AST.Return):
+        return [node.expr] if node.expr is not None else []
+    if isinstance(node, AST.If):
+        return [node.cond]
+    if isinstance(node, AST.For):
+        return [node.range.start, node.range.end]
+    children = []
+    for child in vars(node).values():
+        if isinstance(child, AST.Node):
+            children.append(child)
+        elif isinstance(child, list):
+            children.extend(elem for elem in child if isinstance(elem, AST.Node))
+    return children
+
+
+def evaluated_first(node, target, shapes):
+    # None if expression <target> is not in <node>, else True if nothing <node>
+    # evaluates before it can fail: <target> can then be evaluated ahead of
+    # the statement without changing which error, if any, the program stops with
+    if node is target:
+        return True
+    safe = True
+    for child in operands(node):
+        found = evaluated_first(child, target, shapes)
+        if found is not None:
+            return safe and found
+        safe = safe and (isinstance(child, AST.Variable) or cannot_fail(child, shapes))
+    return None
+
+
+class Substitution(NodeTransformer):
+    # replaces the given expression nodes (by identity) with a read of variable <name>
+
+    def __init__(self, targets, name):
+        self.targets = targets
+        self.name = name
+
+    def visit(self, node):
+        if id(node) in self.targets:
+            return AST.Variable(self.name, lineno=node.lineno)
+        return NodeTransformer.visit(self, node)
+
+
+# Value-numbers the expressions of every block of straight-line statements:
+# two expressions get the same number when they apply the same operator to
+# operands with the same numbers. A variable gets a new number whenever it
+# is assigned or one of its elements is, so an expression is never reused
+# past a change of any of its operands. Each expression computed more than
+# once in a block is evaluated into a $cse temporary in front of the
+# statement that first needs it, if what that statement evaluates before it
+# cannot fail; the largest repeated expressions are taken first.
+class CommonSubexpressionEliminator(OptimizationPass):
+
+    name = "common subexpression elimination"
+
+    def __init__(self):
+        self.temps = 0
+        self.eliminated = 0
+        self.versions = {}      # variable name -> number of assignments seen so far in the block
+        self.found = {}         # expression key -> [(statement index, node)] in evaluation order
+        self.shapes = {}        # variable -> shape of its matrix, as for static_shape
+
+    def report(self):
+        return "{0}: {1} temporaries introduced, {2} repeated evaluations removed".format(
+            self.name, self.temps, self.eliminated)
+
+    def optimize(self, program):
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_Compound(self, node):
+        node.statements = self.block(self.visit(node.statements))
+        return node
+
+    def visit_If(self, node):
+        node.if_body = self.body(self.visit(node.if_body))
+        if node.else_body is not None:
+            node.else_body = self.body(self.visit(node.else_body))
+        return node
+
+    def visit_While(self, node):
+        node.body = self.body(self.visit(node.body))
+        return node
+
+    def visit_For(self, node):
+        node.body = self.body(self.visit(node.body))
+        return node
+
+    def body(self, node):       # a loop or branch body that is a single statement forms a block too
+        if isinstance(node, AST.Compound):
+            return node
+        statements = self.block([node])
+        if len(statements) == 1:
+            return node
+        return AST.Compound(statements, lineno=node.lineno)
+
+    def temp(self):
+        self.temps += 1
+        return TEMP_PREFIX + str(self.temps)
+
+    def block(self, statements):
+        while True:
+            repeated = [found for found in self.occurrences(statements).values() if len(found) > 1
+                        and evaluated_first(statements[found[0][0]], found[0][1], self.shapes)]
+            if not repeated:
+                return statements
+            found = max(repeated, key=lambda found: expression_size(found[0][1]))
+            index, first = found[0]
+            name = self.temp()
+            statements = Substitution({id(node) for _, node in found}, name).visit(statements)
+            statements.insert(index, AST.Assign('=', AST.Variable(name, lineno=first.lineno), first,
+                                                lineno=first.lineno))
+            self.eliminated += len(found) - 1
+
+    def occurrences(self, statements):
+        self.versions = {}
+        self.found = {}
+        for index, stmt in enumerate(statements):
+            changed = set()
+            if isinstance(stmt, AST.Assign):
+                self.number(stmt.right, index)
+                if isinstance(stmt.left, AST.Ref):
+                    for idx in stmt.left.indices:
+                        self.number(idx, index)
+                changed = {stmt.left.name}
+            elif isinstance(stmt, AST.Print):
+                for arg in stmt.args:
+                    self.number(arg, index)
+            elif isinstance(stmt, AST.Return) and stmt.expr is not None:
+                self.number(stmt.expr, index)
+            elif isinstance(stmt, AST.If):
+                self.number(stmt.cond, index)
+                changed = self.changed([stmt.if_body, stmt.else_body])
+            elif isinstance(stmt, AST.While):
+                changed = self.changed(stmt.body)       # the condition is evaluated again after the body
+            elif isinstance(stmt, AST.For):
+                self.number(stmt.range.start, index)
+                self.number(stmt.range.end, index)
+                changed = self.changed(stmt.body) | {stmt.id}
+            elif isinstance(stmt, AST.Compound):
+                changed = self.changed(stmt)
+            for name in changed:
+                self.versions[name] = self.versions.get(name, 0) + 1
+        return self.found
+
+    def changed(self, node):
+        return assigned_names(node) | written_names(node)
+
+    def number(self, node, index, record=True):
+        # returns the key of expression <node>, recording every occurrence of a non-trivial one
+        if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String)):
+            return (node.__class__.__name__, node.value)
+        if isinstance(node, AST.Constant):
+            value = node.value
+            if isinstance(value, np.ndarray):
+                return ('Constant', value.dtype.str, value.shape, value.tobytes())
+            return ('Constant', type(value).__name__, value)
+        if isinstance(node, AST.Variable):
+            return ('Variable', node.name, self.versions.get(node.name, 0))
+        if isinstance(node, AST.Ref):
+            return ('Ref', node.name, self.versions.get(node.name, 0)) + \
+                tuple(self.number(idx, index) for idx in node.indices)
+
+        if isinstance(node, (AST.BinExpr, AST.RelExpr)):
+            key = (node.__class__.__name__, node.op,
+                   self.number(node.left, index), self.number(node.right, index))
+        elif isinstance(node, AST.UnaryExpr):
+            if node.op != '-':
+                return self.number(node.expr, index)
+            key = ('UnaryExpr', node.op, self.number(node.expr, index))
+        elif isinstance(node, AST.Transpose):
+            key = ('Transpose', self.number(node.expr, index))
+        elif isinstance(node, AST.Function):
+            key = ('Function', node.name) + tuple(self.number(arg, index) for arg in node.args)
+        elif isinstance(node, AST.Vector):
+            # rows are copied into the matrix anyway, only whole matrices are worth a temporary
+            key = ('Vector',) + tuple(self.number(elem, index, not isinstance(elem, AST.Vector))
+                                      for elem in node.elements)
+        else:
+            return ('Node', id(node))       # never equal to anything else
+
+        if record:
+            self.found.setdefault(key, []).append((index, node))
+        return key
@@ -0,0 +1,149 @@
+
+import AST
+from Operations import BIN_OPS, REL_OPS, ASSIGN_OPS, MATRIX_FUNCTIONS, matrix_function
+from Optimizer import OptimizationPass, literal_value, make_literal, assigned_names
+
+
+# Folds arithmetic over int/float literals, propagates literal values of
+# variables through straight-line code and builds eye/zeros/ones calls with
+# literal sizes once, at compile time. Values are computed with the same
+# operators the Interpreter uses, so folding never changes a result; an
+# expression that would fail at runtime (e.g. division by zero) is left as is.
+class ConstantFolder(OptimizationPass):
+
+    name = "constant folding"
+    SCALAR_OPS = ('+', '-', '*', '/')
+
+    def __init__(self):
+        self.constants = {}     # variable name -> literal value known at the current point
+        self.folded = 0
+        self.propagated = 0
+
+    def report(self):
+        return "{0}: {1} nodes folded, {2} variable reads propagated".format(self.name, self.folded, self.propagated)
+
+    def fold(self, fn, args, lineno):
+        try:
+            node = make_literal(fn(*args), lineno)
+        except (ArithmeticError, TypeError, ValueError):
+            return None
+        if node is not None:
+            self.folded += 1
+        return node
+
+    def kill(self, names):
+        for name in names:
+            self.constants.pop(name, None)
+
+    def visit_Variable(self, node):
+        value = self.constants.get(node.name)
+        if value is not None:
+            self.propagated += 1
+            return make_literal(value, node.lineno)
+        return node
+
+    def visit_BinExpr(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        left, right = literal_value(node.left), literal_value(node.right)
+        if node.op in self.SCALAR_OPS and left is not None and right is not None:
+            return self.fold(BIN_OPS[node.op], (left, right), node.lineno) or node
+        return node
+
+    def visit_RelExpr(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        left, right = literal_value(node.left), literal_value(node.right)
+        if left is not None and right is not None:
+            # conditions are only ever tested for truth, 0/1 keeps the type checker's 'int'
+            return self.fold(lambda a, b: int(REL_OPS[node.op](a, b)), (left, right), node.lineno) or node
+        return node
+
+    def visit_UnaryExpr(self, node):
+        node.expr = self.visit(node.expr)
+        value = literal_value(node.expr)
+        if value is not None:
+            if node.op == '-':
+                return self.fold(lambda a: -a, (value,), node.lineno) or node
+            self.folded += 1
+            return node.expr
+        return node
+
+    def visit_Function(self, node):
+        node.args = self.visit(node.args)
+        args = [literal_value(arg) for arg in node.args]
+        if node.name in MATRIX_FUNCTIONS and args and all(type(arg) is int for arg in args):
+            try:
+                value = matrix_function(node.name, args)
+            except (ValueError, TypeError):
+                return node
+            if value is not None:
+                self.folded += 1
+                return AST.Constant(value, lineno=node.lineno)
+        return node
+
+    def visit_Assign(self, node):
+        node.right = self.visit(node.right)
+        if isinstance(node.left, AST.Ref):
+            node.left.indices = self.visit(node.left.indices)
+            self.kill([node.left.name])
+            return node
+
+        name = node.left.name
+        value = literal_value(node.right)
+        if node.op != '=':
+            old = self.constants.get(name)
+            if old is not None and value is not None:
+                folded = self.fold(ASSIGN_OPS[node.op], (old, value), node.lineno)
+                if folded is not None:
+                    node = AST.Assign('=', node.left, folded, lineno=node.lineno)
+                    value = folded.value
+                else:
+                    value = None
+            else:
+                value = None
+
+        if value is not None:
+            self.constants[name] = value
+        else:
+            self.kill([name])
+        return node
+
+    def visit_If(self, node):
+        node.cond = self.visit(node.cond)
+        cond = literal_value(node.cond)
+        before = dict(self.constants)
+
+        node.if_body = self.visit(node.if_body)
+        after_if = self.constants
+
+        self.constants = dict(before)
+        if node.else_body:
+            node.else_body = self.visit(node.else_body)
+        after_else = self.constants
+
+        if cond is not None:
+            self.constants = after_if if cond else after_else
+        else:
+            self.constants = {name: value for name, value in after_if.items()
+                              if name in after_else and type(after_else[name]) is type(value)
+                              and after_else[name] == value}
+        return node
+
+    def visit_While(self, node):
+        changed = assigned_names(node.body)
+        self.kill(changed)
+        node.cond = self.visit(node.cond)
+        before = dict(self.constants)
+        node.body = self.visit(node.body)
+        self.constants = before
+        return node
+
+    def visit_For(self, node):
+        node.range = self.visit(node.range)
+        changed = assigned_names(node.body) | {node.id}
+        self.kill(changed)
+        before = dict(self.constants)
+        node.body = self.visit(node.body)
+        self.constants = before
+        return node
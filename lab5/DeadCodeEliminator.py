@@ -0,0 +1,202 @@
+
+import AST
+from Operations import REL_OPS
+from Optimizer import (OptimizationPass, literal_value, used_names, is_scalar, scalar_variables, matrix_shapes,
+                       static_shape, cannot_fail)
+
+
+def constant_condition(cond):           # truth value of a condition over literals, None if unknown
+    value = literal_value(cond)
+    if value is not None:
+        return bool(value)
+    if isinstance(cond, AST.RelExpr):
+        left, right = literal_value(cond.left), literal_value(cond.right)
+        if left is not None and right is not None:
+            return bool(REL_OPS[cond.op](left, right))
+    return None
+
+
+def always_exits(node):                 # True if <node> never falls through to the next statement
+    if isinstance(node, (AST.Break, AST.Continue, AST.Return)):
+        return True
+    if isinstance(node, AST.Compound):
+        return any(always_exits(stmt) for stmt in node.statements)
+    if isinstance(node, AST.If):
+        return node.else_body is not None and always_exits(node.if_body) and always_exits(node.else_body)
+    return False
+
+
+def is_empty(node):
+    return node is None or (isinstance(node, AST.Compound) and not node.statements)
+
+
+# Removes code that cannot run or whose result is never observed:
+#  - statements following break/continue/return in a block,
+#  - if branches and while loops whose condition is a constant,
+#  - assignments to variables that are not live afterwards, unless running
+#    them could fail (1/0, a product of matrices that do not fit, an index
+#    out of bounds): removing those would hide the error,
+#  - if statements with empty branches and loops with an empty body whose
+#    loop variable is not read afterwards, as long as their condition or
+#    range cannot fail: an error there is kept like that of an assignment.
+# Liveness is computed backwards over the structured AST; loops iterate to a
+# fixpoint with break flowing to the code after the loop and continue to the
+# loop head. An element assignment (A[i, j] = ...) reads and writes A; when A
+# is not live no other variable sees the change, copy-on-write keeps it from
+# them, but the index may be out of bounds, so the assignment is kept.
+class DeadCodeEliminator(OptimizationPass):
+
+    name = "dead code elimination"
+
+    def __init__(self):
+        self.unreachable = 0
+        self.branches = 0
+        self.assignments = 0
+        self.loops = 0
+        self.mutate = True
+        self.targets = []       # (live after loop, live at loop head) for enclosing loops
+        self.shapes = {}        # variable -> shape of its matrix, as for static_shape
+        self.scalars = set()    # variables that never hold a matrix
+
+    def report(self):
+        return "{0}: {1} unreachable statements, {2} constant branches, {3} dead assignments, {4} empty loops removed".format(
+            self.name, self.unreachable, self.branches, self.assignments, self.loops)
+
+    def removed(self):
+        return self.unreachable + self.branches + self.assignments + self.loops
+
+    def optimize(self, program):
+        # removing a statement can make the statements it read from dead, repeat until nothing changes
+        self.shapes = matrix_shapes(program)
+        self.scalars = scalar_variables(program)
+        while True:
+            removed = self.removed()
+            program, live = self.statement(program, set())
+            if self.removed() == removed:
+                return program if program is not None else AST.Compound([], lineno=0)
+
+    def statement(self, node, out):     # returns (node or None if removed, variables live before <node>)
+        method = getattr(self, 'statement_' + node.__class__.__name__, None)
+        if method is None:
+            return node, out
+        return method(node, out)
+
+    def body(self, node, out):          # like statement() but never returns None
+        body, live = self.statement(node, out)
+        if body is None:
+            body = AST.Compound([], lineno=node.lineno)
+        return body, live
+
+    def statement_Compound(self, node, out):
+        statements = node.statements
+        for i, stmt in enumerate(statements):
+            if always_exits(stmt):
+                if self.mutate:
+                    self.unreachable += len(statements) - i - 1
+                statements = statements[:i + 1]
+                break
+
+        live = out
+        kept = []
+        for stmt in reversed(statements):
+            stmt, live = self.statement(stmt, live)
+            if stmt is not None:
+                kept.append(stmt)
+        if self.mutate:
+            node.statements = kept[::-1]
+        return node, live
+
+    def harmless(self, node):       # True if running Assign <node> cannot fail
+        if isinstance(node.left, AST.Ref) or not cannot_fail(node.right, self.shapes):
+            return False
+        if node.op == '=':
+            return True
+        return node.left.name in self.scalars and is_scalar(node.right, self.scalars) and \
+            (node.op != '/=' or bool(literal_value(node.right)))
+
+    def harmless_condition(self, cond):     # True if testing <cond> for truth cannot fail
+        return static_shape(cond, self.shapes) == () and cannot_fail(cond, self.shapes)
+
+    def statement_Assign(self, node, out):
+        name = node.left.name
+        if name not in out and self.harmless(node):
+            if self.mutate:
+                self.assignments += 1
+            return None, out
+        if isinstance(node.left, AST.Ref):      # kept when dead too, then it still reads the matrix
+            return node, out | {name} | used_names(node.left.indices) | used_names(node.right)
+        if node.op == '=':
+            return node, (out - {name}) | used_names(node.right)
+        return node, out | {name} | used_names(node.right)
+
+    def statement_Print(self, node, out):
+        return node, out | used_names(node.args)
+
+    def statement_Break(self, node, out):
+        return node, set(self.targets[-1][0]) if self.targets else set()
+
+    def statement_Continue(self, node, out):
+        return node, set(self.targets[-1][1]) if self.targets else set()
+
+    def statement_Return(self, node, out):
+        return node, used_names(node.expr) if node.expr else set()
+
+    def statement_If(self, node, out):
+        cond = constant_condition(node.cond)
+        if cond is not None:
+            if self.mutate:
+                self.branches += 1
+            branch = node.if_body if cond else node.else_body
+            if branch is None:
+                return None, out
+            return self.statement(branch, out)
+
+        if_body, live_if = self.body(node.if_body, out)
+        if node.else_body is not None:
+            else_body, live_else = self.body(node.else_body, out)
+        else:
+            else_body, live_else = None, out
+        if self.mutate:
+            node.if_body = if_body
+            node.else_body = None if is_empty(else_body) else else_body
+            if is_empty(if_body) and is_empty(else_body) and self.harmless_condition(node.cond):
+                self.branches += 1
+                return None, out
+        return node, used_names(node.cond) | live_if | live_else
+
+    def loop_head(self, node, out, head):
+        # iterates the live set at the loop head to a fixpoint without touching the tree
+        mutate, self.mutate = self.mutate, False
+        live = head(set(out))
+        while True:
+            self.targets.append((out, live))
+            body_live = self.statement(node.body, live)[1]
+            self.targets.pop()
+            new_live = head(body_live) | live
+            if new_live == live:
+                break
+            live = new_live
+        self.mutate = mutate
+
+        if self.mutate:
+            self.targets.append((out, live))
+            node.body = self.body(node.body, live)[0]
+            self.targets.pop()
+        return live
+
+    def statement_While(self, node, out):
+        if constant_condition(node.cond) is False:
+            if self.mutate:
+                self.loops += 1
+            return None, out
+        cond = used_names(node.cond)
+        live = self.loop_head(node, out, lambda body_live: out | cond | body_live)
+        return node, live
+
+    def statement_For(self, node, out):
+        live = self.loop_head(node, out, lambda body_live: out | (body_live - {node.id}))
+        if self.mutate and is_empty(node.body) and node.id not in out \
+                and all(type(literal_value(bound)) is int for bound in (node.range.start, node.range.end)):
+            self.loops += 1
+            return None, out
+        return node, live | used_names(node.range)
@@ -4,6 +4,8 @@ class ReturnValueException(Exception):
     def __init__(self,value):
         self.value = value
         
+# break and continue are statuses the engines return (see Interpreter.BREAK),
+# these two are no longer raised and only kept for code that catches them
 class BreakException(Exception):
     pass
 
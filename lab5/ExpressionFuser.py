@@ -0,0 +1,68 @@
+
+import AST
+from Optimizer import OptimizationPass, is_scalar, scalar_variables, matrix_shapes, cannot_fail
+
+
+FUSIBLE_OPS = ('+', '-', '*', '/', '.+', '.-', '.*', './')
+
+
+def is_link(node):              # operator that can be part of a fused chain
+    return isinstance(node, AST.UnaryExpr) or isinstance(node, AST.BinExpr) and node.op in FUSIBLE_OPS
+
+
+# Replaces chains of element-wise operators, e.g. A .+ B .* C ./ D, with a
+# single Fused node. evaluate_fused runs the whole chain and writes each
+# intermediate matrix into a buffer the chain already allocated, so the
+# example needs one output array instead of three. Chains that can only
+# produce scalars are left alone. A '*' between two matrices is evaluated
+# with the regular operator, so it keeps whatever meaning BIN_OPS gives it.
+# All operands are evaluated before the first operator, so every operand but
+# the first has to be one that cannot fail; otherwise an operator that fails
+# in the program could be preceded by a different error.
+class ExpressionFuser(OptimizationPass):
+
+    name = "expression fusion"
+
+    def __init__(self):
+        self.chains = 0
+        self.operators = 0
+        self.scalars = set()
+        self.shapes = {}        # variable -> shape of its matrix, as for static_shape
+
+    def report(self):
+        return "{0}: {1} element-wise chains of {2} operators fused".format(self.name, self.chains, self.operators)
+
+    def optimize(self, program):
+        self.scalars = scalar_variables(program)
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_BinExpr(self, node):
+        return self.chain(node)
+
+    def visit_UnaryExpr(self, node):
+        return self.chain(node)
+
+    def chain(self, node):
+        if is_link(node) and not is_scalar(node, self.scalars):
+            steps, operands = [], []
+            self.flatten(node, steps, operands)
+            operators = len(steps) - len(operands)
+            if operators >= 2 and all(cannot_fail(operand, self.shapes) for operand in operands[1:]):
+                self.chains += 1
+                self.operators += operators
+                return AST.Fused(tuple(steps), [self.visit(operand) for operand in operands], lineno=node.lineno)
+        return self.generic_visit(node)
+
+    def flatten(self, node, steps, operands):
+        if isinstance(node, AST.BinExpr) and node.op in FUSIBLE_OPS:
+            self.flatten(node.left, steps, operands)
+            self.flatten(node.right, steps, operands)
+            steps.append(node.op)
+        elif isinstance(node, AST.UnaryExpr):
+            self.flatten(node.expr, steps, operands)
+            if node.op == '-':
+                steps.append('neg')
+        else:
+            operands.append(node)
+            steps.append(None)
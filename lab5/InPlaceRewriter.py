@@ -0,0 +1,55 @@
+
+import AST
+from Optimizer import OptimizationPass, is_scalar, scalar_variables, same_expression, matrix_shapes, cannot_fail
+
+
+# A = A op B, written as the compound assignment that computes the same value
+COMPOUND_OPS = {
+    '+': '+=',
+    '-': '-=',
+    '*': '*=',
+    '/': '/=',
+    '.+': '.+=',
+    '.-': '.-=',
+    '.*': '.*=',
+    './': './=',
+}
+
+
+# Lets compound assignments overwrite the matrix they update instead of
+# allocating a new one (see assign_in_place). A = A .+ B and A[0] = A[0] + B
+# are first rewritten into compound form, which evaluates to the same value
+# for scalars as well and saves a lookup. The compound form reads the element
+# after evaluating B, so an element is only rewritten if B cannot fail. Every
+# compound assignment to a variable that may hold a matrix is then marked to
+# update it in place; if another variable shares the matrix (B = A),
+# copy-on-write copies it first.
+class InPlaceRewriter(OptimizationPass):
+
+    name = "in-place assignment"
+
+    def __init__(self):
+        self.rewritten = 0
+        self.inplace = 0
+        self.scalars = set()
+        self.shapes = {}        # variable -> shape of its matrix, as for static_shape
+
+    def report(self):
+        return "{0}: {1} assignments rewritten to compound form, {2} variables updated in place".format(
+            self.name, self.rewritten, self.inplace)
+
+    def optimize(self, program):
+        self.scalars = scalar_variables(program)
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_Assign(self, node):
+        if node.op == '=' and isinstance(node.right, AST.BinExpr) and node.right.op in COMPOUND_OPS \
+                and same_expression(node.left, node.right.left) \
+                and (isinstance(node.left, AST.Variable) or cannot_fail(node.right.right, self.shapes)):
+            node = AST.Assign(COMPOUND_OPS[node.right.op], node.left, node.right.right, lineno=node.lineno)
+            self.rewritten += 1
+        if isinstance(node.left, AST.Variable) and node.op != '=' and not is_scalar(node.left, self.scalars):
+            node.inplace = True
+            self.inplace += 1
+        return node
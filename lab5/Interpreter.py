@@ -3,17 +3,139 @@ import AST
 from Memory import *
 from Exceptions import *
 from visit import *
-import sys
-import operator
+from Operations import *
 import numpy as np
 
-sys.setrecursionlimit(10000)
+
+def reader(node):       # function of the interpreter evaluating <node>, literals and variables without dispatch
+    if isinstance(node, (AST.IntNum, AST.FloatNum)):
+        value = node.value
+        return lambda interpreter: value
+    if isinstance(node, AST.Variable):
+        slot = node.slot
+        return lambda interpreter: interpreter.slots[slot]
+    return node.accept
+
+
+def binary_routine(operator, node):
+    left, right = reader(node.left), reader(node.right)
+    return lambda interpreter: operator(left(interpreter), right(interpreter))
+
+
+def guarded_binary_routine(operator, node, left_kind, right_kind):
+    # <operator> for as long as the operands are of the classes seen first,
+    # after that the generic operator for good
+    left, right = reader(node.left), reader(node.right)
+    generic = BIN_OPS[node.op]
+
+    def routine(interpreter):
+        a = left(interpreter)
+        b = right(interpreter)
+        if type(a) is left_kind and type(b) is right_kind:
+            return operator(a, b)
+        interpreter.routines[node] = binary_routine(generic, node)
+        return generic(a, b)
+    return routine
+
+
+def checked_binary_routine(operator, node, left_array, right_array):
+    # <operator> while each operand is a matrix, or is not, as TypeChecker
+    # found; once one is not what it found, the generic operator for good
+    left, right = reader(node.left), reader(node.right)
+    generic = BIN_OPS[node.op]
+
+    def routine(interpreter):
+        a = left(interpreter)
+        b = right(interpreter)
+        if isinstance(a, np.ndarray) is left_array and isinstance(b, np.ndarray) is right_array:
+            return operator(a, b)
+        interpreter.routines[node] = binary_routine(generic, node)
+        return generic(a, b)
+    return routine
+
+
+def store_routine(node):    # x = e, numbers replacing numbers bypass the bookkeeping of shared matrices
+    slot, right = node.left.slot, reader(node.right)
+
+    def routine(interpreter):
+        value = right(interpreter)
+        slots = interpreter.slots
+        if type(value) is np.ndarray or type(slots[slot]) is np.ndarray:
+            interpreter.frame.store(slot, value)
+        else:
+            slots[slot] = value
+    return routine
+
+
+def compound_routine(operator, node, old_kind=None, new_kind=None):
+    # x op= e with <operator> on numbers; it holds while the values are
+    # numbers, or of the classes given, after that the node runs the generic
+    # visit for good
+    slot, right = node.left.slot, reader(node.right)
+
+    def routine(interpreter):
+        value = right(interpreter)
+        slots = interpreter.slots
+        old = slots[slot]
+        if type(old) is old_kind and type(value) is new_kind or old_kind is None \
+                and not isinstance(old, np.ndarray) and not isinstance(value, np.ndarray):
+            slots[slot] = operator(old, value)
+        else:
+            interpreter.routines[node] = None
+            interpreter.frame.store(slot, ASSIGN_OPS[node.op](old, value))
+    return routine
+
+
+def element_routine(node):      # A[i, j] read without dispatch for the indices
+    slot, row, column = node.slot, reader(node.indices[0]), reader(node.indices[1])
+    return lambda interpreter: interpreter.slots[slot][row(interpreter), column(interpreter)]
+
+
+def quicken_binary(node, left, right):  # routine for BinExpr <node> specialized to its operands <left>, <right>
+    operator = specialized_operator(node.op, value_type(left), value_type(right))
+    if operator is None:
+        return binary_routine(BIN_OPS[node.op], node)
+    return guarded_binary_routine(operator, node, type(left), type(right))
+
+
+def quicken_assign(node, old, value):   # routine for Assign <node> after it assigned <value> over <old>
+    if not isinstance(node.left, AST.Variable) or node.inplace:
+        return None
+    if node.op == '=':
+        return store_routine(node)
+    operator = specialized_operator(node.op[:-1], value_type(old), value_type(value))
+    if operator is None or isinstance(old, np.ndarray) or isinstance(value, np.ndarray):
+        return None
+    return compound_routine(operator, node, type(old), type(value))
+
+
+def specialize(types):
+    # routines for the nodes whose operand types TypeChecker recorded in
+    # <types>, guarded by whether the operands are matrices
+    routines = {}
+    for node in types:
+        if isinstance(node, AST.BinExpr):
+            operator = specialized_operator(node.op, types.get(node.left), types.get(node.right))
+            if operator is not None:
+                routines[node] = checked_binary_routine(operator, node, isinstance(types.get(node.left), tuple),
+                                                        isinstance(types.get(node.right), tuple))
+        elif isinstance(node, AST.Assign) and node.op != '=' and not node.inplace \
+                and types.get(node.left) in NUMBER_TYPES and types.get(node.right) in NUMBER_TYPES:
+            operator = specialized_operator(node.op[:-1], types.get(node.left), types.get(node.right))
+            if operator is not None:
+                routines[node] = compound_routine(operator, node)
+    return routines
 
 
 class Interpreter(object):
 
-    def __init__(self):
-        self.memory_stack = MemoryStack()
+    def __init__(self, frame=None, types=None, jit=None):
+        # <frame> holds the slots assigned by Resolver, <types> the node types
+        # recorded by TypeChecker, if any, <jit> runs the loops if given (see TracingJIT)
+        self.frame = frame if frame else Frame()
+        self.slots = self.frame.slots
+        self.routines = specialize(types) if types else {}
+        self.jit = jit
 
     @on('node')
     def visit(self, node):
@@ -33,41 +155,28 @@ class Interpreter(object):
 
     @when(AST.Variable)
     def visit(self, node):
-        return self.memory_stack.get(node.name)
+        return self.slots[node.slot]
 
     @when(AST.BinExpr)
     def visit(self, node):
+        routine = self.routines.get(node)
+        if routine is not None:
+            return routine(self)
         r1 = node.left.accept(self)
         r2 = node.right.accept(self)
-        
-        ops = {
-            '+': operator.add,
-            '-': operator.sub,
-            '*': operator.mul,
-            '/': operator.truediv,
-            '.+': np.add,
-            '.-': np.subtract,
-            '.*': np.multiply,
-            './': np.divide,
-        }
-        
-        return ops[node.op](r1, r2)
+        self.routines[node] = quicken_binary(node, r1, r2)
+        return BIN_OPS[node.op](r1, r2)
 
     @when(AST.RelExpr)
     def visit(self, node):
+        routine = self.routines.get(node)
+        if routine is not None:
+            return routine(self)
         r1 = node.left.accept(self)
         r2 = node.right.accept(self)
-        
-        ops = {
-            '==': operator.eq,
-            '!=': operator.ne,
-            '<': operator.lt,
-            '>': operator.gt,
-            '<=': operator.le,
-            '>=': operator.ge,
-        }
-        
-        return ops[node.op](r1, r2)
+        # comparisons are the same operator for all operand types, no guard needed
+        self.routines[node] = binary_routine(REL_OPS[node.op], node)
+        return REL_OPS[node.op](r1, r2)
 
     @when(AST.UnaryExpr)
     def visit(self, node):
@@ -78,34 +187,44 @@ class Interpreter(object):
 
     @when(AST.Assign)
     def visit(self, node):
+        routine = self.routines.get(node, False)
+        if routine:
+            return routine(self)
         value = node.right.accept(self)
-        
-        assign_ops = {
-            '+=': lambda old, new: old + new,
-            '-=': lambda old, new: old - new,
-            '*=': lambda old, new: old * new,
-            '/=': lambda old, new: old / new,
-        }
-        
+        if routine is False:    # first run, None once there is no routine for the node
+            self.routines[node] = None
+
         if isinstance(node.left, AST.Variable):
             # Simple variable assignment
             if node.op == '=':
                 new_value = value
+                if routine is False:
+                    self.routines[node] = quicken_assign(node, None, value)
+            elif node.inplace:
+                old_val = self.frame.writable(node.left.slot)
+                new_value = assign_in_place(node.op, old_val, value)
+                if new_value is old_val:
+                    return
             else:
-                old_val = self.memory_stack.get(node.left.name)
-                new_value = assign_ops[node.op](old_val, value)
-            self.memory_stack.set(node.left.name, new_value)
+                old_val = self.slots[node.left.slot]
+                new_value = ASSIGN_OPS[node.op](old_val, value)
+                if routine is False:
+                    self.routines[node] = quicken_assign(node, old_val, value)
+            self.frame.store(node.left.slot, new_value)
             
         elif isinstance(node.left, AST.Ref):
-            # Matrix/vector element assignment
-            var = self.memory_stack.get(node.left.name)
+            # Matrix/vector element assignment, the matrix is copied first if another variable shares it
+            var = self.frame.writable(node.left.slot)
             indices = tuple(idx.accept(self) for idx in node.left.indices)
             
             if node.op == '=':
                 var[indices] = value
             else:
+                # a row or slice is a view into the matrix, it is updated in place
                 old_val = var[indices]
-                var[indices] = assign_ops[node.op](old_val, value)
+                new_value = assign_in_place(node.op, old_val, value)
+                if new_value is not old_val:
+                    var[indices] = new_value
 
     @when(AST.If)
     def visit(self, node):
@@ -117,33 +236,63 @@ class Interpreter(object):
 
     @when(AST.While)
     def visit(self, node):
-        r = None
-        try:
-            while node.cond.accept(self):
-                try:
-                    r = node.body.accept(self)
-                except ContinueException:
-                    continue
-        except BreakException:
-            pass
-        return r
+        if self.jit is not None:
+            return self.jit.run_while(self, node)
+        body = node.body
+        while node.cond.accept(self):
+            if body.accept(self) is BREAK:
+                break
 
     @when(AST.For)
     def visit(self, node):
-        r = None
+        if self.jit is not None:
+            return self.jit.run_for(self, node)
         range_obj = node.range.accept(self)
         start, end = range_obj
-        
-        try:
-            for i in range(start, end + 1):
-                self.memory_stack.set(node.id, i)
-                try:
-                    r = node.body.accept(self)
-                except ContinueException:
-                    continue
-        except BreakException:
-            pass
-        return r
+
+        store, slot, body = self.frame.store, node.slot, node.body
+        for i in range(start, end + 1):
+            store(slot, i)      # the variable may have held a matrix
+            if body.accept(self) is BREAK:
+                break
+
+    @when(AST.VectorFor)
+    def visit(self, node):
+        start, end = node.loop.range.accept(self)
+        slots = self.slots
+        slots[node.lo.slot] = start
+        slots[node.hi.slot] = end
+        arrays = [slots[var.slot] for var in node.arrays]
+        scalars = [slots[var.slot] for var in node.scalars]
+        if not vector_loop_fits(start, end, arrays, node.specs, scalars, node.bounds):
+            return node.loop.accept(self)
+        for stmt in node.body:
+            stmt.accept(self)
+        self.frame.store(node.var.slot, end)
+
+    @when(AST.Fused)
+    def visit(self, node):
+        return evaluate_fused(node.steps, [operand.accept(self) for operand in node.operands])
+
+    @when(AST.MatrixChain)
+    def visit(self, node):
+        return evaluate_chain([operand.accept(self) for operand in node.operands])
+
+    @when(AST.SymmetricProduct)
+    def visit(self, node):
+        return symmetric_product(node.expr.accept(self), node.left)
+
+    @when(AST.MatrixPower)
+    def visit(self, node):
+        return matrix_power(node.expr.accept(self), node.power)
+
+    @when(AST.Slice)
+    def visit(self, node):
+        lo = self.slots[node.lo.slot] + node.offset
+        hi = self.slots[node.hi.slot] + node.offset
+        if node.index:
+            return slice(lo, hi + 1)
+        return np.arange(lo, hi + 1)
 
     @when(AST.Range)
     def visit(self, node):
@@ -153,11 +302,11 @@ class Interpreter(object):
 
     @when(AST.Break)
     def visit(self, node):
-        raise BreakException()
+        return BREAK
 
     @when(AST.Continue)
     def visit(self, node):
-        raise ContinueException()
+        return CONTINUE
 
     @when(AST.Return)
     def visit(self, node):
@@ -177,10 +326,10 @@ class Interpreter(object):
 
     @when(AST.Compound)
     def visit(self, node):
-        r = None
         for stmt in node.statements:
-            r = stmt.accept(self)
-        return r
+            status = stmt.accept(self)
+            if status is not None:
+                return status
 
     @when(AST.Vector)
     def visit(self, node):
@@ -192,7 +341,12 @@ class Interpreter(object):
 
     @when(AST.Ref)
     def visit(self, node):
-        var = self.memory_stack.get(node.name)
+        routine = self.routines.get(node)
+        if routine is not None:
+            return routine(self)
+        if len(node.indices) == 2:
+            self.routines[node] = element_routine(node)
+        var = self.slots[node.slot]
         indices = [idx.accept(self) for idx in node.indices]
         
         if len(indices) == 1:
@@ -202,25 +356,15 @@ class Interpreter(object):
 
     @when(AST.Function)
     def visit(self, node):
-        if node.name == 'eye':
-            size = node.args[0].accept(self)
-            return np.eye(size)
-        elif node.name == 'zeros':
-            if len(node.args) == 1:
-                size = node.args[0].accept(self)
-                return np.zeros(size)
-            elif len(node.args) == 2:
-                rows = node.args[0].accept(self)
-                cols = node.args[1].accept(self)
-                return np.zeros((rows, cols))
-        elif node.name == 'ones':
-            if len(node.args) == 1:
-                size = node.args[0].accept(self)
-                return np.ones(size)
-            elif len(node.args) == 2:
-                rows = node.args[0].accept(self)
-                cols = node.args[1].accept(self)
-                return np.ones((rows, cols))
+        if node.name in MATRIX_FUNCTIONS:
+            args = [arg.accept(self) for arg in node.args]
+            return matrix_function(node.name, args)
+
+    @when(AST.Constant)
+    def visit(self, node):
+        if isinstance(node.value, np.ndarray):
+            return node.value.copy()    # every evaluation must yield a fresh matrix
+        return node.value
 
     @when(AST.Transpose)
     def visit(self, node):
@@ -231,3 +375,5 @@ class Interpreter(object):
     def visit(self, node):
         pass
 
+
+seal(Interpreter, AST.Node)
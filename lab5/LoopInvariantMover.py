@@ -0,0 +1,119 @@
+
+import AST
+from Optimizer import (OptimizationPass, assigned_names, used_names, written_names, is_scalar, is_temporary,
+                       static_shape, matrix_shapes, cannot_fail)
+
+
+TEMP_PREFIX = '$licm'
+
+
+def is_temp_definition(node):   # temporaries of any pass are assigned exactly once
+    return isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable) and \
+        is_temporary(node.left.name)
+
+
+def is_trivial(node):           # evaluating these costs no more than reading a temporary
+    if isinstance(node, AST.Constant):
+        return is_scalar(node, ())
+    return isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.Variable))
+
+
+# Moves expressions that do not depend on anything a loop changes in front of
+# the loop, into temporaries computed once. Inner loops are processed first,
+# so an expression travels as far out as it stays invariant. Only expressions
+# that cannot fail are hoisted, because the loop body might never evaluate
+# them. A matrix stored from a temporary into a variable is shared with it
+# copy-on-write, so writing to the variable leaves the temporary intact.
+class LoopInvariantMover(OptimizationPass):
+
+    name = "loop-invariant code motion"
+
+    def __init__(self):
+        self.hoisted = 0
+        self.temps = 0
+        self.shapes = {}        # variable -> shape as for static_shape, hoisted temporaries included
+
+    def report(self):
+        return "{0}: {1} expressions hoisted out of loops".format(self.name, self.hoisted)
+
+    def optimize(self, program):
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_While(self, node):
+        node.body = self.visit(node.body)
+        changed = assigned_names(node.body) | written_names(node.body)
+        preheader = []
+        node.cond = self.expression(node.cond, changed, preheader)
+        node.body = self.statement(node.body, changed, preheader)
+        return self.place(preheader, node)
+
+    def visit_For(self, node):
+        node.body = self.visit(node.body)
+        changed = assigned_names(node.body) | written_names(node.body) | {node.id}
+        preheader = []
+        node.body = self.statement(node.body, changed, preheader)
+        return self.place(preheader, node)
+
+    def place(self, preheader, loop):
+        if not preheader:
+            return loop
+        self.hoisted += len(preheader)
+        return AST.Compound(preheader + [loop], lineno=loop.lineno)
+
+    def temp(self):
+        self.temps += 1
+        return TEMP_PREFIX + str(self.temps)
+
+    def statement(self, node, changed, preheader):
+        if isinstance(node, AST.Compound):
+            statements = []
+            for stmt in node.statements:
+                if is_temp_definition(stmt) and cannot_fail(stmt.right, self.shapes) \
+                        and not (used_names(stmt.right) & changed):
+                    preheader.append(stmt)  # the temporary is invariant here as well
+                    changed.discard(stmt.left.name)
+                    if stmt.left.name.startswith(TEMP_PREFIX):
+                        self.hoisted -= 1   # already counted for the inner loop
+                else:
+                    statements.append(self.statement(stmt, changed, preheader))
+            node.statements = statements
+        elif isinstance(node, AST.Assign):
+            node.right = self.expression(node.right, changed, preheader)
+            if isinstance(node.left, AST.Ref):
+                node.left.indices = [self.expression(idx, changed, preheader) for idx in node.left.indices]
+        elif isinstance(node, AST.Print):
+            node.args = [self.expression(arg, changed, preheader) for arg in node.args]
+        elif isinstance(node, AST.If):
+            node.cond = self.expression(node.cond, changed, preheader)
+            node.if_body = self.statement(node.if_body, changed, preheader)
+            if node.else_body is not None:
+                node.else_body = self.statement(node.else_body, changed, preheader)
+        elif isinstance(node, AST.For):
+            node.range.start = self.expression(node.range.start, changed, preheader)
+            node.range.end = self.expression(node.range.end, changed, preheader)
+        elif isinstance(node, AST.Return) and node.expr is not None:
+            node.expr = self.expression(node.expr, changed, preheader)
+        return node
+
+    def expression(self, node, changed, preheader):
+        if not is_trivial(node) and cannot_fail(node, self.shapes) and not (used_names(node) & changed):
+            name = self.temp()
+            shape = static_shape(node, self.shapes)
+            if shape is not None:
+                self.shapes[name] = shape
+            preheader.append(AST.Assign('=', AST.Variable(name, lineno=node.lineno), node, lineno=node.lineno))
+            return AST.Variable(name, lineno=node.lineno)
+
+        if isinstance(node, (AST.BinExpr, AST.RelExpr)):
+            node.left = self.expression(node.left, changed, preheader)
+            node.right = self.expression(node.right, changed, preheader)
+        elif isinstance(node, AST.UnaryExpr):
+            node.expr = self.expression(node.expr, changed, preheader)
+        elif isinstance(node, AST.Transpose):
+            node.expr = self.expression(node.expr, changed, preheader)
+        elif isinstance(node, AST.Vector):
+            node.elements = [self.expression(elem, changed, preheader) for elem in node.elements]
+        elif isinstance(node, AST.Ref):
+            node.indices = [self.expression(idx, changed, preheader) for idx in node.indices]
+        return node
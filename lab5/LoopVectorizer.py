@@ -0,0 +1,255 @@
+
+import AST
+from Optimizer import OptimizationPass, literal_value, used_names, is_temporary
+
+
+TEMP_PREFIX = '$vec'
+
+# scalar operators are applied to whole vectors element by element
+ELEMENTWISE_OPS = {'+': '.+', '-': '.-', '*': '.*', '/': './', '.+': '.+', '.-': '.-', '.*': '.*', './': './'}
+# the operators by how integer_magnitude bounds their result
+BOUND_OPS = {'+': '+', '-': '+', '.+': '+', '.-': '+', '*': '*', '.*': '*', '/': '/', './': '/'}
+ELEMENTWISE_ASSIGN_OPS = {'=': '=', '+=': '.+=', '-=': '.-=', '*=': '.*=', '/=': './=',
+                          '.+=': '.+=', '.-=': '.-=', '.*=': '.*=', './=': './='}
+
+
+def contains_ref(node):
+    if isinstance(node, AST.Ref):
+        return True
+    if isinstance(node, list):
+        return any(contains_ref(elem) for elem in node)
+    if isinstance(node, AST.Node):
+        return any(contains_ref(child) for child in vars(node).values() if isinstance(child, (AST.Node, list)))
+    return False
+
+
+def loop_offset(node, var):     # c for an index of the form var, var + c or var - c, None otherwise
+    if isinstance(node, AST.Variable) and node.name == var:
+        return 0
+    if isinstance(node, AST.BinExpr) and node.op in ('+', '-') and isinstance(node.left, AST.Variable) \
+            and node.left.name == var and isinstance(node.right, AST.IntNum):
+        return node.right.value if node.op == '+' else -node.right.value
+    return None
+
+
+def index_key(node):            # comparable form of an index that does not depend on the loop
+    if isinstance(node, AST.IntNum):
+        return ('literal', node.value)
+    return ('variable', node.name)
+
+
+# Rewrites innermost For loops whose body only stores matrix elements indexed
+# by the loop variable, e.g.
+#     for i = 0:n { D[i, j] = A[i, j] * 2 + B[i + 1, j]; }
+# into single whole-array statements over slices, D[lo:hi+1, j] = ..., which
+# NumPy runs in one call instead of one interpreted assignment per element.
+# The loop variable may index one dimension of each access, with a constant
+# offset; elsewhere it stands for the vector of all its values. Loops whose
+# accesses overlap across iterations in a way the whole-array form would see
+# differently are left alone, and the rewritten loop falls back to the scalar
+# one at runtime unless every indexed variable holds a matrix that covers the
+# range (see vector_loop_fits), so no out-of-bounds access goes unnoticed.
+# Arithmetic on the loop variable, integer literals and integer scalars is
+# done on unbounded Python ints in the scalar loop but in int64 here, so it
+# is recorded as a bound tree and the scalar loop also runs whenever the
+# values at hand could overflow (see integer_magnitude).
+class LoopVectorizer(OptimizationPass):
+
+    name = "loop vectorization"
+
+    def __init__(self):
+        self.loops = 0
+        self.vectorized = 0
+        self.temps = 0
+
+    def report(self):
+        return "{0}: {1} of {2} for loops vectorized".format(self.name, self.vectorized, self.loops)
+
+    def visit_For(self, node):
+        node.body = self.visit(node.body)
+        self.loops += 1
+        statements = node.body.statements if isinstance(node.body, AST.Compound) else [node.body]
+        vector = Vectorization(node, self.temps).run(statements)
+        if vector is None:
+            return node
+        self.temps += 2
+        self.vectorized += 1
+        return vector
+
+
+class Vectorization(object):
+    # state of one attempt at vectorizing a loop, run() returns None if it cannot be done
+
+    def __init__(self, loop, temps):
+        self.loop = loop
+        self.var = loop.id
+        self.lo = AST.Variable(TEMP_PREFIX + str(temps + 1), lineno=loop.lineno)
+        self.hi = AST.Variable(TEMP_PREFIX + str(temps + 2), lineno=loop.lineno)
+        self.arrays = []
+        self.specs = []
+        self.scalars = []
+        self.accesses = {}      # matrix name -> [(statement index, index keys, is write)]
+        self.assigned = set()   # temporaries assigned in the body
+        self.temps = set()      # temporaries assigned so far in the body
+        self.numeric = set()    # temporaries holding NumPy values in the scalar loop
+        self.written = set()
+        self.statement_index = 0
+        self.bounds = []        # trees of integer arithmetic checked by integer_magnitude
+        self.trees = {}         # temporary -> bound tree of its value
+
+    def run(self, statements):
+        for stmt in statements:
+            if not isinstance(stmt, AST.Assign):
+                return None
+            if isinstance(stmt.left, AST.Ref):
+                self.written.add(stmt.left.name)
+            else:
+                self.assigned.add(stmt.left.name)
+        body = []
+        for index, stmt in enumerate(statements):
+            self.statement_index = index
+            stmt = self.statement(stmt)
+            if stmt is None:
+                return None
+            body.append(stmt)
+        if not self.independent():
+            return None
+        return AST.VectorFor(self.loop, AST.Variable(self.var, lineno=self.loop.lineno), self.lo, self.hi, body,
+                             self.arrays, self.specs, self.scalars, self.bounds, lineno=self.loop.lineno)
+
+    def statement(self, node):
+        right = self.expression(node.right)
+        if right is None:
+            return None
+        tree = self.bound(node.right)
+        if tree is not None and tree[0] in ('+', '*', '/'):
+            self.bounds.append(tree)
+        if isinstance(node.left, AST.Variable):
+            name = node.left.name
+            if not is_temporary(name) or node.op != '=' or name in self.temps:
+                return None     # only temporaries local to the body may be assigned
+            self.temps.add(name)
+            self.trees[name] = tree
+            if contains_ref(node.right) or used_names(node.right) & self.numeric:
+                self.numeric.add(name)
+            return AST.Assign('=', AST.Variable(name, lineno=node.lineno), right, lineno=node.lineno)
+
+        left = self.ref(node.left, True)
+        if left is None:
+            return None
+        return AST.Assign(ELEMENTWISE_ASSIGN_OPS[node.op], left, right, lineno=node.lineno)
+
+    def expression(self, node):
+        if isinstance(node, (AST.IntNum, AST.FloatNum)):
+            return node
+        if isinstance(node, AST.Constant):
+            return node if isinstance(node.value, (int, float)) else None
+        if isinstance(node, AST.Variable):
+            if node.name == self.var:
+                return AST.Slice(self.lo, self.hi, 0, False, lineno=node.lineno)
+            if node.name in self.temps:
+                return AST.Variable(node.name, lineno=node.lineno)
+            if node.name in self.written or node.name in self.assigned:
+                return None     # a whole matrix changed by the loop, or a temporary read before it is set
+            var = AST.Variable(node.name, lineno=node.lineno)
+            self.scalars.append(var)
+            return var
+        if isinstance(node, AST.Ref):
+            return self.ref(node, False)
+        if isinstance(node, AST.BinExpr) and node.op in ELEMENTWISE_OPS:
+            if node.op in ('/', './') and not self.numpy_division(node):
+                return None
+            left = self.expression(node.left)
+            right = self.expression(node.right)
+            if left is None or right is None:
+                return None
+            return AST.BinExpr(ELEMENTWISE_OPS[node.op], left, right, lineno=node.lineno)
+        if isinstance(node, AST.UnaryExpr):
+            expr = self.expression(node.expr)
+            if expr is None or node.op != '-':
+                return expr
+            return AST.UnaryExpr('-', expr, lineno=node.lineno)
+        return None
+
+    def bound(self, node):
+        # bound tree of an expression accepted by expression(), None where its
+        # value is a NumPy or float value in the scalar loop
+        if isinstance(node, AST.IntNum):
+            return ('literal', node.value)
+        if isinstance(node, AST.Constant):
+            return ('literal', node.value) if type(node.value) is int else None
+        if isinstance(node, AST.Variable):
+            if node.name == self.var:
+                return ('loop',)
+            if node.name in self.temps:
+                return self.trees[node.name]
+            return ('scalar', [var.name for var in self.scalars].index(node.name))
+        if isinstance(node, AST.BinExpr):
+            left, right = self.bound(node.left), self.bound(node.right)
+            if left is None and right is None:
+                return None
+            return (BOUND_OPS[node.op], left, right)
+        if isinstance(node, AST.UnaryExpr):
+            return self.bound(node.expr)
+        return None
+
+    def numpy_division(self, node):
+        # the scalar loop raises ZeroDivisionError for Python numbers where NumPy
+        # returns inf, so one operand must already be a NumPy value (an element of
+        # a matrix; compound assignment to an element always divides one) or the
+        # divisor a nonzero literal
+        return bool(literal_value(node.right)) or contains_ref(node) or bool(used_names(node) & self.numeric)
+
+    def ref(self, node, write):
+        if node.name == self.var or node.name in self.assigned:
+            return None
+        indices, spec, keys = [], [], []
+        for idx in node.indices:
+            offset = loop_offset(idx, self.var)
+            if offset is not None:
+                indices.append(AST.Slice(self.lo, self.hi, offset, True, lineno=idx.lineno))
+                spec.append(offset)
+                keys.append(('loop', offset))
+            elif isinstance(idx, AST.IntNum) or isinstance(idx, AST.Variable) and idx.name != self.var \
+                    and idx.name not in self.assigned and idx.name not in self.written:
+                indices.append(self.expression(idx))
+                spec.append(None)
+                keys.append(index_key(idx))
+            else:
+                return None
+        if (write and spec.count(None) == len(spec)) or len(spec) - spec.count(None) > 1:
+            return None     # a store must hit a different element in every iteration
+        self.arrays.append(AST.Variable(node.name, lineno=node.lineno))
+        self.specs.append(tuple(spec))
+        self.accesses.setdefault(node.name, []).append((self.statement_index, keys, write))
+        return AST.Ref(node.name, indices, lineno=node.lineno)
+
+    def independent(self):
+        # True if running each statement for all iterations at once reads and
+        # writes the same values as running all statements once per iteration
+        for name in self.written:
+            writes = [access for access in self.accesses[name] if access[2]]
+            for write in writes:
+                for other in self.accesses[name]:
+                    if other is not write and not self.ordered(write, other):
+                        return False
+        return True
+
+    def ordered(self, write, other):
+        (wstmt, wkeys, _), (ostmt, okeys, owrite) = write, other
+        loop_dims = [dim for dim, key in enumerate(wkeys) if key[0] == 'loop']
+        if loop_dims != [dim for dim, key in enumerate(okeys) if key[0] == 'loop']:
+            return False
+        for wkey, okey in zip(wkeys, okeys):
+            if wkey[0] == 'literal' and okey[0] == 'literal' and wkey != okey:
+                return True     # never the same element
+            if wkey[0] != 'loop' and wkey != okey:
+                return False    # may or may not be the same element
+        dim, = loop_dims
+        wofs, oofs = wkeys[dim][1], okeys[dim][1]
+        if owrite:
+            # the later of two stores to an element must also be the later one in the scalar loop
+            return oofs <= wofs if ostmt > wstmt else wofs <= oofs
+        # a read after the store sees the new value in the whole-array form, a read
+        # before it (or in the same statement) the old one, the scalar loop must agree
+        return oofs <= wofs if ostmt > wstmt else oofs >= wofs
@@ -0,0 +1,87 @@
+
+import AST
+from Operations import chain_dims, chain_order
+from Optimizer import OptimizationPass, is_scalar, scalar_variables, static_shape, matrix_shapes, same_expression
+
+
+def chain_operands(node, operands):     # operands of a product, flattening nested '*' on both sides
+    if isinstance(node, AST.BinExpr) and node.op == '*':
+        chain_operands(node.left, operands)
+        chain_operands(node.right, operands)
+    else:
+        operands.append(node)
+    return operands
+
+
+def build_product(operands, split, i, j, lineno):
+    if i == j:
+        return operands[i]
+    k = split[i][j]
+    return AST.BinExpr('*', build_product(operands, split, i, k, lineno),
+                       build_product(operands, split, k + 1, j, lineno), lineno=lineno)
+
+
+# Re-associates products of three or more matrices, e.g. A * B * C * v, which
+# the parser builds as ((A * B) * C) * v, into the order that needs the fewest
+# scalar multiplications, here A * (B * (C * v)): matrix-vector products
+# instead of matrix-matrix ones. The order comes from the dynamic program in
+# chain_order over the shapes of the operands. When some of the shapes are
+# not known at compile time the product becomes a MatrixChain node, ordered
+# by evaluate_chain for the shapes the operands have at runtime. Numbers in
+# the product are taken out of the chain and multiply its result.
+class MatrixChainOrderer(OptimizationPass):
+
+    name = "matrix chain ordering"
+
+    def __init__(self):
+        self.reordered = 0
+        self.deferred = 0
+        self.scalars = set()
+        self.shapes = {}
+
+    def report(self):
+        return "{0}: {1} products reordered, {2} left to runtime ordering".format(
+            self.name, self.reordered, self.deferred)
+
+    def optimize(self, program):
+        self.scalars = scalar_variables(program)
+        self.shapes = matrix_shapes(program)
+        return OptimizationPass.optimize(self, program)
+
+    def visit_BinExpr(self, node):
+        if node.op != '*':
+            return self.generic_visit(node)
+        operands = [self.visit(operand) for operand in chain_operands(node, [])]
+        factors = [operand for operand in operands if is_scalar(operand, self.scalars)]
+        matrices = [operand for operand in operands if not is_scalar(operand, self.scalars)]
+        if len(matrices) < 3:
+            return self.rebuild(node, operands)
+
+        shapes = [static_shape(matrix, self.shapes) for matrix in matrices]
+        if None in shapes:
+            self.deferred += 1
+            return self.scale(factors, AST.MatrixChain(matrices, lineno=node.lineno), node.lineno)
+        dims = chain_dims(shapes)
+        if dims is None:
+            return self.rebuild(node, operands)
+        product = build_product(matrices, chain_order(dims), 0, len(matrices) - 1, node.lineno)
+        product = self.scale(factors, product, node.lineno)
+        if not same_expression(product, node):
+            self.reordered += 1
+        return product
+
+    def scale(self, factors, product, lineno):    # numbers commute with every factor, they scale the result
+        for factor in reversed(factors):
+            product = AST.BinExpr('*', factor, product, lineno=lineno)
+        return product
+
+    def rebuild(self, node, operands):     # <node> with its operands replaced by the visited ones, in place
+        leaves = iter(operands)
+
+        def replace(expr):
+            if isinstance(expr, AST.BinExpr) and expr.op == '*':
+                expr.left = replace(expr.left)
+                expr.right = replace(expr.right)
+                return expr
+            return next(leaves)
+        return replace(node)
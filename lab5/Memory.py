@@ -1,53 +1,77 @@
-
-
-
-class Memory:
-
-    def __init__(self, name): # memory name
-        self.name = name
-        self.memory = {}
-
-    def has_key(self, name):  # variable name
-        return name in self.memory
-
-    def get(self, name):         # gets from memory current value of variable <name>
-        return self.memory.get(name)
-
-    def put(self, name, value):  # puts into memory current value of variable <name>
-        self.memory[name] = value
-
-
-class MemoryStack:
-                                                                             
-    def __init__(self, memory=None): # initialize memory stack with memory <memory>
-        self.stack = []
-        if memory:
-            self.stack.append(memory)
-        else:
-            self.stack.append(Memory("global"))
-
-    def get(self, name):             # gets from memory stack current value of variable <name>
-        for mem in reversed(self.stack):
-            if mem.has_key(name):
-                return mem.get(name)
+import numpy as np
+
+
+def data_owner(matrix):             # the array that owns the data <matrix> is a view of
+    while isinstance(matrix.base, np.ndarray):
+        matrix = matrix.base
+    return matrix
+
+
+class SharedMatrices:
+    # Copy-on-write bookkeeping: assigning a matrix (B = A, B = A', B = A[0])
+    # only binds another variable to the same data. Before the data is written
+    # through a variable it is copied if any other variable holds it, so every
+    # variable behaves as if it had its own matrix while assignment stays O(1).
+
+    def __init__(self):
+        self.holders = {}           # id of the array owning the data -> (that array, keys of variables holding it)
+
+    def bind(self, key, old, new):  # variable <key> changes from <old> to <new>, returns all holders of <new>
+        if isinstance(old, np.ndarray):
+            owner = data_owner(old)
+            holders = self.holders.get(id(owner))
+            if holders is not None:
+                holders[1].discard(key)
+                if not holders[1]:
+                    del self.holders[id(owner)]
+        if isinstance(new, np.ndarray):
+            owner = data_owner(new)
+            holders = self.holders.setdefault(id(owner), (owner, set()))[1]
+            holders.add(key)
+            return holders
         return None
 
-    def insert(self, name, value): # inserts into memory stack variable <name> with value <value>
-        self.stack[-1].put(name, value)
-
-    def set(self, name, value): # sets variable <name> to value <value>
-        for mem in reversed(self.stack):
-            if mem.has_key(name):
-                mem.put(name, value)
-                return
-        self.stack[-1].put(name, value)
-
-    def push(self, memory): # pushes memory <memory> onto the stack
-        self.stack.append(memory)
-
-    def pop(self):          # pops the top memory from the stack
-        if self.stack:
-            self.stack.pop()
-
-
-
+    def shared(self, matrix):       # True if more than one variable holds the data of <matrix>
+        holders = self.holders.get(id(data_owner(matrix)))
+        return holders is not None and len(holders[1]) > 1
+
+
+class Frame:
+
+    def __init__(self): # flat memory, every variable lives in a fixed slot assigned by Resolver
+        self.names = {}
+        self.slots = []
+        self.private = []   # per slot: holds a matrix no other slot shares, it may be written in place
+        self.matrices = SharedMatrices()
+
+    def slot(self, name):           # returns slot index of variable <name>, allocating it if needed
+        index = self.names.get(name)
+        if index is None:
+            index = self.names[name] = len(self.slots)
+            self.slots.append(None)
+            self.private.append(False)
+        return index
+
+    def store(self, index, value):  # binds slot <index> to <value>, must be used for matrices
+        holders = self.matrices.bind(index, self.slots[index], value)
+        self.slots[index] = value
+        self.private[index] = False
+        if holders:
+            for holder in holders:
+                self.private[holder] = False
+
+    def writable(self, index):      # value of slot <index> about to be written through, copied if shared
+        value = self.slots[index]
+        if isinstance(value, np.ndarray):
+            if self.matrices.shared(value):
+                value = value.copy()
+                self.store(index, value)
+            self.private[index] = True
+        return value
+
+    def get(self, name):            # gets current value of variable <name>
+        index = self.names.get(name)
+        return self.slots[index] if index is not None else None
+
+    def set(self, name, value):     # sets variable <name> to value <value>
+        self.store(self.slot(name), value)
@@ -0,0 +1,439 @@
+
+import AST
+from CodeGenerator import local_name
+from visit import *
+import os
+import sys
+import math
+import stat
+import hashlib
+import tempfile
+import subprocess
+
+
+CC = [os.environ.get('CC', 'cc'), '-O2', '-ffp-contract=off']  # no fused multiply-add, results must match Python's
+# compiled programs, named by hash_key, in a directory only the user can use
+CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                     'lab5-native')
+COMPILE_TIMEOUT = 60
+
+FALLBACK = 3            # exit status of a program that met a value only the interpreter handles like Python
+EXACT = 2 ** 53         # ints beyond it lose Python's arbitrary precision, and exactness as doubles
+
+RUNTIME = r"""#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+#define FALLBACK %(fallback)d
+#define EXACT %(exact)dLL
+
+static long long exact(long long value) {
+    if (value > EXACT || value < -EXACT)
+        exit(FALLBACK);
+    return value;
+}
+
+static long long mul_ii(long long a, long long b) {
+    long long result;
+    if (__builtin_mul_overflow(a, b, &result))
+        exit(FALLBACK);
+    return exact(result);
+}
+
+static double div_ff(double a, double b) {  /* Python raises ZeroDivisionError */
+    if (b == 0)
+        exit(FALLBACK);
+    return a / b;
+}
+
+static void print_float(double x) {         /* repr() of a Python float */
+    char buf[40], digits[20], out[400];
+    int precision, exponent, point, count = 0, n = 0;
+    if (isnan(x)) { fputs("nan", stdout); return; }
+    if (isinf(x)) { fputs(x > 0 ? "inf" : "-inf", stdout); return; }
+    for (precision = 1; precision < 17; precision++) {    /* shortest digits that read back as x */
+        snprintf(buf, sizeof buf, "%%.*e", precision - 1, x);
+        if (strtod(buf, NULL) == x)
+            break;
+    }
+    snprintf(buf, sizeof buf, "%%.*e", precision - 1, x);
+    char *p = buf;
+    if (*p == '-')
+        out[n++] = *p++;
+    for (; *p != 'e'; p++)
+        if (*p != '.')
+            digits[count++] = *p;
+    exponent = atoi(p + 1);
+    while (count > 1 && digits[count - 1] == '0')
+        count--;
+    point = exponent + 1;                   /* digits before the decimal point */
+    if (point > -4 && point <= 16) {
+        int i;
+        if (point <= 0) {
+            out[n++] = '0'; out[n++] = '.';
+            for (i = 0; i < -point; i++) out[n++] = '0';
+            for (i = 0; i < count; i++) out[n++] = digits[i];
+        } else {
+            for (i = 0; i < count || i < point; i++) {
+                if (i == point) out[n++] = '.';
+                out[n++] = i < count ? digits[i] : '0';
+            }
+            if (count <= point) { out[n++] = '.'; out[n++] = '0'; }
+        }
+        out[n] = '\0';
+    } else {
+        out[n++] = digits[0];
+        if (count > 1) {
+            out[n++] = '.';
+            memcpy(out + n, digits + 1, count - 1);
+            n += count - 1;
+        }
+        snprintf(out + n, sizeof out - n, "e%%c%%02d", exponent < 0 ? '-' : '+', abs(exponent));
+    }
+    fputs(out, stdout);
+}
+
+int main(void) {
+"""
+
+
+class Unsupported(Exception):
+    # the program uses something outside the scalar subset the C backend compiles
+    pass
+
+
+def literal_type(value):        # 'int' or 'float' for a number the C backend can hold, None otherwise
+    if type(value) is int:
+        return 'int' if abs(value) <= EXACT else None
+    if type(value) is float:
+        return 'float'
+    return None
+
+
+def result_type(op, left, right):   # type of number operator <op> on numbers of types <left>, <right>
+    if left is None or right is None:
+        return None
+    if op == '/' or 'float' in (left, right):
+        return 'float'
+    return 'int'
+
+
+def expression_type(node, types):   # type of expression <node> given variable <types>, None if not known yet
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.Constant)):
+        return literal_type(node.value)
+    if isinstance(node, AST.Variable):
+        return types.get(node.name)
+    if isinstance(node, AST.BinExpr) and node.op in ('+', '-', '*', '/'):
+        return result_type(node.op, expression_type(node.left, types), expression_type(node.right, types))
+    if isinstance(node, AST.UnaryExpr) and node.op == '-':
+        return expression_type(node.expr, types)
+    return None
+
+
+def scalar_types(program):
+    # 'int' or 'float' for every variable of <program>; each must only ever
+    # hold numbers of one type, as a C variable does
+    assignments = []
+    types = {}
+
+    def collect(node):
+        if isinstance(node, list):
+            for elem in node:
+                collect(elem)
+        elif isinstance(node, AST.Node):
+            if isinstance(node, AST.Assign):
+                if not isinstance(node.left, AST.Variable):
+                    raise Unsupported()
+                assignments.append(node)
+            elif isinstance(node, AST.For):
+                types[node.id] = 'int'
+            for child in vars(node).values():
+                if isinstance(child, (AST.Node, list)):
+                    collect(child)
+    collect(program)
+
+    changed = True
+    while changed:
+        changed = False
+        for node in assignments:
+            name = node.left.name
+            kind = expression_type(node.right, types)
+            if node.op != '=':
+                kind = result_type(node.op[:-1], types.get(name), kind)
+            if kind is None:
+                continue
+            if name not in types:
+                types[name] = kind
+                changed = True
+            elif types[name] != kind:
+                raise Unsupported()
+    return types
+
+
+def c_string(text):             # C string literal of <text>
+    chars = []
+    for byte in text.encode():
+        char = chr(byte)
+        if char in '"\\?' or not 32 <= byte < 127:
+            chars.append('\\%03o' % byte)
+        else:
+            chars.append(char)
+    return '"' + ''.join(chars) + '"'
+
+
+# Translates a program using nothing but int and float variables, arithmetic,
+# conditions, loops and print into C. Each variable becomes a C variable of
+# the one type it ever holds (see scalar_types). The C program keeps Python's
+# semantics where they can differ: ints stay within 2**53 and divisors are not
+# zero, otherwise it exits with FALLBACK and the interpreter runs the program
+# instead; floats are printed as repr() prints them.
+class CGenerator(object):
+
+    def __init__(self):
+        self.types = {}
+        self.defined = set()    # variables certainly assigned at the point generated now
+        self.lines = []
+        self.indent = 1
+        self.loops = 0
+        self.counter = 0
+
+    def generate(self, program):    # C source of <program>, raises Unsupported
+        self.types = scalar_types(program)
+        self.defined = set()
+        self.lines = []
+        self.indent = 1
+        self.loops = 0
+        self.counter = 0
+        program.accept(self)
+        declarations = ["    {0} {1} = 0;".format("long long" if kind == 'int' else "double", local_name(name))
+                        for name, kind in sorted(self.types.items())]
+        return (RUNTIME % {'fallback': FALLBACK, 'exact': EXACT}) + \
+            "\n".join(declarations + self.lines + ["    return 0;", "}"]) + "\n"
+
+    def emit(self, line):
+        self.lines.append('    ' * self.indent + line)
+
+    def block(self, node, defined):     # statements of <node> one level deeper, starting with <defined>
+        outer = self.defined
+        self.defined = set(defined)
+        self.indent += 1
+        node.accept(self)
+        self.indent -= 1
+        self.defined = outer
+
+    def condition(self, node):
+        if isinstance(node, AST.RelExpr):
+            (left, _), (right, _) = node.left.accept(self), node.right.accept(self)
+            return "{0} {1} {2}".format(left, node.op, right)
+        code, _ = node.accept(self)
+        return "{0} != 0".format(code)
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+    @when(AST.Node)     # reached by every node the cases below leave out
+    def visit(self, node):
+        raise Unsupported()
+
+    # statements
+
+    @when(AST.Compound)
+    def visit(self, node):
+        for stmt in node.statements:
+            stmt.accept(self)
+
+    @when(AST.Assign)
+    def visit(self, node):
+        name = node.left.name
+        value, kind = node.right.accept(self)
+        if node.op != '=':
+            value, kind = self.binary(node.op[:-1], node.left.accept(self), (value, kind))
+        if kind != self.types[name]:
+            raise Unsupported()
+        self.emit("{0} = {1};".format(local_name(name), value))
+        self.defined.add(name)
+
+    @when(AST.If)
+    def visit(self, node):
+        self.emit("if ({0}) {{".format(self.condition(node.cond)))
+        self.block(node.if_body, self.defined)
+        if node.else_body:
+            self.emit("} else {")
+            self.block(node.else_body, self.defined)
+        self.emit("}")
+
+    @when(AST.While)
+    def visit(self, node):
+        self.emit("while ({0}) {{".format(self.condition(node.cond)))
+        self.loops += 1
+        self.block(node.body, self.defined)
+        self.loops -= 1
+        self.emit("}")
+
+    @when(AST.For)
+    def visit(self, node):
+        (start, start_kind), (end, end_kind) = node.range.start.accept(self), node.range.end.accept(self)
+        if start_kind != 'int' or end_kind != 'int':
+            raise Unsupported()     # range() only takes ints
+        self.counter += 1
+        i, last = "i{0}".format(self.counter), "end{0}".format(self.counter)
+        self.emit("{{ long long {0} = {1}, {2} = {3};".format(i, start, last, end))
+        self.emit("for (; {0} <= {1}; {0}++) {{".format(i, last))
+        self.indent += 1
+        self.emit("{0} = {1};".format(local_name(node.id), i))
+        self.indent -= 1
+        self.loops += 1
+        self.block(node.body, self.defined | {node.id})
+        self.loops -= 1
+        self.emit("} }")
+
+    @when(AST.Break)
+    def visit(self, node):
+        if not self.loops:
+            raise Unsupported()
+        self.emit("break;")
+
+    @when(AST.Continue)
+    def visit(self, node):
+        if not self.loops:
+            raise Unsupported()
+        self.emit("continue;")
+
+    @when(AST.Print)
+    def visit(self, node):
+        calls = []
+        for arg in node.args:
+            if isinstance(arg, AST.String):
+                calls.append("fputs({0}, stdout);".format(c_string(arg.value)))
+                continue
+            code, kind = arg.accept(self)
+            calls.append("printf(\"%lld\", {0});".format(code) if kind == 'int' else "print_float({0});".format(code))
+        self.emit(" putchar(' '); ".join(calls) + " putchar('\\n');")
+
+    # expressions: C code and type
+
+    @when(AST.IntNum)
+    def visit(self, node):
+        return self.number(node.value)
+
+    @when(AST.FloatNum)
+    def visit(self, node):
+        return self.number(node.value)
+
+    @when(AST.Constant)
+    def visit(self, node):
+        return self.number(node.value)
+
+    def number(self, value):
+        kind = literal_type(value)
+        if kind == 'int':
+            return "({0}LL)".format(value), kind
+        if kind == 'float':
+            if math.isnan(value):
+                return "NAN", kind
+            if math.isinf(value):
+                return "({0}INFINITY)".format('-' if value < 0 else ''), kind
+            return "({0!r})".format(value), kind
+        raise Unsupported()
+
+    @when(AST.Variable)
+    def visit(self, node):
+        if node.name not in self.defined:
+            raise Unsupported()     # would be None in Python
+        return local_name(node.name), self.types[node.name]
+
+    @when(AST.UnaryExpr)
+    def visit(self, node):
+        code, kind = node.expr.accept(self)
+        if node.op != '-':
+            raise Unsupported()
+        return "(-{0})".format(code), kind
+
+    @when(AST.BinExpr)
+    def visit(self, node):
+        return self.binary(node.op, node.left.accept(self), node.right.accept(self))
+
+    def binary(self, op, left, right):
+        (left, left_kind), (right, right_kind) = left, right
+        kind = result_type(op, left_kind, right_kind)
+        if op not in ('+', '-', '*', '/'):
+            raise Unsupported()
+        if op == '/':
+            return "div_ff((double){0}, (double){1})".format(left, right), kind
+        if kind == 'float':
+            return "({0} {1} {2})".format(left, op, right), kind
+        if op == '*':
+            return "mul_ii({0}, {1})".format(left, right), kind
+        return "exact({0} {1} {2})".format(left, op, right), kind
+
+
+seal(CGenerator, AST.Node)
+
+
+def hash_key(source):
+    return hashlib.sha256((" ".join(CC) + "\n" + source).encode()).hexdigest()
+
+
+def private(path, kind):
+    # True if <path> is a <kind> (stat.S_ISDIR, stat.S_ISREG) of the user
+    # that no one else can write to, so running what it holds runs nothing
+    # another user planted; symbolic links are not followed
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return kind(status.st_mode) and status.st_uid == os.getuid() and not status.st_mode & 0o022
+
+
+def cache_directory():      # CACHE, created if needed, None if it is not private to the user
+    try:
+        os.makedirs(CACHE, mode=0o700, exist_ok=True)
+    except OSError:
+        return None
+    return CACHE if private(CACHE, stat.S_ISDIR) else None
+
+
+def compile_c(source, binary, scratch):     # compiles C <source> into file <binary>, False if it failed
+    path = os.path.join(scratch, 'program.c')
+    with open(path, 'w') as file:
+        file.write(source)
+    partial = "{0}.{1}.part".format(binary, os.getpid())
+    try:
+        subprocess.run(CC + ['-o', partial, path], check=True, timeout=COMPILE_TIMEOUT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.replace(partial, binary)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+def run_native(program, use_cache=True):
+    # runs <program> compiled to C, binaries are kept in CACHE keyed by a hash
+    # of their source; False if the program has to run in the interpreter.
+    # Whether it does is only known once the binary has run: it exits with
+    # FALLBACK at the first value C cannot compute as Python would. So the
+    # output is held until the binary exits, and on a fallback it is dropped
+    # and the interpreter runs the program again from the start; printing is
+    # the only effect a program has, it is not seen twice, but the work done
+    # before the fallback is done twice.
+    try:
+        source = CGenerator().generate(program)
+    except Unsupported:
+        return False
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = cache_directory() if use_cache else None
+        binary = os.path.join(directory or scratch, hash_key(source) if directory else 'program')
+        if os.path.lexists(binary) and not private(binary, stat.S_ISREG):
+            binary = os.path.join(scratch, 'program')   # not run, someone else could have put it there
+        if not os.path.exists(binary) and not compile_c(source, binary, scratch):
+            return False
+        try:
+            result = subprocess.run([binary], stdout=subprocess.PIPE)
+        except OSError:
+            return False
+    if result.returncode != 0:
+        return False        # output is dropped, the interpreter runs the program from the start
+    sys.stdout.write(result.stdout.decode())
+    return True
@@ -0,0 +1,291 @@
+import operator
+import functools
+import numpy as np
+
+# Operators, tables and evaluation helpers shared by the interpreter, the
+# compilers, their runtimes and the optimization passes; importing this
+# module has no side effects.
+
+
+def multiply(left, right):      # '*' is the matrix product between two matrices/vectors
+    if isinstance(left, np.ndarray) and isinstance(right, np.ndarray):
+        return np.matmul(left, right)
+    return left * right
+
+
+BIN_OPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': multiply,
+    '/': operator.truediv,
+    '.+': np.add,
+    '.-': np.subtract,
+    '.*': np.multiply,
+    './': np.divide,
+}
+
+REL_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+ASSIGN_OPS = {
+    '+=': lambda old, new: old + new,
+    '-=': lambda old, new: old - new,
+    '*=': multiply,
+    '/=': lambda old, new: old / new,
+    # element-wise forms, only produced by optimization passes
+    '.+=': np.add,
+    '.-=': np.subtract,
+    '.*=': np.multiply,
+    './=': np.divide,
+}
+
+INPLACE_UFUNCS = {
+    '+=': np.add,
+    '-=': np.subtract,
+    '*=': np.multiply,
+    '/=': np.true_divide,
+    '.+=': np.add,
+    '.-=': np.subtract,
+    '.*=': np.multiply,
+    './=': np.true_divide,
+}
+
+MATRIX_FUNCTIONS = ('eye', 'zeros', 'ones')
+
+# status a statement returns when it ends the iteration of the loop around it,
+# passed up through If and Compound; every other statement returns None
+BREAK = 'break'
+CONTINUE = 'continue'
+
+# routines for operands whose types TypeChecker found, they do what the
+# generic operators do for those types without checking them again
+NUMBER_TYPES = ('int', 'float')
+SCALAR_OPS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+MATRIX_OPS = {'+': np.add, '-': np.subtract, '*': np.matmul,
+              '.+': np.add, '.-': np.subtract, '.*': np.multiply, './': np.divide}
+SCALED_OPS = {'*': np.multiply, '/': np.true_divide}   # a matrix and a number
+
+FUSED_UFUNCS = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.true_divide,
+    '.+': np.add,
+    '.-': np.subtract,
+    '.*': np.multiply,
+    './': np.true_divide,
+}
+
+
+def matrix_function(name, args):    # calls eye/zeros/ones with already evaluated <args>
+    if name == 'eye':
+        return np.eye(args[0])
+    fn = np.zeros if name == 'zeros' else np.ones
+    if len(args) == 1:
+        return fn(args[0])
+    elif len(args) == 2:
+        return fn((args[0], args[1]))
+
+
+def specialized_operator(op, left, right):     # routine for <op> on values of types <left>, <right>
+    if left in NUMBER_TYPES and right in NUMBER_TYPES:
+        return SCALAR_OPS.get(op)
+    if isinstance(left, tuple) and isinstance(right, tuple):
+        return MATRIX_OPS.get(op)
+    if isinstance(left, tuple) and right in NUMBER_TYPES:
+        return SCALED_OPS.get(op)
+    if left in NUMBER_TYPES and isinstance(right, tuple) and op == '*':
+        return np.multiply
+    return None
+
+
+def value_type(value):  # the TypeChecker type specialized_operator needs for runtime <value>, None if none fits
+    if isinstance(value, np.ndarray):
+        return ('matrix',)
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    return None
+
+
+INT64_LIMIT = 2 ** 63
+EXACT_LIMIT = 2 ** 53       # integers up to this convert to float without rounding
+
+
+def integer_magnitude(bound, loop, scalars):
+    # largest magnitude of a value computed from Python ints in the scalar loop,
+    # for a <bound> tree built by LoopVectorizer, where the loop variable has
+    # magnitudes up to <loop>; None for a float or NumPy value, INT64_LIMIT if
+    # the whole-array form, which computes it in int64, could differ
+    if bound is None:
+        return None
+    kind = bound[0]
+    if kind == 'loop':
+        return loop
+    if kind == 'literal':
+        return min(abs(bound[1]), INT64_LIMIT)
+    if kind == 'scalar':
+        value = scalars[bound[1]]
+        return min(abs(value), INT64_LIMIT) if type(value) is int else None
+    left = integer_magnitude(bound[1], loop, scalars)
+    right = integer_magnitude(bound[2], loop, scalars)
+    if INT64_LIMIT in (left, right):
+        return INT64_LIMIT
+    if left is None or right is None:
+        return None
+    if kind == '/':     # Python rounds the exact quotient of two ints, NumPy that of two floats
+        return INT64_LIMIT if max(left, right) > EXACT_LIMIT else None
+    return min(left + right if kind == '+' else left * right, INT64_LIMIT)
+
+
+def vector_loop_fits(lo, hi, arrays, specs, scalars, bounds):
+    # True if the whole-array form of a loop over lo..hi gives the same result
+    # as the scalar loop for these values of its variables
+    if not isinstance(lo, (int, np.integer)) or not isinstance(hi, (int, np.integer)) or lo > hi:
+        return False
+    for array, spec in zip(arrays, specs):
+        if not isinstance(array, np.ndarray) or array.ndim != len(spec):
+            return False    # every index must select single elements
+        for size, offset in zip(array.shape, spec):
+            if offset is not None and not (0 <= lo + offset and hi + offset < size):
+                return False
+    if any(isinstance(value, np.ndarray) for value in scalars):
+        return False
+    loop = max(abs(lo), abs(hi))
+    return all(integer_magnitude(bound, loop, scalars) != INT64_LIMIT for bound in bounds)
+
+
+def assign_in_place(op, old, new):
+    # result of compound assignment <op>, written into matrix <old> itself when
+    # it has the dtype and shape of the result; a '*=' by a matrix keeps the
+    # meaning of the regular operator
+    if isinstance(old, np.ndarray) and not (op == '*=' and isinstance(new, np.ndarray)) \
+            and old.dtype == np.result_type(old, new) \
+            and (op not in ('/=', './=') or old.dtype.kind in 'fc') \
+            and old.shape == np.broadcast_shapes(old.shape, np.shape(new)):
+        return INPLACE_UFUNCS[op](old, new, out=old)
+    return ASSIGN_OPS[op](old, new)
+
+
+def chain_dims(shapes):
+    # dimensions p0, p1, ..., pn of a product of matrices p0 x p1, p1 x p2, ...
+    # with the given shapes; a vector may only stand first (as a row) or last
+    # (as a column), None if the shapes do not form such a product
+    dims = []
+    for i, shape in enumerate(shapes):
+        if len(shape) == 1 and i == 0:
+            shape = (1,) + shape
+        elif len(shape) == 1 and i == len(shapes) - 1:
+            shape = shape + (1,)
+        if len(shape) != 2 or dims and dims[-1] != shape[0]:
+            return None
+        if not dims:
+            dims.append(shape[0])
+        dims.append(shape[1])
+    return tuple(dims)
+
+
+@functools.lru_cache(maxsize=256)
+def chain_order(dims):
+    # the classic matrix-chain dynamic program: split[i][j] is the k for which
+    # (M_i .. M_k)(M_k+1 .. M_j) needs the fewest scalar multiplications; on a
+    # tie the left to right order is kept
+    n = len(dims) - 1
+    cost = [[0] * n for _ in range(n)]
+    split = [[0] * n for _ in range(n)]
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            best = None
+            for k in range(j - 1, i - 1, -1):
+                c = cost[i][k] + cost[k + 1][j] + dims[i] * dims[k + 1] * dims[j + 1]
+                if best is None or c < best:
+                    best, split[i][j] = c, k
+            cost[i][j] = best
+    return split
+
+
+def multiply_chain(values, split, i, j):
+    if i == j:
+        return values[i]
+    k = split[i][j]
+    return np.matmul(multiply_chain(values, split, i, k), multiply_chain(values, split, k + 1, j))
+
+
+def evaluate_chain(values):
+    # product of a '*' chain whose shapes were not known at compile time, in
+    # the cheapest order for the shapes the operands actually have; anything
+    # but a product of matrices is evaluated left to right
+    if all(isinstance(value, np.ndarray) for value in values):
+        dims = chain_dims([value.shape for value in values])
+        if dims is not None:
+            return multiply_chain(values, chain_order(dims), 0, len(values) - 1)
+    result = values[0]
+    for value in values[1:]:
+        result = multiply(result, value)
+    return result
+
+
+def symmetric_product(value, left):
+    # value' * value (or value * value' when not <left>); np.matmul hands a
+    # product of a matrix with its own transpose to the BLAS symmetric rank-k
+    # update (syrk), which computes only one triangle of the result
+    if isinstance(value, np.ndarray):
+        return np.matmul(value.T, value) if left else np.matmul(value, value.T)
+    return value * value
+
+
+def matrix_power(value, power):
+    # value * value * ... * value (<power> factors), by repeated squaring for a square matrix
+    if isinstance(value, np.ndarray) and value.ndim == 2 and value.shape[0] == value.shape[1]:
+        return np.linalg.matrix_power(value, power)
+    result = value
+    for _ in range(power - 1):
+        result = multiply(result, value)
+    return result
+
+
+def evaluate_fused(steps, operands):
+    # evaluates a fused element-wise chain over the values of its operands; a
+    # matrix computed by the chain itself is overwritten by the next operator
+    # applied to it (out=) rather than allocating one array per operator, unless
+    # that is an integer matrix and the operator a division
+    stack = []
+    owned = set()       # ids of arrays allocated here; operands are all alive, so ids are not reused
+    operands = iter(operands)
+    for step in steps:
+        if step is None:
+            stack.append(next(operands))
+            continue
+        if step == 'neg':
+            value = stack.pop()
+            if id(value) in owned:
+                stack.append(np.negative(value, out=value))
+                continue
+            result = -value
+        else:
+            right = stack.pop()
+            left = stack.pop()
+            left_array, right_array = isinstance(left, np.ndarray), isinstance(right, np.ndarray)
+            if not (left_array or right_array) or (step == '*' and left_array and right_array):
+                result = BIN_OPS[step](left, right)
+            else:
+                out = None
+                for candidate in (left, right):
+                    if id(candidate) in owned and candidate.dtype == np.result_type(left, right) \
+                            and (step not in ('/', './') or candidate.dtype.kind in 'fc') \
+                            and candidate.shape == np.broadcast_shapes(np.shape(left), np.shape(right)):
+                        out = candidate
+                        break
+                result = FUSED_UFUNCS[step](left, right, out=out)
+        if isinstance(result, np.ndarray):
+            owned.add(id(result))
+        stack.append(result)
+    return stack[0]
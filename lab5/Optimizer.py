@@ -0,0 +1,283 @@
+
+import AST
+from TypeChecker import NodeVisitor
+import numpy as np
+
+
+class NodeTransformer(NodeVisitor):
+    # visit_* methods return the node that replaces the visited one
+
+    def generic_visit(self, node):
+        if isinstance(node, list):
+            return [self.visit(elem) if isinstance(elem, (AST.Node, list)) else elem for elem in node]
+        for name, child in vars(node).items():
+            if isinstance(child, (AST.Node, list)):
+                setattr(node, name, self.visit(child))
+        return node
+
+
+class OptimizationPass(NodeTransformer):
+    # AST to AST pass, run with: ast = ast.accept(Pass())
+
+    name = "optimization"
+    program = None
+
+    def visit(self, node):
+        if self.program is None:    # the first node visited is the whole program
+            self.program = node
+            return self.optimize(node)
+        return NodeTransformer.visit(self, node)
+
+    def optimize(self, program):
+        return NodeTransformer.visit(self, program)
+
+    def report(self):
+        return self.name
+
+
+def is_temporary(name):         # names introduced by the passes, never valid identifiers in a program
+    return name.startswith('$')
+
+
+def literal_value(node):        # value of an int/float literal, None for anything else
+    if isinstance(node, (AST.IntNum, AST.FloatNum)):
+        return node.value
+    return None
+
+
+def make_literal(value, lineno=None):   # literal node holding <value>, None if it is not an int/float
+    if type(value) is int:
+        return AST.IntNum(value, lineno=lineno)
+    if type(value) is float:
+        return AST.FloatNum(value, lineno=lineno)
+    return None
+
+
+def assigned_names(node, names=None):   # names of variables (re)bound anywhere in <node>
+    if names is None:
+        names = set()
+    if isinstance(node, list):
+        for elem in node:
+            assigned_names(elem, names)
+    elif isinstance(node, AST.Node):
+        if isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable):
+            names.add(node.left.name)
+        elif isinstance(node, AST.For):
+            names.add(node.id)
+        for child in vars(node).values():
+            if isinstance(child, (AST.Node, list)):
+                assigned_names(child, names)
+    return names
+
+
+def used_names(node, names=None):       # names of variables read by expression <node>
+    if names is None:
+        names = set()
+    if isinstance(node, list):
+        for elem in node:
+            used_names(elem, names)
+    elif isinstance(node, (AST.Variable, AST.Ref)):
+        names.add(node.name)
+        if isinstance(node, AST.Ref):
+            used_names(node.indices, names)
+    elif isinstance(node, AST.Node):
+        for child in vars(node).values():
+            if isinstance(child, (AST.Node, list)):
+                used_names(child, names)
+    return names
+
+
+def written_names(node, names=None):    # names of matrices changed by element assignment in <node>
+    if names is None:
+        names = set()
+    if isinstance(node, list):
+        for elem in node:
+            written_names(elem, names)
+    elif isinstance(node, AST.Node):
+        if isinstance(node, AST.Assign) and isinstance(node.left, AST.Ref):
+            names.add(node.left.name)
+        for child in vars(node).values():
+            if isinstance(child, (AST.Node, list)):
+                written_names(child, names)
+    return names
+
+
+def is_scalar(node, scalars):   # True if expression <node> can only evaluate to an immutable value
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.RelExpr)):
+        return True
+    if isinstance(node, AST.Variable):
+        return node.name in scalars
+    if isinstance(node, AST.Constant):
+        return not isinstance(node.value, np.ndarray)
+    if isinstance(node, AST.BinExpr):
+        return is_scalar(node.left, scalars) and is_scalar(node.right, scalars)
+    if isinstance(node, AST.UnaryExpr):
+        return is_scalar(node.expr, scalars)
+    if isinstance(node, AST.Ref):
+        return len(node.indices) == 2      # a single index into a matrix yields a row
+    return False
+
+
+def scalar_variables(program):  # names of variables that never hold a matrix
+    sources = {}
+    matrices = written_names(program)
+
+    def collect(node):
+        if isinstance(node, list):
+            for elem in node:
+                collect(elem)
+        elif isinstance(node, AST.Node):
+            if isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable):
+                sources.setdefault(node.left.name, []).append(node.right)
+            elif isinstance(node, AST.For):
+                sources.setdefault(node.id, [])
+            for child in vars(node).values():
+                if isinstance(child, (AST.Node, list)):
+                    collect(child)
+    collect(program)
+
+    scalars = set(sources) - matrices
+    changed = True
+    while changed:
+        changed = False
+        for name in list(scalars):
+            if not all(is_scalar(source, scalars) for source in sources[name]):
+                scalars.discard(name)
+                changed = True
+    return scalars
+
+
+def static_shape(node, shapes):     # NumPy shape of the value of <node>, () for a number, None if unknown
+    shape = getattr(node, 'shape', None)    # inferred by TypeChecker, its dimensions may be symbolic
+    if shape is not None and all(type(dim) is int for dim in shape):
+        return shape
+    if isinstance(node, (AST.IntNum, AST.FloatNum)):
+        return ()
+    if isinstance(node, AST.Constant):
+        return np.shape(node.value) if isinstance(node.value, (int, float, np.ndarray)) else None
+    if isinstance(node, AST.Variable):
+        return shapes.get(node.name)
+    if isinstance(node, AST.Vector):
+        if all(literal_value(elem) is not None for elem in node.elements):
+            return (len(node.elements),)
+        rows = [static_shape(elem, shapes) for elem in node.elements]
+        if rows and all(isinstance(elem, AST.Vector) for elem in node.elements) and rows[0] is not None \
+                and len(rows[0]) == 1 and rows.count(rows[0]) == len(rows):
+            return (len(rows),) + rows[0]
+        return None
+    if isinstance(node, AST.Function):
+        args = [literal_value(arg) for arg in node.args]
+        if not all(type(arg) is int for arg in args):
+            return None
+        if node.name == 'eye' and len(args) == 1:
+            return (args[0], args[0])
+        return tuple(args) if node.name in ('zeros', 'ones') and len(args) in (1, 2) else None
+    if isinstance(node, AST.Transpose):
+        shape = static_shape(node.expr, shapes)
+        return shape[::-1] if shape is not None else None
+    if isinstance(node, (AST.UnaryExpr, AST.MatrixPower)):
+        return static_shape(node.expr, shapes)
+    if isinstance(node, AST.SymmetricProduct):
+        shape = static_shape(node.expr, shapes)
+        if shape is None or len(shape) < 2:
+            return None if shape is None else ()    # a vector times itself is a number
+        return (shape[1], shape[1]) if node.left else (shape[0], shape[0])
+    if isinstance(node, AST.BinExpr):
+        left, right = static_shape(node.left, shapes), static_shape(node.right, shapes)
+        if left is None or right is None:
+            return None
+        if left == () or right == ():
+            return None if node.op == '/' and right != () else left + right
+        if node.op == '*':
+            if left[-1] != right[0]:
+                return None
+            return left[:-1] + right[1:]        # np.matmul drops the dimension of a vector
+        return left if left == right and node.op != '/' else None
+    return None
+
+
+def matrix_shapes(program):     # variable name -> shape of the matrix it holds wherever it is defined
+    sources = {}
+
+    def collect(node):
+        if isinstance(node, list):
+            for elem in node:
+                collect(elem)
+        elif isinstance(node, AST.Node):
+            if isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable):
+                sources.setdefault(node.left.name, []).append(node)
+            elif isinstance(node, AST.For):
+                sources.setdefault(node.id, []).append(None)
+            for child in vars(node).values():
+                if isinstance(child, (AST.Node, list)):
+                    collect(child)
+    collect(program)
+
+    # a variable is added once all its assignments give the same shape given
+    # the shapes found so far; compound assignments must keep that shape
+    shapes = {}
+    changed = True
+    while changed:
+        changed = False
+        for name, assignments in sources.items():
+            if name in shapes or None in assignments:
+                continue
+            found = {static_shape(assign.right, shapes) for assign in assignments if assign.op == '='}
+            if len(found) != 1 or None in found or () in found:
+                continue
+            shape, = found
+            trial = dict(shapes, **{name: shape})
+            if all(static_shape(AST.BinExpr(assign.op[:-1], assign.left, assign.right), trial) == shape
+                   for assign in assignments if assign.op != '='):
+                shapes[name] = shape
+                changed = True
+    return shapes
+
+
+def cannot_fail(node, shapes):
+    # True if evaluating expression <node> cannot fail, so a pass may evaluate
+    # it where the program would not, or drop it: numbers, literals, defined
+    # variables, and operators whose operand shapes are known to fit (<shapes>
+    # as for static_shape)
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.Constant)):
+        return True
+    if isinstance(node, AST.Variable):      # defined where TypeChecker found its type
+        return is_temporary(node.name) or getattr(node, 'shape', None) is not None
+    if isinstance(node, AST.MatrixChain):
+        operands = [static_shape(operand, shapes) for operand in node.operands]
+        return all(shape for shape in operands) and all(a[-1] == b[0] for a, b in zip(operands, operands[1:])) \
+            and all(cannot_fail(operand, shapes) for operand in node.operands)
+    if isinstance(node, AST.RelExpr):       # tested for truth, which only a number always allows
+        return static_shape(node.left, shapes) == () and static_shape(node.right, shapes) == () \
+            and cannot_fail(node.left, shapes) and cannot_fail(node.right, shapes)
+    shape = static_shape(node, shapes)
+    if shape is None:
+        return False
+    if isinstance(node, AST.BinExpr):
+        if node.op in ('/', './') and not literal_value(node.right):
+            return False    # could divide by zero
+        return cannot_fail(node.left, shapes) and cannot_fail(node.right, shapes)
+    if isinstance(node, AST.UnaryExpr):
+        return cannot_fail(node.expr, shapes)
+    if isinstance(node, (AST.Transpose, AST.SymmetricProduct)):
+        return shape != () and cannot_fail(node.expr, shapes)
+    if isinstance(node, AST.MatrixPower):
+        return len(shape) == 2 and shape[0] == shape[1] and cannot_fail(node.expr, shapes)
+    if isinstance(node, AST.Vector):
+        return all(cannot_fail(elem, shapes) for elem in node.elements)
+    if isinstance(node, AST.Function):
+        return all(type(literal_value(arg)) is int and literal_value(arg) > 0 for arg in node.args)
+    return False            # Ref may index out of bounds
+
+
+def same_expression(a, b):      # True if <a> and <b> are structurally identical expressions
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_expression(x, y) for x, y in zip(a, b))
+    if isinstance(a, AST.Node):
+        if type(a) is not type(b):
+            return False
+        fields = [name for name in vars(a) if name not in ('lineno', 'slot', 'shape')]
+        return all(same_expression(getattr(a, name), getattr(b, name)) for name in fields)
+    if isinstance(a, np.ndarray):
+        return isinstance(b, np.ndarray) and a.dtype == b.dtype and np.array_equal(a, b)
+    return type(a) is type(b) and a == b
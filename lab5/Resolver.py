@@ -0,0 +1,39 @@
+
+import AST
+from Memory import Frame
+from TypeChecker import NodeVisitor
+
+
+# Assigns every variable a fixed slot in a flat Frame. All variables of a
+# program live in the global scope at runtime (loop bodies do not open a new
+# memory), so a single frame shared by the whole program keeps their
+# semantics, including loop variables that stay visible after the loop.
+class Resolver(NodeVisitor):
+
+    def __init__(self, frame=None):
+        self.frame = frame if frame else Frame()
+
+    def resolve(self, node):    # resolves <node> and returns the frame it was resolved against
+        self.visit(node)
+        return self.frame
+
+    def generic_visit(self, node):
+        if isinstance(node, list):
+            for elem in node:
+                self.visit(elem)
+        elif isinstance(node, AST.Node):
+            for child in vars(node).values():
+                if isinstance(child, (AST.Node, list)):
+                    self.visit(child)
+
+    def visit_Variable(self, node):
+        node.slot = self.frame.slot(node.name)
+
+    def visit_Ref(self, node):
+        node.slot = self.frame.slot(node.name)
+        self.visit(node.indices)
+
+    def visit_For(self, node):
+        node.slot = self.frame.slot(node.id)
+        self.visit(node.range)
+        self.visit(node.body)
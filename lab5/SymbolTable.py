@@ -7,30 +7,55 @@ class VariableSymbol(Symbol):
     def __init__(self, name, type):
         super().__init__(name, type)
 
+# All scopes in one table: a name maps to the stack of its bindings in the
+# open scopes, (depth of the scope, symbol) with the innermost last, so get
+# looks at one dict entry however deep the scopes nest. Each open scope keeps
+# the names it bound, popScope takes their bindings off again. pushScope and
+# popScope return the table itself, the scopes are entered and left in order.
 class SymbolTable(object):
 
     def __init__(self, parent, name):
         self.parent = parent
-        self.name = name
-        self.symbols = {}
+        self.bindings = {}                  # name -> [(depth, symbol), ...]
+        self.scopes = [(name, [])]          # per open scope: its name and the names bound in it
+
+    @property
+    def name(self):
+        return self.scopes[-1][0]
 
     def put(self, name, symbol):
-        self.symbols[name] = symbol
+        depth = len(self.scopes) - 1
+        stack = self.bindings.get(name)
+        if stack is None:
+            stack = self.bindings[name] = []
+        if stack and stack[-1][0] == depth:
+            stack[-1] = (depth, symbol)
+        else:
+            stack.append((depth, symbol))
+            self.scopes[-1][1].append(name)
 
     def get(self, name):
-        s = self.symbols.get(name)
-        if s is not None:
-            return s
+        stack = self.bindings.get(name)
+        if stack:
+            return stack[-1][1]
         if self.parent:
             return self.parent.get(name)
         return None
 
-    def getParentScope(self):
-        return self.parent
+    def getParentScope(self):       # the table once the current scope is popped
+        return self if len(self.scopes) > 1 else self.parent
 
     def pushScope(self, name):
-        return SymbolTable(self, name)
+        self.scopes.append((name, []))
+        return self
 
     def popScope(self):
-        return self.parent
-
+        if len(self.scopes) == 1:
+            return self.parent
+        _, names = self.scopes.pop()
+        for name in names:
+            stack = self.bindings[name]
+            stack.pop()
+            if not stack:
+                del self.bindings[name]
+        return self
@@ -0,0 +1,467 @@
+
+import AST
+from Operations import BIN_OPS, ASSIGN_OPS, MATRIX_FUNCTIONS, BREAK, multiply, matrix_function, assign_in_place
+import math
+import numpy as np
+
+
+HOT_LOOP = 50           # iterations a loop runs in the tree walker before its next one is traced
+MAX_SIDE_EXITS = 100    # a trace left this often, and in more than a quarter of its iterations, is dropped
+
+DONE = -1               # exit of a trace whose loop has ended
+HEAD = -2               # exit of a trace entered with variables of other kinds than it was compiled for
+
+SCALAR = 'scalar'       # kinds of values a trace is compiled for: anything but a matrix,
+ARRAY = 'array'         # a matrix, or None when the kind is not known
+
+INLINE_OPS = {'+': '+', '-': '-', '/': '/'}
+REL_OPS = ('==', '!=', '<', '>', '<=', '>=')
+
+
+class TraceAbort(Exception):
+    # raised while recording, before the statement at <path> of the loop body
+    # that a trace cannot hold; the tree walker runs the iteration from there
+    def __init__(self, path):
+        self.path = path
+
+
+class Untraceable(Exception):
+    # raised while generating the code of a trace for an expression that
+    # traceable() does not accept; the loop is left to the tree walker
+    pass
+
+
+def resume(interpreter, node, path):
+    # runs statement <node> from the statement at <path> in it on, returns its status
+    if not path:
+        return node.accept(interpreter)
+    if isinstance(node, AST.Compound):
+        status = resume(interpreter, node.statements[path[0]], path[1:])
+        for stmt in node.statements[path[0] + 1:]:
+            if status is not None:
+                break
+            status = stmt.accept(interpreter)
+        return status
+    return resume(interpreter, node.if_body if path[0] == 'if' else node.else_body, path[1:])
+
+
+def kind_of(value):
+    if value is None:
+        return None
+    return ARRAY if type(value) is np.ndarray else SCALAR
+
+
+def binary_kind(left, right):   # kind of the result of an arithmetic operator
+    if left == SCALAR and right == SCALAR:
+        return SCALAR
+    if left == ARRAY or right == ARRAY:
+        return ARRAY
+    return None
+
+
+def traceable(node):    # True if expression <node> can be compiled into a trace
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.Variable, AST.Constant)):
+        return True
+    if isinstance(node, AST.BinExpr):
+        return node.op in BIN_OPS and traceable(node.left) and traceable(node.right)
+    if isinstance(node, AST.RelExpr):
+        return node.op in REL_OPS and traceable(node.left) and traceable(node.right)
+    if isinstance(node, (AST.UnaryExpr, AST.Transpose)):
+        return traceable(node.expr)
+    if isinstance(node, AST.Ref):
+        return len(node.indices) in (1, 2) and all(traceable(index) for index in node.indices)
+    if isinstance(node, AST.Function):
+        return node.name in MATRIX_FUNCTIONS and all(traceable(arg) for arg in node.args)
+    return False
+
+
+def read_slots(node, slots):    # slots of the variables and matrices expression <node> reads, in order
+    if isinstance(node, list):
+        for elem in node:
+            read_slots(elem, slots)
+    elif isinstance(node, (AST.Variable, AST.Ref)):
+        slots.append(node.slot)
+        if isinstance(node, AST.Ref):
+            read_slots(node.indices, slots)
+    elif isinstance(node, AST.Node):
+        for child in vars(node).values():
+            if isinstance(child, (AST.Node, list)):
+                read_slots(child, slots)
+    return slots
+
+
+# Tiered execution of While and For loops: a loop runs in the tree walker
+# until it is hot, then the statements executed by its next iteration are
+# recorded into a linear trace, the taken branch of every If becoming a
+# guard on its condition. The trace is compiled with compile() into a
+# Python function that runs iterations until the loop ends or a guard fails,
+# keeping number variables in Python locals and using plain Python
+# operators wherever the kinds of the operands (number or matrix) are known;
+# the kinds of the variables it reads are guarded once on entry, the kinds
+# they get in the trace are the same in every iteration. On a failed guard
+# the trace returns the path of the statement it stopped at, and the tree
+# walker runs the rest of that iteration. Loops whose condition or iteration
+# holds anything else (inner loops, break, return, optimizer nodes) stay in the
+# tree walker; an inner loop gets a trace of its own.
+class TracingJIT(object):
+
+    def __init__(self):
+        self.counts = {}        # loop -> iterations run in the tree walker
+        self.traces = {}        # loop -> Trace, None if it cannot be traced
+        self.interpreted = 0
+        self.compiled = 0
+        self.recorded = 0
+        self.aborted = 0
+        self.side_exits = 0
+
+    def report(self):
+        total = self.interpreted + self.compiled
+        return ("tracing jit: {0} of {1} loop iterations ran compiled, {2} traces compiled, "
+                "{3} loops not traceable, {4} side exits").format(
+            self.compiled, total, self.recorded, self.aborted, self.side_exits)
+
+    def run_while(self, interpreter, node):
+        while True:
+            trace = self.traces.get(node)
+            if trace is not None:
+                iterations, exit = trace.function(interpreter.slots, interpreter.frame)
+                self.ran(trace, iterations)
+                if exit == DONE:
+                    return None
+                if exit != HEAD:
+                    self.side_exit(node, trace)
+                    if self.iteration(interpreter, node, trace.exits[exit]) is BREAK:
+                        return None
+                    continue
+                self.side_exit(node, trace)
+            if not node.cond.accept(interpreter):
+                return None
+            if self.iteration(interpreter, node, ()) is BREAK:
+                return None
+
+    def run_for(self, interpreter, node):
+        start, end = node.range.accept(interpreter)
+        range(start, end + 1)   # bounds that are not integers fail here, before the first iteration
+        i = start
+        while i <= end:
+            trace = self.traces.get(node)
+            if trace is not None:
+                iterations, exit = trace.function(interpreter.slots, interpreter.frame, i, end)
+                self.ran(trace, iterations)
+                if exit == DONE:
+                    return None
+                i += iterations
+                self.side_exit(node, trace)
+                if exit != HEAD:
+                    if self.iteration(interpreter, node, trace.exits[exit]) is BREAK:
+                        return None
+                    i += 1
+                    continue
+            interpreter.frame.store(node.slot, i)
+            if self.iteration(interpreter, node, ()) is BREAK:
+                return None
+            i += 1
+
+    def ran(self, trace, iterations):
+        trace.iterations += iterations
+        self.compiled += iterations
+
+    def side_exit(self, loop, trace):
+        self.side_exits += 1
+        trace.side_exits += 1
+        if trace.side_exits > MAX_SIDE_EXITS and trace.side_exits * 4 > trace.iterations:
+            self.traces[loop] = None
+
+    def iteration(self, interpreter, loop, path):
+        # runs one iteration of <loop> in the tree walker from the statement at
+        # <path> on, recording it if it is a whole one and the loop is hot;
+        # returns the status the iteration ended with
+        self.interpreted += 1
+        count = self.counts[loop] = self.counts.get(loop, 0) + 1
+        if path or count < HOT_LOOP or loop in self.traces:
+            return resume(interpreter, loop.body, path)
+        try:
+            recording = Recording(interpreter, loop)
+            recording.statement(loop.body, ())
+        except TraceAbort as abort:
+            self.traces[loop] = None
+            self.aborted += 1
+            return resume(interpreter, loop.body, abort.path)
+        try:
+            self.traces[loop] = recording.compile()
+        except Untraceable:     # the iteration has run, only the trace is abandoned
+            self.traces[loop] = None
+            self.aborted += 1
+            return None
+        self.recorded += 1
+        return None
+
+
+class Trace(object):
+
+    def __init__(self, function, exits, source):
+        self.function = function    # (slots, frame[, start, end]) -> (whole iterations run, exit)
+        self.exits = exits          # exit -> path of the statement the tree walker resumes at
+        self.source = source
+        self.iterations = 0
+        self.side_exits = 0
+
+
+class Recording(object):
+    # executes one iteration of a loop statement by statement, recording the
+    # statements and the branches taken
+
+    def __init__(self, interpreter, loop):
+        self.interpreter = interpreter
+        self.loop = loop
+        self.items = []         # ('guard', cond, taken, path) and ('stmt', statement, path)
+        self.entry = {}         # slot -> kind of the value it held when the iteration began
+        self.assigned = set()
+        if isinstance(loop, AST.For):
+            self.assigned.add(loop.slot)
+        elif traceable(loop.cond):
+            self.observe(loop.cond)
+        else:
+            raise TraceAbort(())
+
+    def observe(self, node):    # notes the kinds of the variables <node> reads before the iteration assigns them
+        slots = self.interpreter.slots
+        for slot in read_slots(node, []):
+            if slot not in self.assigned and slot not in self.entry:
+                self.entry[slot] = kind_of(slots[slot])
+
+    def statement(self, node, path):    # returns True if the iteration ended with continue
+        if isinstance(node, AST.Compound):
+            for index, stmt in enumerate(node.statements):
+                if self.statement(stmt, path + (index,)):
+                    return True
+            return False
+        if isinstance(node, AST.If) and traceable(node.cond):
+            self.observe(node.cond)
+            taken = bool(node.cond.accept(self.interpreter))
+            self.items.append(('guard', node.cond, taken, path))
+            body = node.if_body if taken else node.else_body
+            return body is not None and self.statement(body, path + ('if' if taken else 'else',))
+        if isinstance(node, AST.Continue):
+            return True
+        if isinstance(node, AST.Print) and all(traceable(arg) for arg in node.args) or \
+                isinstance(node, AST.Assign) and traceable(node.right) and \
+                (isinstance(node.left, AST.Variable) or all(traceable(index) for index in node.left.indices)):
+            self.observe(node.args if isinstance(node, AST.Print) else [node.right, node.left])
+            self.items.append(('stmt', node, path))
+            node.accept(self.interpreter)
+            if isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable):
+                self.assigned.add(node.left.slot)
+            return False
+        raise TraceAbort(path)
+
+    def compile(self):
+        # the kinds of the variables at the start of an iteration must be the
+        # kinds they have at its end, those that differ are taken as unknown
+        kinds = dict(self.entry)
+        while True:
+            generator = TraceGenerator(self.loop, self.items, kinds)
+            source = generator.generate()
+            changed = {slot for slot, kind in kinds.items() if generator.kinds.get(slot, kind) != kind}
+            if not changed:
+                break
+            for slot in changed:
+                kinds[slot] = None
+        namespace = dict(np=np, ndarray=np.ndarray, BIN_OPS=BIN_OPS, ASSIGN_OPS=ASSIGN_OPS, multiply=multiply,
+                         matmul=np.matmul, matrix_function=matrix_function, assign_in_place=assign_in_place,
+                         DONE=DONE, HEAD=HEAD, K=generator.constants)
+        exec(compile(source, "<trace of line {0}>".format(self.loop.lineno), 'exec'), namespace)
+        return Trace(namespace['trace'], generator.exits, source)
+
+
+class TraceGenerator(object):
+    # Python source of a recorded trace
+
+    def __init__(self, loop, items, entry):
+        self.loop = loop
+        self.items = items
+        self.entry = entry      # slot -> kind at the start of an iteration, guarded on entry
+        self.kinds = {}         # slot -> kind at the current point of the iteration
+        self.local = set()      # slots held in Python locals: numbers all through the trace
+        self.constants = []
+        self.exits = []
+        self.lines = []
+
+    def generate(self):
+        self.local = self.localizable()
+        self.constants = []
+        assigned = sorted(slot for slot in self.local if self.assigns(slot))
+        self.writeback = ''.join("slots[{0}] = v{0}; ".format(slot) for slot in assigned)
+
+        is_for = isinstance(self.loop, AST.For)
+        self.emit(0, "def trace(slots, frame{0}):".format(", start, end" if is_for else ""))
+        self.emit(1, "store = frame.store")
+        self.emit(1, "writable = frame.writable")
+        guards = dict((slot, SCALAR) for slot in self.local)
+        guards.update((slot, kind) for slot, kind in self.entry.items() if kind is not None)
+        for slot, kind in sorted(guards.items()):
+            self.emit(1, "if type(slots[{0}]) is {1}ndarray: return 0, HEAD".format(
+                slot, "not " if kind == ARRAY else ""))
+        for slot in sorted(self.local):
+            self.emit(1, "v{0} = slots[{0}]".format(slot))
+        self.emit(1, "n = 0")
+
+        self.kinds = dict(self.entry)
+        if is_for:
+            self.emit(1, "for i in range(start, end + 1):")
+            slot = self.loop.slot
+            self.emit(2, "v{0} = i".format(slot) if slot in self.local else "store({0}, i)".format(slot))
+            self.kinds[self.loop.slot] = SCALAR
+        else:
+            self.emit(1, "while True:")
+            cond, _ = self.expression(self.loop.cond)
+            self.emit(2, "if not {0}:".format(cond))
+            self.emit(3, "{0}return n, DONE".format(self.writeback))
+        for item in self.items:
+            if item[0] == 'guard':
+                self.guard(*item[1:])
+            else:
+                self.statement(item[1])
+        self.emit(2, "n += 1")
+        self.emit(1, "{0}return n, DONE".format(self.writeback))
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def assigns(self, slot):
+        return slot == getattr(self.loop, 'slot', None) or any(
+            item[0] == 'stmt' and isinstance(item[1], AST.Assign) and isinstance(item[1].left, AST.Variable)
+            and item[1].left.slot == slot for item in self.items)
+
+    def localizable(self):
+        # slots that hold numbers at the start of the iteration (or are set
+        # before they are read) and are only assigned numbers; matrices stay
+        # in the frame, which tracks the variables sharing them
+        candidates = {slot for slot, kind in self.entry.items() if kind == SCALAR}
+        rejected = {slot for slot, kind in self.entry.items() if kind != SCALAR}
+        self.kinds = dict(self.entry)
+        if isinstance(self.loop, AST.For):
+            self.kinds[self.loop.slot] = SCALAR
+            candidates.add(self.loop.slot)
+        for item in self.items:
+            node = item[1]
+            if item[0] != 'stmt' or not isinstance(node, AST.Assign) or isinstance(node.left, AST.Ref):
+                continue
+            slot = node.left.slot
+            _, kind = self.value_kind(node)
+            if kind == SCALAR and slot not in rejected:
+                candidates.add(slot)
+            else:
+                rejected.add(slot)
+            self.kinds[slot] = kind
+        refs = set()
+        for item in self.items:
+            self.ref_slots(item[1], refs)
+        return candidates - rejected - refs
+
+    def ref_slots(self, node, refs):
+        if isinstance(node, list):
+            for elem in node:
+                self.ref_slots(elem, refs)
+        elif isinstance(node, AST.Node):
+            if isinstance(node, AST.Ref):
+                refs.add(node.slot)
+            for child in vars(node).values():
+                if isinstance(child, (AST.Node, list)):
+                    self.ref_slots(child, refs)
+
+    def value_kind(self, node):     # code and kind of the value Assign <node> gives its variable
+        code, kind = self.expression(node.right)
+        if node.op != '=':
+            kind = binary_kind(self.kinds.get(node.left.slot), kind)
+        return code, kind
+
+    def exit(self, indent, path):
+        self.exits.append(path)
+        self.emit(indent, "{0}return n, {1}".format(self.writeback, len(self.exits) - 1))
+
+    def guard(self, cond, taken, path):
+        code, _ = self.expression(cond)
+        self.emit(2, "if {0}{1}:".format("not " if taken else "", code))
+        self.exit(3, path)
+
+    def statement(self, node):
+        if isinstance(node, AST.Print):
+            self.emit(2, "print({0})".format(", ".join(self.expression(arg)[0] for arg in node.args)))
+            return
+        if isinstance(node.left, AST.Ref):
+            value, _ = self.expression(node.right)
+            indices = "".join(self.expression(index)[0] + ", " for index in node.left.indices)
+            self.emit(2, "w = writable({0}); value = {1}; index = ({2})".format(node.left.slot, value, indices))
+            if node.op == '=':
+                self.emit(2, "w[index] = value")
+            else:
+                self.emit(2, "old = w[index]; new = assign_in_place({0!r}, old, value)".format(node.op))
+                self.emit(2, "if new is not old: w[index] = new")
+            return
+
+        slot = node.left.slot
+        value, kind = self.expression(node.right)
+        if slot in self.local:
+            if node.op == '=':
+                self.emit(2, "v{0} = {1}".format(slot, value))
+            elif node.op[:-1] in INLINE_OPS or node.op == '*=':
+                self.emit(2, "v{0} = v{0} {1} {2}".format(slot, node.op[:-1], value))
+            else:
+                self.emit(2, "v{0} = ASSIGN_OPS[{1!r}](v{0}, {2})".format(slot, node.op, value))
+        elif node.op == '=':
+            self.emit(2, "store({0}, {1})".format(slot, value))
+        elif node.inplace:
+            self.emit(2, "old = writable({0}); new = assign_in_place({1!r}, old, {2})".format(slot, node.op, value))
+            self.emit(2, "if new is not old: store({0}, new)".format(slot))
+        else:
+            self.emit(2, "store({0}, ASSIGN_OPS[{1!r}](slots[{0}], {2}))".format(slot, node.op, value))
+        self.kinds[slot] = kind if node.op == '=' else binary_kind(self.kinds.get(slot), kind)
+
+    def variable(self, slot):
+        return "v{0}".format(slot) if slot in self.local else "slots[{0}]".format(slot)
+
+    def constant(self, value):
+        self.constants.append(value)
+        return "K[{0}]".format(len(self.constants) - 1)
+
+    def expression(self, node):     # Python code and kind of expression <node>
+        if isinstance(node, AST.IntNum) or isinstance(node, AST.FloatNum) and math.isfinite(node.value):
+            return "({0!r})".format(node.value), SCALAR
+        if isinstance(node, (AST.FloatNum, AST.String)):
+            return self.constant(node.value), SCALAR
+        if isinstance(node, AST.Constant):
+            if isinstance(node.value, np.ndarray):
+                return self.constant(node.value) + ".copy()", ARRAY
+            return self.constant(node.value), SCALAR
+        if isinstance(node, AST.Variable):
+            return self.variable(node.slot), self.kinds.get(node.slot)
+        if isinstance(node, AST.BinExpr):
+            (left, left_kind), (right, right_kind) = self.expression(node.left), self.expression(node.right)
+            kind = binary_kind(left_kind, right_kind)
+            if node.op in INLINE_OPS:
+                return "({0} {1} {2})".format(left, node.op, right), kind
+            if node.op == '*':
+                if left_kind == SCALAR or right_kind == SCALAR:
+                    return "({0} * {1})".format(left, right), kind
+                function = "matmul" if left_kind == ARRAY and right_kind == ARRAY else "multiply"
+                return "{0}({1}, {2})".format(function, left, right), kind
+            return "BIN_OPS[{0!r}]({1}, {2})".format(node.op, left, right), kind
+        if isinstance(node, AST.RelExpr):
+            (left, left_kind), (right, right_kind) = self.expression(node.left), self.expression(node.right)
+            return "({0} {1} {2})".format(left, node.op, right), binary_kind(left_kind, right_kind)
+        if isinstance(node, AST.UnaryExpr):
+            code, kind = self.expression(node.expr)
+            return ("(-{0})".format(code) if node.op == '-' else code), kind
+        if isinstance(node, AST.Transpose):
+            code, kind = self.expression(node.expr)
+            return "{0}.T".format(code), (ARRAY if kind == ARRAY else None)
+        if isinstance(node, AST.Ref):
+            indices = ", ".join(self.expression(index)[0] for index in node.indices)
+            kind = SCALAR if len(node.indices) == 2 and self.kinds.get(node.slot) == ARRAY else None
+            return "slots[{0}][{1}]".format(node.slot, indices), kind
+        if isinstance(node, AST.Function) and node.name in MATRIX_FUNCTIONS:
+            args = ", ".join(self.expression(arg)[0] for arg in node.args)
+            return "matrix_function({0!r}, [{1}])".format(node.name, args), ARRAY
+        raise Untraceable(node)
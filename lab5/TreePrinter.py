@@ -129,6 +129,51 @@ class TreePrinter:
         print("|  " * indent + "TRANSPOSE")
         self.expr.printTree(indent + 1)
 
+    @addToClass(AST.Constant)
+    def printTree(self, indent=0):
+        print("|  " * indent + "CONSTANT")
+        for line in str(self.value).splitlines():
+            print("|  " * (indent + 1) + line)
+
+    @addToClass(AST.Fused)
+    def printTree(self, indent=0):
+        print("|  " * indent + "FUSED " + " ".join("_" if step is None else step for step in self.steps))
+        for operand in self.operands:
+            operand.printTree(indent + 1)
+
+    @addToClass(AST.MatrixChain)
+    def printTree(self, indent=0):
+        print("|  " * indent + "MATRIX CHAIN")
+        for operand in self.operands:
+            operand.printTree(indent + 1)
+
+    @addToClass(AST.SymmetricProduct)
+    def printTree(self, indent=0):
+        print("|  " * indent + ("SYMMETRIC PRODUCT A'*A" if self.left else "SYMMETRIC PRODUCT A*A'"))
+        self.expr.printTree(indent + 1)
+
+    @addToClass(AST.MatrixPower)
+    def printTree(self, indent=0):
+        print("|  " * indent + "MATRIX POWER " + str(self.power))
+        self.expr.printTree(indent + 1)
+
+    @addToClass(AST.Slice)
+    def printTree(self, indent=0):
+        print("|  " * indent + ("SLICE" if self.index else "ARANGE"))
+        self.lo.printTree(indent + 1)
+        self.hi.printTree(indent + 1)
+        print("|  " * (indent + 1) + str(self.offset))
+
+    @addToClass(AST.VectorFor)
+    def printTree(self, indent=0):
+        print("|  " * indent + "VECTOR FOR")
+        self.lo.printTree(indent + 1)
+        self.hi.printTree(indent + 1)
+        for stmt in self.body:
+            stmt.printTree(indent + 1)
+        print("|  " * indent + "OTHERWISE")
+        self.loop.printTree(indent + 1)
+
     @addToClass(AST.Error)
     def printTree(self, indent=0):
         pass
@@ -1,15 +1,32 @@
 import AST
+from types import GeneratorType
+from functools import reduce
 from SymbolTable import SymbolTable, VariableSymbol
 
 
+# visit() calls the visit_<class name> method for the class of the node, or
+# generic_visit if there is none. The method is looked up once per node class
+# and kept in a table of the visitor class, every subclass gets its own.
 class NodeVisitor(object):
 
+    handlers = {}       # node class -> visit_* function or generic_visit
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handlers = {}
+
     def visit(self, node):
         if node is None:
             return None
-        method = 'visit_' + node.__class__.__name__
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node)
+        handler = self.handlers.get(node.__class__)
+        if handler is None:
+            handler = self.handler(node.__class__)
+        return handler(self, node)
+
+    @classmethod
+    def handler(cls, node_class):
+        handler = cls.handlers[node_class] = getattr(cls, 'visit_' + node_class.__name__, cls.generic_visit)
+        return handler
 
     def generic_visit(self, node):
         if isinstance(node, list):
@@ -17,14 +34,270 @@ class NodeVisitor(object):
                 self.visit(elem)
 
 
+# A matrix dimension known only symbolically: constant + sum of coefficient *
+# variable, e.g. n + 1 or 2 * n. A variable stands for the value of one of its
+# assignments (the VariableSymbol the assignment created), so n before and after
+# n = n + 1 are different variables. Dimensions known to be a number are ints.
+class Dim(object):
+
+    def __init__(self, terms, constant):
+        self.terms = terms              # ((symbol, coefficient), ...) ordered by name
+        self.constant = constant
+
+    def __eq__(self, other):
+        return isinstance(other, Dim) and self.terms == other.terms and self.constant == other.constant
+
+    def __hash__(self):
+        return hash((self.terms, self.constant))
+
+    def __repr__(self):
+        parts = [symbol.name if coefficient == 1 else "{0}*{1}".format(coefficient, symbol.name)
+                 for symbol, coefficient in self.terms]
+        if self.constant:
+            parts.append(str(self.constant))
+        return " + ".join(parts)
+
+
+def make_dim(terms, constant):      # an int once no variable is left
+    terms = tuple(sorted(((symbol, coefficient) for symbol, coefficient in terms.items() if coefficient),
+                         key=lambda term: (term[0].name, id(term[0]))))
+    return Dim(terms, constant) if terms else constant
+
+
+def add_dims(a, b, scale=1):        # a + scale * b, None if either is unknown
+    if a is None or b is None:
+        return None
+    terms = dict(a.terms) if isinstance(a, Dim) else {}
+    for symbol, coefficient in (b.terms if isinstance(b, Dim) else ()):
+        terms[symbol] = terms.get(symbol, 0) + scale * coefficient
+    constant_a = a.constant if isinstance(a, Dim) else a
+    constant_b = b.constant if isinstance(b, Dim) else b
+    return make_dim(terms, constant_a + scale * constant_b)
+
+
+def scale_dim(a, scale):
+    return add_dims(0, a, scale)
+
+
+def same_dim(a, b):     # True if certainly equal, False if certainly different, None if it is not known
+    difference = add_dims(a, b, -1)
+    if difference is None or isinstance(difference, Dim):
+        return None
+    return difference == 0
+
+
+def common_dim(a, b):   # the better known of two dimensions equal at runtime
+    if type(a) is int or b is None:
+        return a
+    return b
+
+
+def broadcast_dims(dims1, dims2):
+    # dimensions of an element-wise result, NumPy stretches a vector along the
+    # rows of a matrix and a dimension of 1 along the other; None if the
+    # shapes certainly do not fit
+    if len(dims1) < len(dims2):
+        dims1, dims2 = dims2, dims1
+    dims = list(dims1)
+    for i, b in enumerate(dims2, len(dims1) - len(dims2)):
+        a = dims1[i]
+        if a == 1 or b == 1:
+            dims[i] = b if a == 1 else a
+        elif same_dim(a, b) is False:
+            return None
+        else:
+            dims[i] = common_dim(a, b)
+    return tuple(dims)
+
+
+def join_types(a, b):   # type of a variable holding a value of type <a> or one of type <b>
+    if a == b:
+        return a
+    if isinstance(a, tuple) and isinstance(b, tuple) and a[0] == b[0]:
+        dims = tuple(x if x == y else None for x, y in zip(a[1:-1], b[1:-1]))
+        return (a[0],) + dims + (a[-1] if a[-1] == b[-1] else None,)
+    return None
+
+
+def widened(t):         # type <t> with its dimensions unknown
+    if isinstance(t, tuple):
+        return (t[0],) + (None,) * (len(t) - 2) + (t[-1],)
+    return t
+
+
+def shape_of(t):        # NumPy shape of a value of type <t>: () for a number, None if it is not known
+    if t in ('int', 'float'):
+        return ()
+    if isinstance(t, tuple) and not isinstance(t[-1], tuple):
+        return tuple(t[1:-1])
+    return None
+
+
+def statements_in(node):    # statements directly inside statement <node>
+    if isinstance(node, AST.Compound):
+        return node.statements
+    if isinstance(node, AST.If):
+        return [node.if_body, node.else_body] if node.else_body else [node.if_body]
+    if isinstance(node, (AST.While, AST.For)):
+        return [node.body]
+    return []
+
+
+def assigned_variables(node, cache):
+    # names of variables assigned anywhere in statement <node>; the names of
+    # every statement walked are kept in <cache>, so a chain of else ifs, where
+    # each if asks for the rest of the chain, is walked once; the walk keeps
+    # its own stack, statements may nest deeper than Python calls can
+    stack = [(node, False)]
+    while stack:
+        node, walked = stack.pop()
+        if not walked:
+            stack.append((node, True))
+            stack.extend((child, False) for child in statements_in(node) if child not in cache)
+            continue
+        names = set()
+        if isinstance(node, AST.Assign) and isinstance(node.left, AST.Variable):
+            names.add(node.left.name)
+        elif isinstance(node, AST.For):
+            names.add(node.id)
+        for child in statements_in(node):
+            names |= cache[child]
+        cache[node] = names
+    return cache[node]
+
+
+# nodes annotated with the shape of their value (see shape_of), for the
+# optimization passes: node.shape holds ints and Dims, or is None
+EXPRESSIONS = (AST.IntNum, AST.FloatNum, AST.String, AST.Variable, AST.BinExpr, AST.RelExpr, AST.UnaryExpr,
+               AST.Transpose, AST.Vector, AST.Ref, AST.Function)
+
+# nodes whose type is recorded in the types table: expressions and the
+# values assignments store
+TYPED = EXPRESSIONS + (AST.Assign,)
+
+# loop bodies checked more often than this before the types of their
+# variables settle leave those types unknown
+MAX_LOOP_PASSES = 5
+
+
+# The visit_* methods of nodes with children are generators: a child is
+# visited by yielding it, the type of the child is what the yield returns.
+# Recursively each yielded child is visited by a call of visit() right away;
+# with iterative=True the handlers of the nodes being visited are kept on a
+# list instead of the Python stack, so programs of any depth can be checked.
+# Both visit the nodes in the same order and report the same errors.
 class TypeChecker(NodeVisitor):
 
-    def __init__(self):
+    def __init__(self, types=None, iterative=False):    # <types>, if given, is filled with node -> type for TYPED nodes
         self.table = SymbolTable(None, "global")
+        self.types = types
+        self.iterative = iterative
+        self.assigned = {}      # statement -> names of the variables assigned in it, see assigned_variables
         self.loop_nesting = 0
+        self.silent = 0         # > 0 while a loop body is checked only for the types of its variables
+        self.dims = {}          # int VariableSymbol -> its value as a dimension
+        self.failed = set()     # symbols assigned an expression with errors
+        self.errors = 0
+        self.jumps = []         # per enclosing loop: symbols of its variables at each break/continue
 
     def error(self, message, lineno):
-        print(f"Line {lineno}: {message}")
+        self.errors += 1
+        if not self.silent:
+            print(f"Line {lineno}: {message}")
+
+    def visit(self, node):
+        errors = self.errors
+        result = NodeVisitor.visit(self, node)
+        if type(result) is GeneratorType:
+            result = self.run(result) if self.iterative else self.recurse(result)
+        self.record(node, result, self.errors > errors)
+        return result
+
+    def record(self, node, result, failed=False):
+        if isinstance(node, EXPRESSIONS):     # an expression with errors may fail whatever its type
+            node.shape = None if failed else shape_of(result)
+        if self.types is not None and isinstance(node, TYPED):
+            self.types[node] = result
+
+    def recurse(self, handler):     # the result of <handler>, visiting the children it yields with visit()
+        try:
+            child = next(handler)
+            while True:
+                child = handler.send(self.visit(child))
+        except StopIteration as stop:
+            return stop.value
+
+    def run(self, handler):
+        # the result of <handler>; the handlers of the children it yields, and
+        # of their children, are run from a stack of (node, handler) pairs
+        handlers = self.handlers
+        stack = [(None, handler, self.errors)]
+        result = None
+        while stack:
+            node, handler, errors = stack[-1]
+            try:
+                child = handler.send(result)
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+                if node is not None:
+                    self.record(node, result, self.errors > errors)
+                continue
+            if child is None:
+                result = None
+                continue
+            handler = handlers.get(child.__class__)
+            if handler is None:
+                handler = self.handler(child.__class__)
+            errors = self.errors
+            result = handler(self, child)
+            if type(result) is GeneratorType:
+                stack.append((child, result, errors))
+                result = None
+            else:
+                self.record(child, result, self.errors > errors)
+        return result
+
+    def generic_visit(self, node):
+        if isinstance(node, list):
+            for elem in node:
+                yield elem
+
+    def dimension(self, node):
+        # value of int expression <node> as a dimension, None if not linear;
+        # computed bottom up with a stack of its own, <node> may nest deeply
+        stack = [(node, False)]
+        values = []
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                if isinstance(node, AST.UnaryExpr):
+                    values.append(scale_dim(values.pop(), -1))
+                    continue
+                right, left = values.pop(), values.pop()
+                if node.op != '*':
+                    values.append(add_dims(left, right, 1 if node.op == '+' else -1))
+                elif type(left) is int:
+                    values.append(scale_dim(right, left))
+                elif type(right) is int:
+                    values.append(scale_dim(left, right))
+                else:
+                    values.append(None)
+            elif isinstance(node, AST.UnaryExpr) and node.op == '-':
+                stack += [(node, True), (node.expr, False)]
+            elif isinstance(node, AST.BinExpr) and node.op in ('+', '-', '*'):
+                stack += [(node, True), (node.right, False), (node.left, False)]
+            elif isinstance(node, AST.IntNum):
+                values.append(node.value)
+            elif isinstance(node, AST.Variable):
+                symbol = self.table.get(node.name)
+                if symbol is None or symbol.type != 'int':
+                    values.append(None)
+                else:
+                    values.append(self.dims.get(symbol, make_dim({symbol: 1}, 0)))
+            else:
+                values.append(None)
+        return values[0]
 
     def visit_IntNum(self, node):
         return 'int'
@@ -44,10 +317,11 @@ class TypeChecker(NodeVisitor):
             return None
 
     def visit_BinExpr(self, node):
-        type1 = self.visit(node.left)
-        type2 = self.visit(node.right)
-        op = node.op
+        type1 = yield node.left
+        type2 = yield node.right
+        return self.binary(node.op, type1, type2, node.lineno)
 
+    def binary(self, op, type1, type2, lineno):
         if type1 is None or type2 is None:
             return None
 
@@ -72,49 +346,48 @@ class TypeChecker(NodeVisitor):
 
         if op in ['.+', '.-', '.*', './']:
             if not is_matrix1 or not is_matrix2:
-                self.error(f"Element-wise operation '{op}' requires matrix/vector operands", node.lineno)
+                self.error(f"Element-wise operation '{op}' requires matrix/vector operands", lineno)
                 return None
-            if dims1 != dims2:
-                self.error(f"Incompatible dimensions {dims1} and {dims2} for operation '{op}'", node.lineno)
+            dims = broadcast_dims(dims1, dims2)
+            if dims is None:
+                self.error(f"Incompatible dimensions {dims1} and {dims2} for operation '{op}'", lineno)
                 return None
             elem_type = 'float' if get_elem_type(type1) == 'float' or get_elem_type(type2) == 'float' else 'int'
-            if type1[0] == 'matrix':
-                return ('matrix', type1[1], type1[2], elem_type)
-            else:
-                return ('vector', type1[1], elem_type)
+            return ('matrix' if len(dims) == 2 else 'vector',) + dims + (elem_type,)
 
         if op in ['+', '-']:
             if is_matrix1 != is_matrix2:
-                self.error(f"Cannot perform '{op}' on scalar and matrix/vector", node.lineno)
+                self.error(f"Cannot perform '{op}' on scalar and matrix/vector", lineno)
                 return None
             if is_matrix1 and is_matrix2:
-                if dims1 != dims2:
-                    self.error(f"Incompatible dimensions {dims1} and {dims2} for operation '{op}'", node.lineno)
+                dims = broadcast_dims(dims1, dims2)
+                if dims is None:
+                    self.error(f"Incompatible dimensions {dims1} and {dims2} for operation '{op}'", lineno)
                     return None
                 elem_type = 'float' if get_elem_type(type1) == 'float' or get_elem_type(type2) == 'float' else 'int'
-                if type1[0] == 'matrix':
-                    return ('matrix', type1[1], type1[2], elem_type)
-                else:
-                    return ('vector', type1[1], elem_type)
+                return ('matrix' if len(dims) == 2 else 'vector',) + dims + (elem_type,)
             if type1 == 'float' or type2 == 'float':
                 return 'float'
             return 'int'
 
         if op == '*':
             if is_matrix1 and is_matrix2:
+                elem_type = 'float' if get_elem_type(type1) == 'float' or get_elem_type(type2) == 'float' else 'int'
                 if len(dims1) == 2 and len(dims2) == 2:
-                    if dims1[1] != dims2[0]:
-                        self.error(f"Incompatible dimensions {dims1} and {dims2} for matrix multiplication", node.lineno)
+                    if same_dim(dims1[1], dims2[0]) is False:
+                        self.error(f"Incompatible dimensions {dims1} and {dims2} for matrix multiplication", lineno)
                         return None
-                    elem_type = 'float' if get_elem_type(type1) == 'float' or get_elem_type(type2) == 'float' else 'int'
                     return ('matrix', dims1[0], dims2[1], elem_type)
                 elif len(dims1) == 1 and len(dims2) == 1:
-                    if dims1[0] != dims2[0]:
-                        self.error(f"Incompatible vector dimensions for operation '*'", node.lineno)
+                    if same_dim(dims1[0], dims2[0]) is False:
+                        self.error(f"Incompatible vector dimensions for operation '*'", lineno)
                         return None
                     return 'float'
+                elif same_dim(dims1[-1], dims2[0]) is not False:
+                    # np.matmul drops the dimension of the vector
+                    return ('vector', dims1[0] if len(dims1) == 2 else dims2[1], elem_type)
                 else:
-                    self.error(f"Incompatible dimensions for multiplication", node.lineno)
+                    self.error(f"Incompatible dimensions for multiplication", lineno)
                     return None
             elif is_matrix1 != is_matrix2:
                 elem_type = 'float' if get_elem_type(type1) == 'float' or get_elem_type(type2) == 'float' else 'int'
@@ -129,7 +402,7 @@ class TypeChecker(NodeVisitor):
 
         if op == '/':
             if is_matrix1 and is_matrix2:
-                self.error(f"Cannot divide matrix by matrix", node.lineno)
+                self.error(f"Cannot divide matrix by matrix", lineno)
                 return None
             elif is_matrix1:
                 if type1[0] == 'matrix':
@@ -137,41 +410,59 @@ class TypeChecker(NodeVisitor):
                 else:
                     return ('vector', type1[1], 'float')
             elif is_matrix2:
-                self.error(f"Cannot divide scalar by matrix", node.lineno)
+                self.error(f"Cannot divide scalar by matrix", lineno)
                 return None
             return 'float'
 
         return None
 
     def visit_RelExpr(self, node):
-        self.visit(node.left)
-        self.visit(node.right)
+        type1 = yield node.left
+        type2 = yield node.right
+        if isinstance(type1, tuple) or isinstance(type2, tuple):
+            return None     # compares element by element
         return 'int'
 
     def visit_Assign(self, node):
-        type_right = self.visit(node.right)
+        errors = self.errors
+        type_right = yield node.right
         
         if isinstance(node.left, AST.Variable):
+            value = node.right
             if node.op != '=':
                 symbol = self.table.get(node.left.name)
                 if not symbol:
                     self.error(f"Undefined variable '{node.left.name}'", node.lineno)
                     return None
-            self.table.put(node.left.name, VariableSymbol(node.left.name, type_right))
+                # the errors of A op= B are those of B, the type that of A op B
+                if self.types is not None:
+                    self.types[node.left] = symbol.type
+                self.silent += 1
+                type_right = self.binary(node.op[:-1], symbol.type, type_right, node.lineno)
+                self.silent -= 1
+                value = AST.BinExpr(node.op[:-1], node.left, node.right)
+            symbol = VariableSymbol(node.left.name, type_right)
+            if type_right is None and self.errors > errors:
+                self.failed.add(symbol)
+            if type_right == 'int':
+                dim = self.dimension(value)
+                if dim is not None:
+                    self.dims[symbol] = dim
+            self.table.put(node.left.name, symbol)
         elif isinstance(node.left, AST.Ref):
             symbol = self.table.get(node.left.name)
             if not symbol:
                 self.error(f"Undefined variable '{node.left.name}'", node.lineno)
             else:
-                self.visit_Ref(node.left)
+                yield from self.visit_Ref(node.left)
         
         return type_right
 
     def visit_UnaryExpr(self, node):
-        return self.visit(node.expr)
+        return (yield node.expr)
 
     def visit_Transpose(self, node):
-        expr_type = self.visit(node.expr)
+        expr_type = yield node.expr
         if expr_type is None:
             return None
         if not isinstance(expr_type, tuple):
@@ -185,26 +476,26 @@ class TypeChecker(NodeVisitor):
         if not node.elements:
             return ('vector', 0, 'unknown')
         
-        first_type = self.visit(node.elements[0])
+        first_type = yield node.elements[0]
         if first_type is None:
             return None
         
         if isinstance(first_type, tuple) and first_type[0] == 'vector':
             first_size = first_type[1]
             for i, elem in enumerate(node.elements[1:], 2):
-                elem_type = self.visit(elem)
+                elem_type = yield elem
                 if elem_type is None:
                     continue
                 if not isinstance(elem_type, tuple) or elem_type[0] != 'vector':
                     self.error(f"Inconsistent types in matrix initialization", node.lineno)
                     return None
-                if elem_type[1] != first_size:
+                if same_dim(elem_type[1], first_size) is False:
                     self.error(f"Row {i} has {elem_type[1]} elements, expected {first_size}", node.lineno)
                     return None
             return ('matrix', len(node.elements), first_size, first_type[2])
         else:
             for elem in node.elements[1:]:
-                elem_type = self.visit(elem)
+                elem_type = yield elem
                 if elem_type != first_type and not (first_type in ['int', 'float'] and elem_type in ['int', 'float']):
                     self.error(f"Inconsistent types in vector initialization", node.lineno)
             return ('vector', len(node.elements), first_type)
@@ -233,10 +524,10 @@ class TypeChecker(NodeVisitor):
         for i, index in enumerate(node.indices):
             if isinstance(index, AST.IntNum):
                 val = index.value
-                if val < 0 or val >= dims[i]:
+                if val < 0 or type(dims[i]) is int and val >= dims[i]:
                     self.error(f"Index {val} out of bounds for '{node.name}' (dimension size is {dims[i]})", node.lineno)
             else:
-                t = self.visit(index)
+                t = yield index
                 if t is not None and t != 'int':
                     self.error(f"Index must be an integer", node.lineno)
 
@@ -254,64 +545,125 @@ class TypeChecker(NodeVisitor):
                 self.error(f"Function '{node.name}' accepts at most 2 arguments", node.lineno)
                 return None
             
-            val1, val2 = None, None
-
+            dims = []
             for i, arg in enumerate(args):
-                t = self.visit(arg)
-                if t != 'int':
+                t = yield arg
+                if t is not None and t != 'int':
                     self.error(f"Argument {i+1} of '{node.name}' must be an integer", node.lineno)
-                if isinstance(arg, AST.IntNum):
-                    if arg.value <= 0:
-                        self.error(f"Argument {i+1} of '{node.name}' must be positive", node.lineno)
-                    if i == 0:
-                        val1 = arg.value
-                    else:
-                        val2 = arg.value
-
-            if node.name == 'eye' and len(args) == 2 and val1 is not None and val2 is not None and val1 != val2:
-                self.error(f"Function 'eye' requires square dimensions, got {val1}x{val2}", node.lineno)
-            
-            if val1 is not None:
-                if len(args) == 1:
-                    return ('matrix', val1, val1, 'int')
-                elif val2 is not None:
-                    return ('matrix', val1, val2, 'int')
-            
-            return ('matrix', 0, 0, 'int')
+                if isinstance(arg, AST.IntNum) and arg.value <= 0:
+                    self.error(f"Argument {i+1} of '{node.name}' must be positive", node.lineno)
+                dims.append(self.dimension(arg) if t == 'int' else None)
+
+            if node.name == 'eye':
+                if len(args) == 2 and same_dim(dims[0], dims[1]) is False:
+                    self.error(f"Function 'eye' requires square dimensions, got {dims[0]}x{dims[1]}", node.lineno)
+                return ('matrix', dims[0], dims[0], 'float')
+            if len(args) == 1:
+                return ('vector', dims[0], 'float')
+            return ('matrix', dims[0], dims[1], 'float')
 
         self.error(f"Unknown function '{node.name}'", node.lineno)
         return None
 
     def visit_If(self, node):
-        self.visit(node.cond)
-        self.table = self.table.pushScope("if")
-        self.visit(node.if_body)
-        self.table = self.table.popScope()
+        yield node.cond
+        names = self.outer_variables(node)
+        exits = [(yield from self.branch("if", node.if_body, names))]
         if node.else_body:
-            self.table = self.table.pushScope("else")
-            self.visit(node.else_body)
-            self.table = self.table.popScope()
+            exits.append((yield from self.branch("else", node.else_body, names)))
+        else:
+            exits.append({name: self.table.get(name) for name in names})
+        self.merge(names, exits)
 
     def visit_While(self, node):
-        self.visit(node.cond)
         self.loop_nesting += 1
-        self.table = self.table.pushScope("while")
-        self.visit(node.body)
-        self.table = self.table.popScope()
+        yield from self.loop("while", node.body, cond=node.cond)
         self.loop_nesting -= 1
 
     def visit_For(self, node):
-        self.visit(node.range)
+        yield node.range
         self.loop_nesting += 1
-        self.table = self.table.pushScope("for")
-        self.table.put(node.id, VariableSymbol(node.id, 'int'))
-        self.visit(node.body)
-        self.table = self.table.popScope()
+        yield from self.loop("for", node.body, var=node.id)
         self.loop_nesting -= 1
 
+    def outer_variables(self, node):    # variables defined before statement <node> and assigned in it
+        return sorted(name for name in assigned_variables(node, self.assigned) if self.table.get(name) is not None)
+
+    def branch(self, scope, body, names):   # visits <body>, returns the symbols of <names> at its end
+        self.table = self.table.pushScope(scope)
+        yield body
+        symbols = {name: self.table.get(name) for name in names}
+        self.table = self.table.popScope()
+        return symbols
+
+    def merge(self, names, exits):
+        # where control flow joins, a variable holds its value at any of <exits>
+        for name in names:
+            symbols = [symbols[name] for symbols in exits]
+            if any(symbol is not symbols[0] for symbol in symbols):
+                self.table.put(name, VariableSymbol(name, self.join(symbols)))
+            elif symbols[0] is not self.table.get(name):
+                self.table.put(name, symbols[0])
+
+    def join(self, symbols):
+        # type of a variable holding the value of any of <symbols>; a value
+        # with errors is left out, so they are reported where they occur
+        # rather than hiding the errors of other uses of the variable
+        types = [symbol.type for symbol in symbols if symbol not in self.failed]
+        return reduce(join_types, types) if types else None
+
+    def loop(self, scope, body, cond=None, var=None):
+        # at the start of the body a variable it assigns holds its value from
+        # before the loop or from the end of any iteration, so the body is
+        # checked silently until the types joined there settle, then once more
+        # for its errors and annotations; a loop met in such a silent check
+        # settles only the kinds of its variables, not their dimensions
+        names = [name for name in self.outer_variables(body) if name != var]
+        before = self.table.get(var) if var is not None else None
+        types = {name: self.table.get(name).type for name in names}
+        if self.silent:
+            types = {name: join_types(t, widened(t)) for name, t in types.items()}
+
+        self.silent += 1
+        for _ in range(MAX_LOOP_PASSES):
+            head, end, jumps = yield from self.iteration(scope, body, cond, var, names, types)
+            joined = {name: self.join([head[name], end[name]] + [symbols[name] for _, symbols in jumps])
+                      for name in names}
+            if joined == types:
+                break
+            types = joined
+        else:
+            types = dict.fromkeys(names)
+            head, _, jumps = yield from self.iteration(scope, body, cond, var, names, types)
+        self.silent -= 1
+        if not self.silent:
+            head, _, jumps = yield from self.iteration(scope, body, cond, var, names, types)
+
+        self.merge(names, [head] + [symbols for kind, symbols in jumps if kind == 'break'])
+        if before is not None:      # the loop variable keeps its last value
+            self.table.put(var, VariableSymbol(var, join_types(before.type, 'int')))
+
+    def iteration(self, scope, body, cond, var, names, types):
+        # visits the body once with <names> of <types>, returns their symbols
+        # at the start and end of the body and at its breaks and continues
+        self.table = self.table.pushScope(scope)
+        head = {name: VariableSymbol(name, types[name]) for name in names}
+        for name in names:
+            self.table.put(name, head[name])
+        if var is not None:
+            self.table.put(var, VariableSymbol(var, 'int'))
+        if cond is not None:
+            yield cond
+        self.jumps.append((names, []))
+        yield body
+        _, jumps = self.jumps.pop()
+        end = {name: self.table.get(name) for name in names}
+        self.table = self.table.popScope()
+        return head, end, jumps
+
     def visit_Range(self, node):
-        start_type = self.visit(node.start)
-        end_type = self.visit(node.end)
+        start_type = yield node.start
+        end_type = yield node.end
         if start_type is not None and start_type != 'int':
             self.error(f"Range start must be an integer", node.lineno)
         if end_type is not None and end_type != 'int':
@@ -321,22 +673,30 @@ class TypeChecker(NodeVisitor):
     def visit_Break(self, node):
         if self.loop_nesting == 0:
             self.error(f"'break' used outside of loop", node.lineno)
+        else:
+            self.jump('break')
 
     def visit_Continue(self, node):
         if self.loop_nesting == 0:
             self.error(f"'continue' used outside of loop", node.lineno)
+        else:
+            self.jump('continue')
+
+    def jump(self, kind):
+        names, jumps = self.jumps[-1]
+        jumps.append((kind, {name: self.table.get(name) for name in names}))
     
     def visit_Return(self, node):
         if node.expr:
-            self.visit(node.expr)
+            yield node.expr
 
     def visit_Print(self, node):
         for arg in node.args:
-            self.visit(arg)
+            yield arg
 
     def visit_Compound(self, node):
         for statement in node.statements:
-            self.visit(statement)
+            yield statement
 
     def visit_Error(self, node):
         pass
@@ -0,0 +1,81 @@
+import io
+import time
+import argparse
+import contextlib
+from main import front_end
+from Resolver import Resolver
+from Interpreter import Interpreter
+from ClosureCompiler import ClosureCompiler
+from Bytecode import BytecodeCompiler, VirtualMachine
+
+# Measures loops that leave most iterations with continue or break, in
+# nanoseconds per iteration of the outer loop. Only running the program is
+# timed, parsing and compiling are not.
+
+PROGRAMS = {
+    'continue': """
+s = 0;
+for i = 1:{n} {{
+    if (i > 0)
+        continue;
+    s += 1;
+}}
+""",
+    'break': """
+s = 0;
+for i = 1:{n} {{
+    while (s < 1) {{
+        break;
+    }}
+}}
+""",
+    'nested': """
+s = 0;
+for i = 1:{n} {{
+    for j = 1:3 {{
+        if (j == 2)
+            break;
+        if (j == 1)
+            continue;
+        s += 1;
+    }}
+}}
+""",
+}
+
+
+def run(source, engine):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = front_end(source)
+
+    if engine == 'vm':
+        vm = VirtualMachine(BytecodeCompiler().compile(ast))
+        start = time.perf_counter()
+        vm.run()
+        return time.perf_counter() - start
+
+    frame = Resolver().resolve(ast)
+    if engine == 'closure':
+        program = ast.accept(ClosureCompiler(frame))
+        start = time.perf_counter()
+        program()
+    else:
+        interpreter = Interpreter(frame)
+        start = time.perf_counter()
+        ast.accept(interpreter)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, default=100000, help="iterations of the outer loop")
+    argparser.add_argument('--runs', type=int, default=5, help="the best of this many runs is reported")
+    args = argparser.parse_args()
+
+    engines = ['interpreter', 'closure', 'vm']
+    print("{0:>9s}".format("ns/iter") + "".join("{0:>13s}".format(engine) for engine in engines))
+    for name, program in PROGRAMS.items():
+        source = program.format(n=args.n)
+        times = [min(run(source, engine) for _ in range(args.runs)) for engine in engines]
+        print("{0:>9s}".format(name) + "".join("{0:13.0f}".format(t / args.n * 1e9) for t in times))
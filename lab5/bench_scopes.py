@@ -0,0 +1,69 @@
+import io
+import time
+import argparse
+import contextlib
+from scanner import Scanner
+from parser import Mparser
+from TypeChecker import TypeChecker
+from SymbolTable import SymbolTable, VariableSymbol
+
+# Measures symbol lookups under nested scopes: SymbolTable.get of a global
+# name with 1 .. 50 scopes open, in nanoseconds per lookup, and type checking
+# loops nested 1 .. 50 deep whose bodies read global variables. Only the
+# lookups and the type checking are timed, parsing is not.
+
+GLOBALS = 10
+
+
+def nested_loops(depth):
+    # g0 = 0; ... g9 = 9; s = 0;
+    # for i1 = 1:2 { s += g0 + g1 + ... + i1; for i2 = 1:2 { s += g0 + g1 + ... + i2; ... } }
+    reads = " + ".join("g{0}".format(k) for k in range(GLOBALS))
+    lines = ["g{0} = {0};".format(k) for k in range(GLOBALS)] + ["s = 0;"]
+    for level in range(1, depth + 1):
+        lines.append("for i{0} = 1:2 {{ s += {1} + i{0};".format(level, reads))
+    lines.append("}" * depth)
+    return "\n".join(lines) + "\n"
+
+
+def lookup_time(depth, lookups):    # seconds per get of a global name with <depth> scopes open
+    table = SymbolTable(None, "global")
+    for k in range(GLOBALS):
+        table.put("g{0}".format(k), VariableSymbol("g{0}".format(k), 'int'))
+    for level in range(depth):
+        table = table.pushScope("for")
+        table.put("i{0}".format(level), VariableSymbol("i{0}".format(level), 'int'))
+    names = ["g{0}".format(k) for k in range(GLOBALS)] * (lookups // GLOBALS)
+    get = table.get
+    start = time.perf_counter()
+    for name in names:
+        get(name)
+    return (time.perf_counter() - start) / len(names)
+
+
+def check_time(ast):
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        TypeChecker(iterative=True).visit(ast)
+    elapsed = time.perf_counter() - start
+    if output.getvalue():
+        raise SystemExit("the nested loops have type errors:\n" + output.getvalue()[:500])
+    return elapsed
+
+
+if __name__ == '__main__':
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--max-depth', type=int, default=50, help="deepest nesting measured")
+    argparser.add_argument('--lookups', type=int, default=200000, help="lookups timed per depth")
+    argparser.add_argument('--runs', type=int, default=5, help="the best of this many runs is reported")
+    args = argparser.parse_args()
+
+    depths = sorted(set([1, 10, 20, 30, 40, args.max_depth]))
+    print("{0:>6s} {1:>12s} {2:>14s}".format("depth", "get [ns]", "check [ms]"))
+    for depth in depths:
+        ast = Mparser().parse(Scanner().tokenize(nested_loops(depth)))
+        lookup = min(lookup_time(depth, args.lookups) for _ in range(args.runs))
+        check = min(check_time(ast) for _ in range(args.runs))
+        print("{0:6d} {1:12.1f} {2:14.2f}".format(depth, lookup * 1e9, check * 1e3))
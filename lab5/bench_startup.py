@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+import subprocess
+
+# Measures the time it takes a fresh interpreter to import parser.py:
+#   cold - parser.tab removed before each run, LALR tables are generated
+#   warm - parser.tab present, tables are loaded from it
+#   debug - MPARSER_DEBUG set, tables are generated and parser.out written
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TABFILE = os.path.join(HERE, 'parser.tab')
+
+
+def import_time(env, remove_tables):
+    if remove_tables and os.path.exists(TABFILE):
+        os.remove(TABFILE)
+    script = "import time; t = time.perf_counter(); import parser; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', script], cwd=HERE, env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return float(out.stdout)
+
+
+def measure(name, runs, env, remove_tables):
+    times = sorted(import_time(env, remove_tables) for _ in range(runs))
+    print("{0:6s} median {1:7.2f} ms   min {2:7.2f} ms".format(name, times[len(times) // 2] * 1000, times[0] * 1000))
+
+
+if __name__ == '__main__':
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    env = dict(os.environ)
+    env.pop('MPARSER_DEBUG', None)
+
+    measure("cold", runs, env, True)
+    measure("warm", runs, env, False)
+    measure("debug", runs, dict(env, MPARSER_DEBUG='1'), False)
@@ -0,0 +1,93 @@
+import io
+import sys
+import time
+import argparse
+import contextlib
+import AST
+from TypeChecker import TypeChecker
+
+# Measures type checking throughput, in AST nodes per second, on synthetic
+# programs of 10^4 .. 10^6 statements. The programs are built as ASTs rather
+# than parsed, parsing a million statements would take minutes; only the
+# type checking is timed, recursively and with TypeChecker(iterative=True).
+
+
+def num(value):
+    return AST.IntNum(value) if type(value) is int else AST.FloatNum(value)
+
+
+def var(name):
+    return AST.Variable(name)
+
+
+def binary(op, left, right):
+    return AST.BinExpr(op, left, right)
+
+
+def assign(name, value, op='='):
+    return AST.Assign(op, var(name), value)
+
+
+def block(k):
+    # the statements of one block of the program, 10 of them at the top level:
+    #   a = k; b = a * 2 + 1; x = 0.5 * b - a / 3; M = eye(3); N = M * M' + ones(3, 3); c = 0;
+    #   if (a > b) { c = a; } else { c = b + 1; }  s = 0;  for i = 1:10 { s += i * c; }  print s, x;
+    return [
+        assign('a', num(k)),
+        assign('b', binary('+', binary('*', var('a'), num(2)), num(1))),
+        assign('x', binary('-', binary('*', num(0.5), var('b')), binary('/', var('a'), num(3)))),
+        assign('M', AST.Function('eye', [num(3)])),
+        assign('N', binary('+', binary('*', var('M'), AST.Transpose(var('M'))), AST.Function('ones', [num(3), num(3)]))),
+        assign('c', num(0)),
+        AST.If(AST.RelExpr('>', var('a'), var('b')), AST.Compound([assign('c', var('a'))]),
+               AST.Compound([assign('c', binary('+', var('b'), num(1)))])),
+        assign('s', num(0)),
+        AST.For('i', AST.Range(num(1), num(10)), AST.Compound([assign('s', binary('*', var('i'), var('c')), '+=')])),
+        AST.Print([var('s'), var('x')]),
+    ]
+
+
+def program(statements):
+    body = []
+    k = 0
+    while len(body) < statements:
+        body.extend(block(k))
+        k += 1
+    return AST.Compound(body[:statements])
+
+
+def count_nodes(node):
+    if isinstance(node, list):
+        return sum(count_nodes(elem) for elem in node)
+    if isinstance(node, AST.Node):
+        return 1 + sum(count_nodes(child) for child in vars(node).values() if isinstance(child, (AST.Node, list)))
+    return 0
+
+
+def check(ast, iterative):
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        TypeChecker(iterative=iterative).visit(ast)
+    elapsed = time.perf_counter() - start
+    if output.getvalue():
+        sys.exit("the synthetic program has type errors:\n" + output.getvalue()[:500])
+    return elapsed
+
+
+if __name__ == '__main__':
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--max-exponent', type=int, default=6, help="largest program has 10 ** max_exponent statements")
+    argparser.add_argument('--runs', type=int, default=3, help="the best of this many runs is reported")
+    args = argparser.parse_args()
+
+    print("{0:>10s} {1:>10s} {2:>24s} {3:>24s}".format("statements", "nodes", "recursive [s] nodes/s", "iterative [s] nodes/s"))
+    for exponent in range(4, args.max_exponent + 1):
+        ast = program(10 ** exponent)
+        nodes = count_nodes(ast)
+        line = "{0:10d} {1:10d}".format(10 ** exponent, nodes)
+        for iterative in (False, True):
+            elapsed = min(check(ast, iterative) for _ in range(args.runs))
+            line += " {0:11.3f} {1:12.0f}".format(elapsed, nodes / elapsed)
+        print(line)
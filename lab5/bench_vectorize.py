@@ -0,0 +1,66 @@
+import io
+import time
+import argparse
+import contextlib
+from main import front_end
+from Resolver import Resolver
+from Interpreter import Interpreter
+from ClosureCompiler import ClosureCompiler
+from Bytecode import BytecodeCompiler, VirtualMachine
+from LoopVectorizer import LoopVectorizer
+
+# Compares per-element execution of element-wise For loops with their
+# vectorized form, for n = 10^3 .. 10^6 elements. Only running the program
+# is timed, parsing and compiling are not.
+
+SOURCE = """
+A = ones({n});
+B = zeros({n});
+D = zeros({n}, 2);
+for i = 0:{last} {{
+    B[i] = i * 0.5;
+}}
+for i = 0:{last} {{
+    D[i, 0] = A[i] * 3 + B[i] / 2 - i;
+    D[i, 1] = D[i, 0] * B[i];
+}}
+"""
+
+
+def run(n, engine, vectorize):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = front_end(SOURCE.format(n=n, last=n - 1))
+    if vectorize:
+        ast = ast.accept(LoopVectorizer())
+
+    if engine == 'vm':
+        vm = VirtualMachine(BytecodeCompiler().compile(ast))
+        start = time.perf_counter()
+        vm.run()
+        return time.perf_counter() - start
+
+    frame = Resolver().resolve(ast)
+    if engine == 'closure':
+        program = ast.accept(ClosureCompiler(frame))
+        start = time.perf_counter()
+        program()
+    else:
+        interpreter = Interpreter(frame)
+        start = time.perf_counter()
+        ast.accept(interpreter)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--engine', choices=['interpreter', 'closure', 'vm'], default='closure')
+    argparser.add_argument('--max-exponent', type=int, default=6, help="largest n is 10 ** max_exponent")
+    args = argparser.parse_args()
+
+    print("{0:>9s} {1:>12s} {2:>12s} {3:>9s}".format("n", "scalar [s]", "vector [s]", "speedup"))
+    for exponent in range(3, args.max_exponent + 1):
+        n = 10 ** exponent
+        scalar = run(n, args.engine, False)
+        vector = run(n, args.engine, True)
+        print("{0:9d} {1:12.4f} {2:12.4f} {3:8.0f}x".format(n, scalar, vector, scalar / vector))
@@ -1,34 +1,153 @@
+import os
+import io
 import sys
+import argparse
+import contextlib
 from scanner import Scanner
 from parser import Mparser
 from TreePrinter import TreePrinter
 from TypeChecker import TypeChecker
 from Interpreter import Interpreter
+from ClosureCompiler import ClosureCompiler
+from TracingJIT import TracingJIT
+from CodeGenerator import CodeGenerator, compile_program, run
+from NativeCompiler import run_native
+from Resolver import Resolver
+from ConstantFolder import ConstantFolder
+from DeadCodeEliminator import DeadCodeEliminator
+from AlgebraicSimplifier import AlgebraicSimplifier
+from MatrixChainOrderer import MatrixChainOrderer
+from CommonSubexpressionEliminator import CommonSubexpressionEliminator
+from LoopInvariantMover import LoopInvariantMover
+from InPlaceRewriter import InPlaceRewriter
+from LoopVectorizer import LoopVectorizer
+from ExpressionFuser import ExpressionFuser
+from Bytecode import BytecodeCompiler, VirtualMachine, Program, source_hash
+
+# later passes leave the product nodes of AlgebraicSimplifier and MatrixChainOrderer
+# as they are; the last two introduce nodes the passes before them do not know
+OPTIMIZATIONS = [ConstantFolder, DeadCodeEliminator, AlgebraicSimplifier, MatrixChainOrderer,
+                 CommonSubexpressionEliminator, LoopInvariantMover, InPlaceRewriter, LoopVectorizer, ExpressionFuser]
+
+
+def front_end(text, types=None):   # <types>, if given, receives the type of every expression node
+    lexer = Scanner()
+    parser = Mparser()
+
+    ast = parser.parse(lexer.tokenize(text))
+
+    # Below code shows how to use visitor; checked iteratively, however deep the program nests
+    typeChecker = TypeChecker(types, iterative=True)
+    typeChecker.visit(ast)   # or alternatively ast.accept(typeChecker)
+    if typeChecker.errors and types is not None:
+        types.clear()       # expressions with errors are left out, the types of the others may be wrong
+    return ast
+
+
+def optimize(ast, stats=False, fast_math=False):
+    for optimization in OPTIMIZATIONS:
+        if optimization is AlgebraicSimplifier:
+            optimizer = AlgebraicSimplifier(fast_math)
+        else:
+            optimizer = optimization()
+        ast = ast.accept(optimizer)
+        if stats:
+            print(optimizer.report(), file=sys.stderr)
+    return ast
+
+
+def load_program(filename, text, use_cache, optimized=False, stats=False, fast_math=False):
+    # compiled programs are kept next to the source, keyed by a hash of its text
+    key = source_hash(text + ("\0optimized" if optimized else "") + ("\0fast-math" if optimized and fast_math else ""))
+    cache = os.path.splitext(filename)[0] + '.mbc'
+    program = Program.load(cache, key) if use_cache else None
+    if program is not None:
+        print(program.diagnostics, end='')
+        return program
+
+    diagnostics = io.StringIO()
+    with contextlib.redirect_stdout(diagnostics):
+        ast = front_end(text)
+    print(diagnostics.getvalue(), end='')
+    if optimized:
+        ast = optimize(ast, stats, fast_math)
+
+    program = BytecodeCompiler().compile(ast, diagnostics.getvalue(), key)
+    if use_cache:
+        try:
+            program.save(cache)
+        except IOError:
+            pass
+    return program
 
 
 if __name__ == '__main__':
 
+    # the parser's actions, the passes and the engines recurse as deep as the program nests
+    sys.setrecursionlimit(10000)
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('filename', nargs='?', default="example.txt")
+    argparser.add_argument('--engine', choices=['interpreter', 'closure', 'vm', 'python', 'c'], default='interpreter',
+                           help="execution engine: AST walking interpreter, pre-compiled closures, bytecode VM, "
+                                "generated Python code or, for programs using numbers only, compiled C (which prints "
+                                "only when it exits and reruns in the interpreter on values C cannot compute)")
+    argparser.add_argument('--no-cache', action='store_true',
+                           help="do not read or write compiled bytecode or binaries (vm and c engines only)")
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help="run the optimization passes before execution")
+    argparser.add_argument('--fast-math', action='store_true',
+                           help="with -O, also simplify products assuming matrices hold no inf, nan or -0, "
+                                "which may change the printed values")
+    argparser.add_argument('--jit', action='store_true',
+                           help="compile traces of hot loops to Python code (interpreter engine only)")
+    argparser.add_argument('--stats', action='store_true',
+                           help="report what the optimization passes, the jit and the interpreter's dispatch did on stderr")
+    argparser.add_argument('--emit', metavar='FILE',
+                           help="write the Python module the program is translated to (python engine only)")
+    args = argparser.parse_args()
+    if args.jit and args.engine != 'interpreter':
+        argparser.error("--jit only applies to the interpreter engine")
+
     try:
-        filename = sys.argv[1] if len(sys.argv) > 1 else "example.txt"
+        filename = args.filename
         file = open(filename, "r")
     except IOError:
         print("Cannot open {0} file".format(filename))
         sys.exit(0)
 
     text = file.read()
-    
-    lexer = Scanner()
-    parser = Mparser()
 
-    ast = parser.parse(lexer.tokenize(text))
-
-    # Below code shows how to use visitor
-    typeChecker = TypeChecker()   
-    typeChecker.visit(ast)   # or alternatively ast.accept(typeChecker)
+    if args.engine == 'vm':
+        program = load_program(filename, text, not args.no_cache, args.optimize, args.stats, args.fast_math)
+        VirtualMachine(program).run()
+    else:
+        types = {} if args.engine in ('interpreter', 'python', 'c') else None
+        ast = front_end(text, types)
+        if args.optimize:
+            ast = optimize(ast, args.stats, args.fast_math)
+        code = None
+        if args.engine == 'python':
+            source = CodeGenerator(types).generate(ast)
+            if args.emit:
+                with open(args.emit, 'w') as module:
+                    module.write(source)
+            code = compile_program(source, filename)
+        frame = Resolver().resolve(ast)
+        if code is not None:
+            run(code)
+        elif args.engine == 'c' and run_native(ast, not args.no_cache):
+            pass
+        elif args.engine == 'closure':
+            program = ast.accept(ClosureCompiler(frame))
+            program()
+        else:   # also runs the programs Python or C cannot compile
+            jit = TracingJIT() if args.jit else None
+            dispatcher = Interpreter.visit.dispatcher
+            dispatcher.count(args.stats)
+            ast.accept(Interpreter(frame, types, jit))
+            if args.stats:
+                print(dispatcher.report("interpreter"), file=sys.stderr)
+            if jit is not None and args.stats:
+                print(jit.report(), file=sys.stderr)
 
-    ast.accept(Interpreter())
-    # in future
-    # ast.accept(OptimizationPass1())
-    # ast.accept(OptimizationPass2())
-    # ast.accept(CodeGenerator())
-    
\ No newline at end of file
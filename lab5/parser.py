@@ -1,14 +1,18 @@
-from sly import Parser
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # for tablecache
+from tablecache import CachedParser
 from scanner import Scanner
 import AST
 
 
-class Mparser(Parser):
+class Mparser(CachedParser):
 
     tokens = Scanner.tokens
 
     start = 'program'
     debugfile = 'parser.out'
+    tabfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser.tab')
 
     precedence = (
         ('nonassoc', 'IFX'),
@@ -170,13 +174,13 @@ class Mparser(Parser):
     def cond(self, p):
         return AST.RelExpr(p[1], p.expr0, p.expr1, lineno=p.lineno)
 
-    @_('mat_func "(" INTNUM ")"')
+    @_('mat_func "(" expr ")"')
     def mat_func_call(self, p):
-        return AST.Function(p.mat_func, [AST.IntNum(int(p.INTNUM), lineno=p.lineno)], lineno=p.lineno)
+        return AST.Function(p.mat_func, [p.expr], lineno=p.lineno)
 
-    @_('mat_func "(" INTNUM "," INTNUM ")"')
+    @_('mat_func "(" expr "," expr ")"')
     def mat_func_call(self, p):
-        return AST.Function(p.mat_func, [AST.IntNum(int(p.INTNUM0), lineno=p.lineno), AST.IntNum(int(p.INTNUM1), lineno=p.lineno)], lineno=p.lineno)
+        return AST.Function(p.mat_func, [p.expr0, p.expr1], lineno=p.lineno)
 
     @_('EYE', 'ONES', 'ZEROS')
     def mat_func(self, p):
@@ -214,13 +218,13 @@ class Mparser(Parser):
     def matrix_ref(self, p):
         return p[0]
 
-    @_('ID "[" INTNUM "]"')
+    @_('ID "[" expr "]"')
     def ref_vector(self, p):
-        return AST.Ref(p.ID, [AST.IntNum(int(p.INTNUM), lineno=p.lineno)], lineno=p.lineno)
+        return AST.Ref(p.ID, [p.expr], lineno=p.lineno)
 
-    @_('ID "[" INTNUM "," INTNUM "]"')
+    @_('ID "[" expr "," expr "]"')
     def ref_matrix(self, p):
-        return AST.Ref(p.ID, [AST.IntNum(int(p.INTNUM0), lineno=p.lineno), AST.IntNum(int(p.INTNUM1), lineno=p.lineno)], lineno=p.lineno)
+        return AST.Ref(p.ID, [p.expr0, p.expr1], lineno=p.lineno)
 
     @_('ID')
     def id_ref(self, p):
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the lab5 modules import each other by their plain names, as main.py does
+LAB5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LAB5 not in sys.path:
+    sys.path.insert(0, LAB5)
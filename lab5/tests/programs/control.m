@@ -0,0 +1,28 @@
+s = 0;
+for i = 1:20 {
+    if (i == 3) continue;
+    if (i > 15) break;
+    j = 0;
+    while (j < i) {
+        j += 1;
+        if (j == 5) continue;
+        if (j > 7) break;
+        s += j;
+    }
+}
+print s, i, j;
+k = 10;
+while (k > 0) k -= 3;
+print k;
+x = 1;
+x /= 4;
+print x;
+x *= 8;
+print x;
+y = -x;
+print y, -3, 2 - -3;
+z = 2 * (3 + 4) - 10 / 4;
+print z;
+print "done", 1, 2.5;
+if (1 < 2) print "yes"; else print "no";
+if (2 < 1) print "yes"; else print "no";
@@ -0,0 +1,33 @@
+A = ones(3, 3);
+B = A;
+B[0, 0] = 5;
+print A;
+print B;
+C = A';
+C[1, 0] = 7;
+print A;
+print C;
+V = [[1, 2, 3], [4, 5, 6]];
+W = V;
+W[1, 2] = 9;
+print V;
+print W;
+D = zeros(2, 2);
+E = D;
+for i = 0:1 {
+    D[i, 0] = i + 1;
+}
+print D;
+print E;
+F = eye(2);
+G = F;
+F += 1;
+print F;
+print G;
+H = G;
+G = G .+ ones(2, 2);
+print G;
+print H;
+K = H;
+H += H;
+print H, K;
@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import subprocess
+import tempfile
+import contextlib
+from conftest import LAB5
+from main import front_end
+from Resolver import Resolver
+from Interpreter import Interpreter
+
+# Helpers shared by the tests: running main.py on a program as a user would,
+# and running the front end, some passes and the interpreter in this process.
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+
+
+def execute(source, *args):     # main.py run on program text <source> with <args>, its CompletedProcess
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'program.m')
+        with open(filename, 'w') as file:
+            file.write(source)
+        return subprocess.run([sys.executable, os.path.join(LAB5, 'main.py'), filename] + list(args),
+                              cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=300)
+
+
+def run_main(source, *args):    # stdout of main.py run on <source>, which has to succeed
+    result = execute(source, *args)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def run_failing(source, *args):     # stdout and the last line of stderr of main.py failing on <source>
+    result = execute(source, *args)
+    assert result.returncode != 0, result.stdout
+    return result.stdout, result.stderr.strip().splitlines()[-1]
+
+
+def check(source):              # AST of <source> after type checking, with the types recorded
+    types = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = front_end(source, types)
+    return ast, types
+
+
+def optimized(source, *passes):     # AST of <source> after <passes>, and the pass instances run
+    ast, _ = check(source)
+    instances = []
+    for optimization in passes:
+        instance = optimization()
+        ast = ast.accept(instance)
+        instances.append(instance)
+    return ast, instances
+
+
+def interpret(ast, types=None):     # what the interpreter prints running <ast>
+    output = io.StringIO()
+    frame = Resolver().resolve(ast)
+    with contextlib.redirect_stdout(output):
+        ast.accept(Interpreter(frame, types))
+    return output.getvalue()
@@ -0,0 +1,13 @@
+import pytest
+from support import run_main
+
+
+@pytest.mark.parametrize('source', [
+    "x = 0.0; y = 1.0 * -0.0; print x, y;",
+    "y = 1.0 * -0.0; x = 0.0; print x, y;",
+])
+def test_constants_keep_the_sign_of_zero(source):
+    expected = run_main(source)
+    assert "-0.0" in expected
+    for optimize in ([], ['-O']):
+        assert run_main(source, '--engine', 'vm', '--no-cache', *optimize) == expected
@@ -0,0 +1,36 @@
+import pytest
+from support import execute, run_main, run_failing
+
+# Errors in the Python the python engine generates point at the lines of the
+# program, and end like the interpreter's.
+
+
+@pytest.mark.parametrize('source, line', [
+    ("a = 1;\nb = 0;\nprint a;\nc = a / b;\nprint c;\n", "c = a / b;"),
+    ("A = ones(2, 3);\nB = ones(2, 2);\nfor i = 1:3 {\n    if (i == 2) {\n        C = A * B;\n"
+     "        print C;\n    }\n    print i;\n}\n", "C = A * B;"),
+    ("x = 3;\nwhile (x > 0) {\n    x -= 1;\n}\ny = [[1, 2], [3, 4]];\nprint y[x, 5];\n", "print y[x, 5];"),
+])
+def test_errors_point_at_program_lines(source, line):
+    expected = execute(source)
+    result = execute(source, '--engine', 'python')
+    assert result.returncode != 0 and result.stdout == expected.stdout
+    assert result.stderr.splitlines()[-1] == expected.stderr.splitlines()[-1]
+    lineno = [text.strip() for text in source.splitlines()].index(line) + 1
+    assert 'program.m", line {0}, in program\n    {1}\n'.format(lineno, line) in result.stderr
+
+
+@pytest.mark.parametrize('source, optimize', [
+    # the division fails before the element is read
+    ("A = [[1, 2], [3, 4]]; i = 5; z = 0; A[i, i] += 1 / z;", []),
+    # a transposed number, folded into a literal with -O
+    ("x = -3; y = x'; print y;", ['-O']),
+])
+def test_generated_code_fails_like_the_interpreter(source, optimize):
+    assert run_failing(source, '--engine', 'python', *optimize) == run_failing(source, *optimize)
+
+
+def test_programs_with_type_errors_use_the_generic_operators():
+    # TypeChecker leaves the failed assignment out, so x would be a float and '*' element-wise
+    source = "x = 2.0; if (x > 0) { x = [[1.0, 2.0], [3.0, 4.0]] .* 2; } y = x * x; print y;"
+    assert run_main(source, '--engine', 'python') == run_main(source)
@@ -0,0 +1,48 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized, interpret
+from ConstantFolder import ConstantFolder
+from Optimizer import literal_value
+
+
+def folded(source):
+    ast, (folder,) = optimized(source, ConstantFolder)
+    return ast, folder
+
+
+def test_literal_arithmetic_and_variables_are_folded():
+    ast, folder = folded("a = 2; b = a * 3 + 1; c = -b / 4; print c;")
+    assert [literal_value(stmt.right) for stmt in ast.statements[:3]] == [2, 7, -1.75]
+    assert folder.propagated == 3      # a in b, b in c, c in the print
+
+
+def test_matrix_functions_of_literal_sizes_are_built_once():
+    ast, _ = folded("n = 2; A = ones(n, 3); print A;")
+    assert isinstance(ast.statements[1].right, AST.Constant)
+
+
+@pytest.mark.parametrize('source', [
+    # failing expressions stay, and fail when they run
+    "x = 1 / 0; print x;",
+    "x = 2; x /= 0; print x;",
+    "A = zeros(-1); print A;",
+])
+def test_failing_expressions_are_not_folded(source):
+    ast, _ = folded(source)
+    stmt = ast.statements[-2]
+    assert stmt.op != '=' or not isinstance(stmt.right, (AST.IntNum, AST.FloatNum, AST.Constant))
+    assert run_failing(source, '-O') == run_failing(source)
+
+
+@pytest.mark.parametrize('source', [
+    "x = -0.0; y = -x; z = 0.0 * -1; print x, y, z;",
+    "x = 0.1 + 0.2; y = 7 / 2; z = 6 / 2; print x, y, z;",
+    "x = 1e308 * 10; y = -x; print x, y, x + y;",
+    "x = 1; for i = 1:3 { print x; x = x + 1; } print x;",
+    "x = 1; n = 0; while (n < 3) { print x; x *= 2; n += 1; } print x;",
+    "x = 5; y = 0; if (x > 3) { y = 1; } else { y = 2; } print y;",
+    "c = 1; x = 1; y = 2; if (c == c) { x = 3; } else { y = 4; } print x, y;",
+])
+def test_folded_programs_print_as_before(source):
+    ast, _ = folded(source)
+    assert interpret(ast) == run_main(source)
@@ -0,0 +1,63 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized, interpret
+from CommonSubexpressionEliminator import CommonSubexpressionEliminator
+
+
+def eliminated(source):
+    ast, (eliminator,) = optimized(source, CommonSubexpressionEliminator)
+    return ast, eliminator
+
+
+def test_repeated_expressions_are_computed_once():
+    source = "A = [[1.0, 2.0], [3.0, 4.0]]; B = A' * A; x = (A + B) .* (A + B); y = A + B; print x, y;"
+    ast, eliminator = eliminated(source)
+    assert (eliminator.temps, eliminator.eliminated) == (1, 2)
+    assert ast.statements[2].left.name.startswith('$cse')
+    assert interpret(ast) == run_main(source)
+
+
+def test_expressions_are_not_reused_past_a_change_of_an_operand():
+    source = """
+A = [[1.0, 2.0], [3.0, 4.0]];
+x = A + A;
+A[0, 0] = 5;
+y = A + A;
+A += 1;
+z = A + A;
+i = 1;
+s = i * 2;
+i = 3;
+t = i * 2;
+print x, y, z, s, t;
+"""
+    _, eliminator = eliminated(source)
+    assert eliminator.temps == 0
+    assert run_main(source, '-O') == run_main(source)
+
+
+def test_a_variable_given_a_temporary_owns_its_matrix():
+    source = "A = ones(2, 2); x = A .* 2; y = A .* 2; y[0, 0] = 0; print x, y;"
+    _, eliminator = eliminated(source)
+    assert eliminator.temps == 1
+    for args in ([], ['--engine', 'closure'], ['--engine', 'python'], ['--engine', 'vm', '--no-cache']):
+        assert run_main(source, '-O', *args) == run_main(source)
+
+
+@pytest.mark.parametrize('source', [
+    # the division fails first, computing the product ahead of it would fail differently
+    "d = 0; A = ones(2, 3); B = ones(2, 2); x = 1 / d + A * B; y = A * B; print x, y;",
+    "d = 0; A = ones(2, 3); B = ones(2, 2); print 1 / d, A * B, A * B;",
+])
+def test_repeated_expressions_are_not_moved_ahead_of_failing_ones(source):
+    _, eliminator = eliminated(source)
+    assert eliminator.temps == 0
+    assert run_failing(source, '-O') == run_failing(source)
+
+
+def test_loop_bodies_are_blocks_of_their_own():
+    source = "i = 0; s = 0; while (i < 3) { s += (i * 2 + 1) * (i * 2 + 1); i += 1; } print s;"
+    ast, eliminator = eliminated(source)
+    assert eliminator.temps == 1
+    assert isinstance(ast.statements[2].body.statements[0], AST.Assign)
+    assert run_main(source, '-O') == run_main(source)
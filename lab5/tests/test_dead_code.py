@@ -0,0 +1,82 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized
+from ConstantFolder import ConstantFolder
+from DeadCodeEliminator import DeadCodeEliminator
+
+
+def eliminated(source):
+    ast, (eliminator,) = optimized(source, DeadCodeEliminator)
+    return ast, eliminator
+
+
+def test_dead_assignments_and_unreachable_code_are_removed():
+    source = """
+x = 1;
+y = x + 2;
+z = y * 3;
+A = ones(2, 2);
+B = A * A;
+for i = 1:3 {
+    break;
+    print i;
+}
+if (1 < 0) {
+    print "never";
+}
+print x;
+"""
+    ast, eliminator = eliminated(source)
+    assert eliminator.assignments == 4 and eliminator.unreachable == 1 and eliminator.branches == 1
+    assert [type(stmt).__name__ for stmt in ast.statements] == ['Assign', 'For', 'Print']
+    assert run_main(source, '-O') == run_main(source)
+
+
+def test_loops_iterate_liveness_to_a_fixpoint():
+    source = "s = 0; t = 0; for i = 1:5 { t = s; s += i; } print t;"
+    ast, eliminator = eliminated(source)
+    assert eliminator.assignments == 0
+    assert run_main(source, '-O') == run_main(source)
+
+
+@pytest.mark.parametrize('source', [
+    "x = 1.0 / 0.0 * 0; print 1;",
+    "A = ones(2, 3); B = ones(2, 2); C = A * B; print 1;",
+    "A = ones(2, 2); x = A[5, 5]; print 1;",
+    "A = ones(2, 2); A[5, 5] = 1; print 1;",
+    "x = 2; d = 0; x /= d; print 1;",
+    "A = ones(2, 3); B = ones(2, 2); for i = 1:3 { if (i == 2) { C = A * B; } print i; }",
+])
+def test_dead_assignments_that_fail_are_kept(source):
+    _, eliminator = eliminated(source)
+    assert eliminator.assignments == 0
+    assert run_failing(source, '-O') == run_failing(source)
+
+
+def test_removing_an_assignment_makes_its_inputs_dead():
+    ast, (_, eliminator) = optimized("a = 2; b = a * 3; c = b + 1; print a;", ConstantFolder, DeadCodeEliminator)
+    assert eliminator.assignments == 3
+    assert len(ast.statements) == 1 and isinstance(ast.statements[0], AST.Print)
+
+
+@pytest.mark.parametrize('source', [
+    # a division by zero in the condition
+    "a = 1; b = 0; if (a / b > 0) { x = 1; } print 1;",
+    # the truth value of a matrix
+    "A = ones(3); if (A > 0) { x = 1; } print 1;",
+    # a range end that is not an integer
+    "a = 1; b = 2; for i = 1:a/b { x = 1; } print 1;",
+])
+def test_emptied_statements_that_fail_are_kept(source):
+    _, eliminator = eliminated(source)
+    assert eliminator.assignments == 1 and eliminator.branches == 0 and eliminator.loops == 0
+    expected = run_failing(source)
+    for args in [[], ['--jit'], ['--engine', 'closure'], ['--engine', 'vm', '--no-cache'], ['--engine', 'python']]:
+        assert run_failing(source, '-O', *args) == expected
+
+
+def test_emptied_statements_that_cannot_fail_are_removed():
+    source = "a = 1; if (a > 0) { x = 1; } for i = 1:10 { y = 1; } print a;"
+    ast, eliminator = eliminated(source)
+    assert eliminator.branches == 1 and eliminator.loops == 1
+    assert [type(stmt).__name__ for stmt in ast.statements] == ['Assign', 'Print']
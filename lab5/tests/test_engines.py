@@ -0,0 +1,57 @@
+import os
+import sys
+import glob
+import shutil
+import functools
+import subprocess
+import pytest
+from conftest import LAB5
+from support import PROGRAMS, run_main
+
+# Every engine, with and without the optimization passes and the jit, has
+# to print what the plain interpreter prints for the bundled example programs.
+
+EXAMPLES = sorted(glob.glob(os.path.join(LAB5, '*.m')) + glob.glob(os.path.join(PROGRAMS, '*.m')))
+
+CONFIGURATIONS = [
+    ['-O'],
+    ['--jit'],
+    ['-O', '--jit'],
+    ['--engine', 'closure'],
+    ['--engine', 'closure', '-O'],
+    ['--engine', 'vm', '--no-cache'],
+    ['--engine', 'vm', '--no-cache', '-O'],
+    ['--engine', 'python'],
+    ['--engine', 'python', '-O'],
+    ['--engine', 'c', '--no-cache'],
+    ['--engine', 'c', '--no-cache', '-O'],
+]
+
+
+def has_compiler():
+    return shutil.which(os.environ.get('CC', 'cc')) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def reference(path):
+    with open(path) as file:
+        return run_main(file.read())
+
+
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=' '.join)
+@pytest.mark.parametrize('path', EXAMPLES, ids=os.path.basename)
+def test_engine_matches_interpreter(path, args):
+    if 'c' in args and not has_compiler():
+        pytest.skip("no C compiler")
+    with open(path) as file:
+        assert run_main(file.read(), *args) == reference(path)
+
+
+@pytest.mark.parametrize('module', ['Operations', 'Bytecode', 'ClosureCompiler', 'CodeGenerator', 'TracingJIT'])
+def test_engines_import_without_side_effects(module):
+    # only main.py raises the recursion limit, and the tree walker is not loaded by the others
+    script = "import sys; limit = sys.getrecursionlimit(); import {0}; " \
+             "print(sys.getrecursionlimit() == limit, 'Interpreter' in sys.modules)".format(module)
+    result = subprocess.run([sys.executable, '-c', script], cwd=LAB5, stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    assert result.stdout.split() == ['True', 'False']
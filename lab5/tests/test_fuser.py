@@ -0,0 +1,58 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized, interpret
+from ExpressionFuser import ExpressionFuser
+
+ENGINES = [[], ['--jit'], ['--engine', 'closure'], ['--engine', 'vm', '--no-cache'], ['--engine', 'python']]
+
+
+def fused(source):
+    ast, (fuser,) = optimized(source, ExpressionFuser)
+    return ast, fuser
+
+
+def test_element_wise_chains_are_fused():
+    source = """
+A = [[1.0, 2.0], [3.0, 4.0]];
+B = A';
+x = 3;
+C = A .+ B .* A / 2 * x;
+D = -(A - B) * 2;
+E = (A - B) * (A + B) + A;
+print C, D, E;
+"""
+    ast, fuser = fused(source)
+    assert (fuser.chains, fuser.operators) == (3, 11)
+    assert all(isinstance(stmt.right, AST.Fused) for stmt in ast.statements[3:6])
+    assert interpret(ast) == run_main(source)
+
+
+def test_scalar_chains_stay():
+    source = "x = 2; y = 3; z = x * y + x / y - 1; print z;"
+    _, fuser = fused(source)
+    assert fuser.chains == 0
+
+
+@pytest.mark.parametrize('source', [
+    # a division of integer matrices gives floats, not integers
+    "A = [[1, 2], [3, 4]]; B = [[5, 6], [7, 8]]; C = (A .+ B) ./ A .* 2; D = -(A + B) / 2 - A; print C, D;",
+    # integer matrices that stay integers
+    "A = [[1, 2], [3, 4]]; C = (A .+ A) .* A * 2; print C;",
+])
+def test_fused_chains_keep_the_type_of_the_result(source):
+    _, fuser = fused(source)
+    assert fuser.chains >= 1
+    output = run_main(source)
+    for args in ENGINES:
+        assert run_main(source, '-O', *args) == output
+
+
+def test_operands_that_can_fail_are_not_evaluated_early():
+    # the sum of A and B fails before C[5, 5] is evaluated
+    source = "A = ones(2, 2); B = ones(3, 3); C = ones(2, 2); x = (A + B) .* C[5, 5] - A; print x;"
+    _, fuser = fused(source)
+    assert fuser.chains == 0
+    expected = run_failing(source)
+    assert expected[1].startswith("ValueError")
+    for args in ENGINES:
+        assert run_failing(source, '-O', *args) == expected
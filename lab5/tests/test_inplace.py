@@ -0,0 +1,53 @@
+import pytest
+from support import run_main, run_failing, optimized, interpret
+from InPlaceRewriter import InPlaceRewriter
+
+ENGINES = [[], ['--jit'], ['--engine', 'closure'], ['--engine', 'vm', '--no-cache'], ['--engine', 'python']]
+
+
+def rewritten(source):
+    ast, (rewriter,) = optimized(source, InPlaceRewriter)
+    return ast, rewriter
+
+
+def test_updates_become_compound_assignments_in_place():
+    source = """
+A = [[1.0, 2.0], [3.0, 4.0]];
+B = A';
+x = 2;
+A = A .+ B;
+A = A * x;
+A[0, 1] = A[0, 1] + x;
+x = x / 4;
+B -= A;
+print A, B, x;
+"""
+    ast, rewriter = rewritten(source)
+    assert (rewriter.rewritten, rewriter.inplace) == (4, 3)
+    assert [stmt.op for stmt in ast.statements[3:7]] == ['.+=', '*=', '+=', '/=']
+    assert interpret(ast) == run_main(source)
+
+
+@pytest.mark.parametrize('source', [
+    # B shares the matrix of A, and D is a transposed view of C
+    "A = [[1.0, 2.0], [3.0, 4.0]]; B = A; A = A .+ B; C = A; D = C'; C = C .* A; print A, B, C, D;",
+    # the quotient of integer matrices is a new float matrix
+    "E = [[1, 2], [3, 4]]; F = E; E = E ./ F; G = [[1, 2], [3, 4]]; G = G * 2.5; print E, F, G;",
+    # '*' between matrices is the matrix product, not an element-wise update
+    "H = [[1.0, 2.0], [3.0, 4.0]]; K = H; H = H * K; print H, K;",
+])
+def test_updates_in_place_leave_other_matrices_alone(source):
+    output = run_main(source)
+    for args in ENGINES:
+        assert run_main(source, '-O', *args) == output
+
+
+def test_elements_are_read_before_a_failing_operand():
+    # A[5] fails before C[9] is evaluated
+    source = "A = ones(3); C = ones(2); A[5] = A[5] + C[9]; print A;"
+    _, rewriter = rewritten(source)
+    assert rewriter.rewritten == 0
+    expected = run_failing(source)
+    assert expected[1] == "IndexError: index 5 is out of bounds for axis 0 with size 3"
+    for args in ENGINES:
+        assert run_failing(source, '-O', *args) == expected
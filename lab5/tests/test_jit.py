@@ -0,0 +1,57 @@
+import io
+import contextlib
+import pytest
+import AST
+from support import run_main, run_failing, check
+from Resolver import Resolver
+from Interpreter import Interpreter
+from TracingJIT import TracingJIT, TraceGenerator, Untraceable
+
+
+def jit_run(source):    # output of <source> run with the jit, and the jit
+    ast, types = check(source)
+    jit = TracingJIT()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        ast.accept(Interpreter(Resolver().resolve(ast), types, jit))
+    return output.getvalue(), jit
+
+
+def test_hot_loop_is_traced():
+    source = "s = 0; for i = 1:200 { if (i > 0) { s += i; } else { s -= 1; } } print s;"
+    output, jit = jit_run(source)
+    assert jit.recorded == 1 and jit.compiled > 100
+    assert output == run_main(source)
+
+
+def test_untraceable_while_condition_stays_in_the_tree_walker():
+    # -O turns A' * A into a SymmetricProduct, which a trace cannot hold
+    source = "A = ones(2, 1); x = 0; while (x < A' * A) { x += 0.01; A = A .+ zeros(2, 1); } print x;"
+    assert run_main(source, '-O', '--jit') == run_main(source)
+
+
+def test_untraceable_expression_abandons_the_trace():
+    loop = AST.While(AST.RelExpr('<', AST.Variable('x'), AST.Vector([])), AST.Compound([]))
+    loop.cond.left.slot = 0
+    with pytest.raises(Untraceable):
+        TraceGenerator(loop, [], {}).generate()
+
+
+@pytest.mark.parametrize('source', [
+    "for i = 0:2.5 { x = i; } print x;",
+    # would fail only after the loop is traced
+    "for i = 0:99.5 { x = i; } print x;",
+    # would never end
+    "n = 1e308 * 10; for i = 0:n { x = i; } print x;",
+])
+def test_range_bounds_that_are_not_integers_fail_before_the_loop(source):
+    expected = run_failing(source)
+    assert expected[1].startswith("TypeError")
+    assert run_failing(source, '--jit') == expected
+
+
+@pytest.mark.parametrize('engine', ['closure', 'vm', 'python', 'c'])
+def test_other_engines_reject_the_jit(engine):
+    output, error = run_failing("print 1;", '--jit', '--engine', engine)
+    assert output == ""
+    assert error.endswith("--jit only applies to the interpreter engine")
@@ -0,0 +1,60 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized, interpret
+from LoopInvariantMover import LoopInvariantMover
+
+
+def hoisted(source):
+    _, (mover,) = optimized(source, LoopInvariantMover)
+    return mover.hoisted
+
+
+def test_invariant_product_of_fitting_matrices_is_hoisted():
+    source = "A = ones(2, 3); B = ones(3, 2); s = 0; for i = 1:3 { C = A * B; s += C[0, 0] + i; } print s;"
+    assert hoisted(source) == 1
+    ast, _ = optimized(source, LoopInvariantMover)
+    assert interpret(ast) == run_main(source)
+
+
+@pytest.mark.parametrize('source', [
+    # the product cannot be computed, the loop never runs it
+    "n = 0; k = 2; A = ones(2, k); B = ones(3, 3); for i = 1:n { C = A * B; print C; } print \"done\";",
+    # a division by a variable that is zero
+    "n = 0; d = 0; for i = 1:n { x = 1 / d; print x; } print \"done\";",
+    # an index out of bounds
+    "n = 0; A = ones(2, 2); for i = 1:n { x = A[5, 5] + 1; print x; } print \"done\";",
+    # a function of a variable, maybe not a valid size
+    "n = 0; m = -1; for i = 1:n { Z = zeros(m); print Z; } print \"done\";",
+    # a while loop whose condition is false at once
+    "x = 0; A = ones(2, 2); B = ones(3, 3); while (x > 0) { C = A * B; x -= 1; } print \"done\";",
+])
+def test_expressions_that_can_fail_stay_in_zero_trip_loops(source):
+    assert hoisted(source) == 0
+    output = run_main(source)
+    assert output.endswith("done\n")
+    assert run_main(source, '-O') == output
+
+
+def test_hoisting_keeps_the_order_of_loops():
+    source = """
+A = [[1, 2], [3, 4]];
+s = 0;
+for i = 1:3 {
+    for j = 1:2 {
+        B = (A .+ ones(2, 2)) .* ones(2, 2);
+        s += B[0, 0] * j + i;
+    }
+}
+print s, B;
+"""
+    assert hoisted(source) >= 1
+    assert run_main(source, '-O') == run_main(source)
+
+
+def test_literals_with_type_errors_stay_in_the_loop():
+    # x is a vector, so the matrix cannot be built; its rows print first
+    source = "b = 1; x = ones(2); for i = 1:3 { print i; C = [[b, x, b], [b, b, b]]; print C; }"
+    ast, _ = optimized(source, LoopInvariantMover)
+    hoisted_rows = [stmt.right for stmt in ast.statements[2].statements[:-1]]
+    assert all(len(row.elements) == 3 and not isinstance(row.elements[0], AST.Vector) for row in hoisted_rows)
+    assert run_failing(source, '-O') == run_failing(source)
@@ -0,0 +1,48 @@
+import io
+import contextlib
+import pytest
+from support import check, run_main
+from Resolver import Resolver
+from Interpreter import Interpreter
+from ClosureCompiler import ClosureCompiler
+from TracingJIT import TracingJIT
+
+# A for loop binds its variable through Frame.store like an assignment, so
+# a matrix the variable held before is no longer counted as shared with it.
+
+SOURCE = """
+A = [[1, 2], [3, 4]];
+i = A;
+for i = 1:60 {
+    s = i;
+}
+print i;
+"""
+
+
+def interpreter(ast, frame, types):
+    return lambda: ast.accept(Interpreter(frame, types))
+
+
+def jit(ast, frame, types):
+    return lambda: ast.accept(Interpreter(frame, types, TracingJIT()))
+
+
+def closures(ast, frame, types):
+    return ast.accept(ClosureCompiler(frame))
+
+
+@pytest.mark.parametrize('engine', [interpreter, jit, closures], ids=lambda engine: engine.__name__)
+def test_loop_variable_releases_its_matrix(engine):
+    ast, types = check(SOURCE)
+    frame = Resolver().resolve(ast)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine(ast, frame, types)()
+    assert frame.get('i') == 60
+    assert not frame.matrices.shared(frame.get('A'))
+
+
+def test_vectorized_loop_variable_releases_its_matrix():
+    source = "A = ones(3); B = zeros(3); i = A; for i = 0:2 { B[i] = A[i] * 2; } A[0] = 7; print A, B, i;"
+    for args in ([], ['-O'], ['-O', '--engine', 'closure']):
+        assert run_main(source, *args) == run_main(source)
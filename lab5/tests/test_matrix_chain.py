@@ -0,0 +1,58 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized
+from MatrixChainOrderer import MatrixChainOrderer
+
+# MatrixChainOrderer only changes the order products are computed in, the
+# programs print the same with and without -O. The matrices hold small
+# integers, so every order computes exactly the same values.
+
+
+def ordered(source):
+    _, (orderer,) = optimized(source, MatrixChainOrderer)
+    return orderer
+
+
+def test_chain_of_known_shapes_is_reordered():
+    source = """
+A = [[1, 2, 3], [4, 5, 6]];
+B = [[1, 0, 2, 1], [0, 1, 1, 3], [2, 1, 0, 1]];
+v = [[1], [2], [3], [4]];
+x = A * B * v;
+y = 2 * A * B * v * 3;
+print x, y;
+"""
+    assert ordered(source).reordered == 2
+    assert run_main(source, '-O') == run_main(source)
+
+
+def test_chain_of_unknown_shapes_is_ordered_at_runtime():
+    source = """
+n = 2;
+A = ones(3, 3);
+for i = 1:3 {
+    n += 1;
+    B = ones(n, n);
+    C = B * B * B;
+    print C;
+}
+print A * A * A;
+"""
+    assert ordered(source).deferred >= 1
+    for engine in ('interpreter', 'closure', 'vm', 'python'):
+        assert run_main(source, '-O', '--engine', engine, '--no-cache') == run_main(source)
+
+
+@pytest.mark.parametrize('source', [
+    "A = ones(2, 3); B = ones(2, 2); C = ones(2, 2); print \"before\"; D = A * B * C; print D;",
+    "n = 3; A = ones(2, n); B = ones(2, 2); C = ones(2, 2); print \"before\"; D = A * B * C; print D;",
+])
+def test_mismatched_chains_fail_as_before(source):
+    output, error = run_failing(source)
+    assert run_failing(source, '-O') == (output, error)
+    assert error.startswith("ValueError")
+
+
+def test_products_of_two_matrices_are_left_alone():
+    ast, _ = optimized("A = ones(2, 2); B = A * A; print B;", MatrixChainOrderer)
+    assert not any(isinstance(getattr(stmt, 'right', None), AST.MatrixChain) for stmt in ast.statements)
@@ -0,0 +1,56 @@
+import pytest
+import numpy as np
+from support import run_main
+
+# '*' between two matrices or vectors is the matrix product (np.matmul), as
+# TypeChecker has always checked it: m x n times n x p gives m x p. '.*' is
+# the element-wise product, and '*' with a number scales every element.
+
+SOURCE = """
+A = [[1, 2], [3, 4]];
+B = [[0, 1], [1, 0]];
+v = ones(2);
+print A * B;
+print A * v;
+print v * v;
+print 2 * A, A * 3;
+print A .* B;
+D = A;
+D *= B;
+print D;
+F = A;
+G = A;
+for i = 1:100 {
+    F = A * B;
+    G = F;
+    G *= B;
+}
+print F, G;
+"""
+
+A = np.array([[1, 2], [3, 4]])
+B = np.array([[0, 1], [1, 0]])
+v = np.ones(2)
+EXPECTED = "\n".join([
+    str(A @ B),
+    str(A @ v),
+    str(v @ v),
+    "{0} {1}".format(2 * A, A * 3),
+    str(A * B),
+    str(A @ B),
+    "{0} {1}".format(A @ B, A @ B @ B),
+]) + "\n"
+
+CONFIGURATIONS = [
+    [],
+    ['--jit'],
+    ['--engine', 'closure'],
+    ['--engine', 'vm', '--no-cache'],
+    ['--engine', 'python'],
+]
+
+
+@pytest.mark.parametrize('optimize', [[], ['-O']], ids=['plain', 'O'])
+@pytest.mark.parametrize('args', CONFIGURATIONS, ids=lambda args: ' '.join(args) or 'interpreter')
+def test_star_is_the_matrix_product(args, optimize):
+    assert run_main(SOURCE, *(args + optimize)) == EXPECTED
@@ -0,0 +1,60 @@
+import os
+import io
+import stat
+import shutil
+import contextlib
+import pytest
+import NativeCompiler
+from support import check, run_main
+from NativeCompiler import run_native, hash_key, CGenerator
+
+# The c engine runs binaries from its cache only when the cache directory and
+# the binary belong to the user and no one else can write to them.
+
+pytestmark = pytest.mark.skipif(not shutil.which(NativeCompiler.CC[0]), reason="no C compiler")
+
+SOURCE = "s = 0; for i = 1:10 { s += i * i; } print s;"
+
+
+def native(source, use_cache=True):     # whether the c engine ran <source>, and what it printed
+    ast, _ = check(source)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        ran = run_native(ast, use_cache)
+    return ran, output.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'lab5-native')
+    monkeypatch.setattr(NativeCompiler, 'CACHE', directory)
+    return directory
+
+
+def test_cache_directory_is_private(cache):
+    assert native(SOURCE) == (True, "385\n")
+    assert stat.S_IMODE(os.stat(cache).st_mode) & 0o077 == 0
+    assert len(os.listdir(cache)) == 1
+
+
+def test_cache_writable_by_others_is_not_used(cache):
+    os.makedirs(cache)
+    os.chmod(cache, 0o777)
+    assert native(SOURCE) == (True, "385\n")
+    assert os.listdir(cache) == []
+
+
+def test_binary_writable_by_others_is_not_run(cache):
+    ast, _ = check(SOURCE)
+    os.makedirs(cache, mode=0o700)
+    planted = os.path.join(cache, hash_key(CGenerator().generate(ast)))
+    with open(planted, 'w') as file:
+        file.write("#!/bin/sh\necho planted\n")
+    os.chmod(planted, 0o777)
+    assert native(SOURCE) == (True, "385\n")
+
+
+def test_fallback_prints_the_output_once():
+    source = "print 1; x = 2; for i = 1:70 { x *= 2; } print x;"
+    assert native(source, use_cache=False) == (False, "")
+    assert run_main(source, '--engine', 'c', '--no-cache') == run_main(source)
@@ -0,0 +1,41 @@
+import pytest
+import AST
+from support import run_main, check
+from AlgebraicSimplifier import AlgebraicSimplifier
+
+
+def simplified(source, fast_math=False):
+    ast, _ = check(source)
+    simplifier = AlgebraicSimplifier(fast_math)
+    return ast.accept(simplifier), simplifier
+
+
+@pytest.mark.parametrize('source', [
+    # -1.5 * zeros is a matrix of -0.
+    "a = -2; B = ones(3, 3); B = B .* ((a + 0.5) * zeros(3, 3)); print B;",
+    # inf * 0 in the product with the identity is nan
+    "C = [[1e308, 1.0], [1.0, 1.0]]; C = C .* C; D = C * eye(2); print D;",
+    # 1e200 * 1e200 overflows before 1e-200 can scale it back
+    "x = 1e200; E = x * ones(2, 2) * x * 1e-200; print E;",
+    # a zero product of a matrix holding inf
+    "F = [[1e308, 1.0], [1.0, 1.0]] .* [[10.0, 1.0], [1.0, 1.0]]; G = F * zeros(2, 2); print G;",
+])
+def test_optimized_programs_print_signed_zeros_inf_and_nan_as_before(source):
+    assert run_main(source, '-O') == run_main(source)
+
+
+def test_fast_math_rewrites_are_opt_in():
+    source = "a = -2; A = [[1.0, 2.0], [3.0, 4.0]]; B = 2 * A * eye(2) * 3 * zeros(2, 2); C = A * A * A; print B, C;"
+    _, simplifier = simplified(source)
+    assert (simplifier.zeros, simplifier.identities, simplifier.powers, simplifier.factored) == (0, 0, 0, 0)
+    _, simplifier = simplified(source, fast_math=True)
+    assert simplifier.zeros == 1 and simplifier.powers == 1
+    assert run_main(source, '-O', '--fast-math') == run_main(source)
+
+
+def test_exact_rewrites_stay_on():
+    source = "A = [[1.0, 2.0], [3.0, 4.0]]; B = (A')'; C = A' * A; D = A * A'; print B, C, D;"
+    ast, simplifier = simplified(source)
+    assert simplifier.transposes == 1 and simplifier.symmetric == 2
+    assert sum(isinstance(getattr(stmt, 'right', None), AST.SymmetricProduct) for stmt in ast.statements) == 2
+    assert run_main(source, '-O') == run_main(source)
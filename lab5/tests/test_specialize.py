@@ -0,0 +1,33 @@
+import AST
+from support import check, interpret
+
+# The interpreter specializes operators by the types TypeChecker recorded,
+# but checks the operands it gets: with wrong types it still computes what
+# the generic operators do.
+
+SOURCE = """
+A = [[1, 2], [3, 4]];
+x = A;
+y = x * x;
+print y;
+z = 2;
+z += 1;
+print z, y * 2;
+"""
+
+
+def test_specialized_programs_print_as_before():
+    ast, types = check(SOURCE)
+    assert interpret(ast, types) == interpret(ast)
+
+
+def test_wrong_types_fall_back_to_the_generic_operators():
+    ast, types = check(SOURCE)
+    for node in list(types):
+        # as if TypeChecker had taken every matrix for a number
+        if isinstance(types[node], tuple):
+            types[node] = 'int'
+        if isinstance(node, AST.Assign) and node.op == '+=':
+            types[node.left] = types[node.right] = 'int'
+            node.right = AST.Variable('A')     # given its slot by the interpreter's Resolver
+    assert interpret(ast, types) == interpret(ast)
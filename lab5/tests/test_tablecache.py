@@ -0,0 +1,54 @@
+import os
+import pytest
+import tablecache
+from tablecache import CachedParser
+from scanner import Scanner
+
+# CachedParser (tablecache.py, shared by the labs) loads the LALR tables of
+# a grammar it has seen from its tabfile, and with any sly release but the
+# one it was written for just builds them like sly does.
+
+
+def make_parser(path):
+    class Sums(CachedParser):
+        tokens = {'INTNUM'}
+        debugfile = None
+        tabfile = path      # the tables are built or loaded when the class is created
+        precedence = (('left', '+'),)
+
+        @_('expr')
+        def program(self, p):
+            return p.expr
+
+        @_('expr "+" expr')
+        def expr(self, p):
+            return p.expr0 + p.expr1
+
+        @_('INTNUM')
+        def expr(self, p):
+            return p.INTNUM
+    return Sums
+
+
+def parse(parser, text):
+    return parser().parse(Scanner().tokenize(text))
+
+
+@pytest.fixture(autouse=True)
+def no_debug(monkeypatch):
+    monkeypatch.delenv('MPARSER_DEBUG', raising=False)
+
+
+def test_tables_are_written_then_loaded(tmp_path, monkeypatch):
+    tabfile = str(tmp_path / 'parser.tab')
+    assert parse(make_parser(tabfile), "1 + 2 + 3") == 6
+    assert os.path.exists(tabfile)
+    monkeypatch.setattr(CachedParser, 'write_tables', classmethod(lambda cls, signature: pytest.fail("rebuilt")))
+    assert parse(make_parser(tabfile), "4 + 5") == 9
+
+
+def test_other_sly_releases_build_the_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(tablecache, 'SLY_VERSION', 'other')
+    tabfile = str(tmp_path / 'parser.tab')
+    assert parse(make_parser(tabfile), "1 + 2") == 3
+    assert not os.path.exists(tabfile)
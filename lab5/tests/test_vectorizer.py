@@ -0,0 +1,94 @@
+import pytest
+import AST
+from support import run_main, run_failing, optimized, interpret
+from LoopVectorizer import LoopVectorizer
+
+ENGINES = [[], ['--jit'], ['--engine', 'closure'], ['--engine', 'vm', '--no-cache'], ['--engine', 'python']]
+
+
+def vectorized(source):
+    ast, (vectorizer,) = optimized(source, LoopVectorizer)
+    return ast, vectorizer
+
+
+def test_element_loops_become_whole_array_statements():
+    source = """
+A = ones(6, 3);
+for k = 0:5 {
+    A[k, 1] = k * k + 1;
+}
+D = zeros(6, 3);
+E = ones(6);
+j = 1;
+for i = 0:4 {
+    D[i, j] = A[i + 1, j] - A[i, j] * 2;
+    E[i + 1] += D[i, j] / 4;
+}
+print A, D, E;
+"""
+    ast, vectorizer = vectorized(source)
+    assert (vectorizer.loops, vectorizer.vectorized) == (2, 2)
+    assert sum(isinstance(stmt, AST.VectorFor) for stmt in ast.statements) == 2
+    output = run_main(source)
+    assert interpret(ast) == output
+    for args in ENGINES:
+        assert run_main(source, '-O', *args) == output
+
+
+@pytest.mark.parametrize('source', [
+    # each element needs the one stored in the previous iteration
+    "D = ones(6); for i = 1:5 { D[i] = D[i - 1] + 1; } print D;",
+    # the later store of D[i + 1] is overwritten by the next iteration's D[i]
+    "D = zeros(7); for i = 0:5 { D[i] = 1; D[i + 1] = 2; } print D;",
+    # a variable that is not a temporary of the body
+    "A = ones(4); s = 0; for i = 0:3 { s += A[i]; } print s;",
+    # Python numbers raise ZeroDivisionError where NumPy gives inf
+    "D = ones(4); x = 0; for i = 0:3 { D[i] = i / x; } print D;",
+    # two different elements of one dimension may be the same element
+    "D = ones(4, 4); j = 1; k = 1; for i = 0:3 { D[i, j] = D[i, k] + 1; } print D;",
+])
+def test_loops_the_whole_array_form_would_change_stay(source):
+    _, vectorizer = vectorized(source)
+    assert vectorizer.vectorized == 0
+
+
+@pytest.mark.parametrize('source', [
+    # no iterations, the loop variable is never set
+    "D = zeros(4); n = 0; for i = 1:n { D[i] = 2; } print D;",
+    # an index below the first element reads the last one in the scalar loop
+    "A = ones(4); A[3] = 5; D = zeros(4); for i = 0:2 { D[i] = A[i - 1]; } print D, i;",
+    # a scalar that holds a matrix
+    "x = ones(2); D = zeros(2, 2); for i = 0:1 { D[i] = x; } print D, i;",
+])
+def test_loops_that_do_not_fit_run_as_scalar_loops(source):
+    _, vectorizer = vectorized(source)
+    assert vectorizer.vectorized == 1
+    output = run_main(source)
+    for args in ENGINES:
+        assert run_main(source, '-O', *args) == output
+
+
+def test_out_of_bounds_accesses_fail_as_before():
+    source = "A = ones(6); D = zeros(6); for i = 0:6 { D[i] = A[i] * 3; } print D;"
+    _, vectorizer = vectorized(source)
+    assert vectorizer.vectorized == 1
+    expected = run_failing(source)
+    assert expected[1].startswith("IndexError")
+    for args in ENGINES:
+        assert run_failing(source, '-O', *args) == expected
+
+
+@pytest.mark.parametrize('source', [
+    # Python ints do not overflow
+    "D = zeros(3); for i = 0:2 { D[i] = (i + 1) * 10000000000 * 10000000000; } print D;",
+    "D = zeros(3); n = 5000000000; for i = 0:2 { D[i] = i * n * n; } print D;",
+    "D = zeros(3); n = 9007199254740993; for i = 0:2 { D[i] = (n + i) / 3; } print D;",
+    # small enough for int64
+    "D = zeros(4); n = 3; for i = 0:3 { D[i] = i * i * n - 1; } print D;",
+])
+def test_integer_arithmetic_gives_the_numbers_of_the_scalar_loop(source):
+    _, vectorizer = vectorized(source)
+    assert vectorizer.vectorized == 1
+    output = run_main(source)
+    for args in ENGINES:
+        assert run_main(source, '-O', *args) == output
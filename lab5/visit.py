@@ -1,6 +1,6 @@
 import inspect
 
-__all__ = ['on', 'when']
+__all__ = ['on', 'when', 'seal']
 
 
 def on(param_name):
@@ -26,25 +26,86 @@ def when(param_type):
     return f
 
 
+def seal(cls, base=None):
+    # resolves the targets of the dispatchers of class <cls> for all classes
+    # they can be called with now (see Dispatcher.seal) and closes them to new targets
+    for attribute in vars(cls).values():
+        dispatcher = getattr(attribute, 'dispatcher', attribute)
+        if isinstance(dispatcher, Dispatcher):
+            dispatcher.seal(base)
+
+
+def subclasses(cls, found):     # <cls> and all its subclasses, direct or not, added to <found>
+    if cls not in found:
+        found.add(cls)
+        for sub in cls.__subclasses__():
+            subclasses(sub, found)
+    return found
+
+
 class Dispatcher(object):
+    # Calls the target registered for the class of the dispatched parameter.
+    # A class without a target of its own gets the one of the nearest class in
+    # its MRO that has one, or the @on function if none does; it is resolved
+    # the first time the class is seen (a miss) and cached for every later call.
+
     def __init__(self, param_name, fn):
         self.param_index = self.__argspec(fn).args.index(param_name)
         self.param_name = param_name
+        self.default = fn
         self.targets = {}
+        self.cache = {}         # class -> resolved target
+        self.sealed = False
+        self.hits = {}          # class -> calls served from the cache, counted while counting (see count)
+        self.misses = {}        # class -> calls that had to resolve the target
 
     def __call__(self, *args, **kw):
-        typ = args[self.param_index].__class__
-        d = self.targets.get(typ)
-        if d is not None:
-            return d(*args, **kw)
-        else:
-            issub = issubclass
-            t = self.targets
-            ks = iter(t)
-            return [t[k](*args, **kw) for k in ks if issub(typ, k)]
+        target = self.cache.get(args[self.param_index].__class__)
+        if target is None:
+            target = self.resolve(args[self.param_index].__class__)
+        return target(*args, **kw)
+
+    def resolve(self, typ):
+        self.misses[typ] = self.misses.get(typ, 0) + 1
+        target = self.cache[typ] = self.target_for(typ)
+        return target
+
+    def target_for(self, typ):
+        return next((self.targets[cls] for cls in typ.__mro__ if cls in self.targets), self.default)
 
     def add_target(self, typ, target):
+        if self.sealed:
+            raise TypeError("cannot add a target for {0} to a sealed dispatcher".format(typ.__name__))
         self.targets[typ] = target
+        self.cache.clear()
+
+    def seal(self, base=None):
+        # resolves the target of every class with a target and of all their
+        # subclasses defined so far, and of the subclasses of <base>, so each
+        # of them takes the cached path from the first call; no targets can
+        # be added afterwards
+        classes = set()
+        for cls in list(self.targets) + ([base] if base is not None else []):
+            subclasses(cls, classes)
+        for cls in classes:
+            if cls not in self.cache:
+                self.cache[cls] = self.target_for(cls)
+        self.sealed = True
+
+    def count(self, enabled=True):  # starts or stops counting the hits of every call in <hits>
+        self.__class__ = CountingDispatcher if enabled else Dispatcher
+
+    def statistics(self):           # class name -> (hits, misses)
+        return dict((cls.__name__, (self.hits.get(cls, 0), self.misses.get(cls, 0)))
+                    for cls in set(self.hits) | set(self.misses))
+
+    def report(self, name):
+        statistics = self.statistics()
+        hits = sum(hit for hit, _ in statistics.values())
+        misses = sum(miss for _, miss in statistics.values())
+        resolved = sorted(cls for cls, (_, miss) in statistics.items() if miss)
+        return "{0} dispatch: {1} calls, {2} cache hits, resolved on a call: {3}".format(
+            name, hits + misses, hits, ", ".join(resolved) if resolved else "none")
 
     @staticmethod
     def __argspec(fn):
@@ -53,3 +114,17 @@ class Dispatcher(object):
             return inspect.getfullargspec(fn)
         else:
             return inspect.getargspec(fn)
+
+
+class CountingDispatcher(Dispatcher):
+    # a Dispatcher counting cache hits, only used while count() is on so the
+    # regular __call__ pays nothing for the statistics
+
+    def __call__(self, *args, **kw):
+        typ = args[self.param_index].__class__
+        target = self.cache.get(typ)
+        if target is None:
+            target = self.resolve(typ)
+        else:
+            self.hits[typ] = self.hits.get(typ, 0) + 1
+        return target(*args, **kw)
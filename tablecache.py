@@ -0,0 +1,83 @@
+import os
+import hashlib
+import marshal
+import sly
+from sly import Parser
+
+SLY_VERSION = '0.5'     # the sly release whose private build steps _build runs one by one
+
+
+# Parser whose LALR tables are generated once and then loaded from <tabfile>.
+# The file is keyed by a hash of the grammar, so any change to the rules or
+# precedence regenerates it. The debug dump (<debugfile>) is only written
+# when the MPARSER_DEBUG environment variable is set, which also forces the
+# tables to be rebuilt. sly has no public API for this: loading the tables
+# means running the steps of Parser._build, which are private and differ
+# between releases, so with any sly but SLY_VERSION the tables are simply
+# built on every start. Shared by the parsers of all the labs.
+class CachedParser(Parser):
+
+    tabfile = None
+    debugfile = None
+
+    class LRTable(object):
+        # the part of sly.yacc.LRTable used while parsing
+        def __init__(self, lr_action, lr_goto, defaulted_states):
+            self.lr_action = lr_action
+            self.lr_goto = lr_goto
+            self.defaulted_states = defaulted_states
+
+    @classmethod
+    def _build(cls, definitions):
+        if vars(cls).get('_build', False):
+            return
+
+        if os.environ.get('MPARSER_DEBUG'):
+            cls.debugfile = cls.debugfile or 'parser.out'
+        else:
+            cls.debugfile = None
+
+        pinned = sly.__version__ == SLY_VERSION
+        if cls.tabfile is None or cls.debugfile or not pinned:
+            Parser._build.__func__(cls, definitions)
+            if cls.tabfile is not None and pinned:
+                cls.write_tables(cls.grammar_signature())
+            return
+
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise sly.yacc.YaccError('Invalid parser specification')
+        cls._Parser__build_grammar(rules)
+
+        signature = cls.grammar_signature()
+        if not cls.read_tables(signature):
+            if not cls._Parser__build_lrtables():
+                raise sly.yacc.YaccError('Can\'t build parsing tables')
+            cls.write_tables(signature)
+
+    @classmethod
+    def grammar_signature(cls):
+        text = '\n'.join([sly.__version__, str(sorted(cls.tokens)), repr(cls.precedence), str(cls._grammar)])
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @classmethod
+    def read_tables(cls, signature):
+        try:
+            with open(cls.tabfile, 'rb') as file:
+                stored, lr_action, lr_goto, defaulted_states = marshal.load(file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return False
+        if stored != signature:
+            return False
+        cls._lrtable = CachedParser.LRTable(lr_action, lr_goto, defaulted_states)
+        return True
+
+    @classmethod
+    def write_tables(cls, signature):
+        table = cls._lrtable
+        data = (signature, table.lr_action, table.lr_goto, table.defaulted_states)
+        try:
+            with open(cls.tabfile, 'wb') as file:
+                marshal.dump(data, file)
+        except IOError:
+            pass